@@ -0,0 +1,14 @@
+"""Нагрузочное тестирование бота на локальных поддельных Telegram и ЮKassa.
+
+Запуск:
+    python -m bench flow --users 200 --concurrency 20 --output result.json
+    python -m bench flow --transport webhook --compare baseline.json
+    python -m bench broadcast --recipients 10000 --blocked
+    python -m bench outbox --messages 2000 --p429 0.05
+    python -m bench reconciler --payments 5000 --concurrency 20
+
+Каждый прогон использует свою временную БД SQLite и пишет JSON
+с перцентилями, пропускной способностью и окружением (коммит, Python).
+С --compare результат сравнивается с сохранённым: при ухудшении больше
+--threshold процесс завершается с кодом 1.
+"""
@@ -0,0 +1,147 @@
+"""CLI нагрузочных сценариев: python -m bench <сценарий> [параметры]."""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(x) for x in value.split(",")]
+
+
+def _parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--port", type=int, default=18500,
+                        help="порт поддельного Telegram; ЮKassa — port+1, бот — port+2")
+    common.add_argument("--db", help="файл SQLite (по умолчанию — во временном каталоге)")
+    common.add_argument("--output", help="куда записать JSON (по умолчанию stdout)")
+    common.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    common.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимое ухудшение при --compare, доля")
+    common.add_argument("--telegram-latency", type=float, default=0.02)
+    common.add_argument("--yookassa-latency", type=float, default=0.05)
+    common.add_argument("--outbox-rate", type=float,
+                        help="OUTBOX_GLOBAL_RATE (по умолчанию 1000, для outbox — 30)")
+
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    flow = sub.add_parser("flow", parents=[common], help="покупка: /start → оплата → мои курсы")
+    flow.add_argument("--users", type=int, default=100)
+    flow.add_argument("--concurrency", type=int, default=20)
+    flow.add_argument("--transport", choices=("polling", "webhook"), default="polling")
+    flow.add_argument("--courses", type=int, default=20)
+    flow.add_argument("--seed-users", type=int, default=0, help="дополнительные пользователи в БД")
+    flow.add_argument("--pay-delay", type=float, default=0.5,
+                      help="через сколько секунд после создания платежа ЮKassa присылает webhook")
+    flow.add_argument("--receipt-timeout", type=float, default=30)
+
+    start = sub.add_parser("start", parents=[common], help="одновременные /start новых пользователей")
+    start.add_argument("--users", type=int, default=1000)
+    start.add_argument("--concurrency", type=int, default=1000)
+    start.add_argument("--twice", action="store_true", help="каждый пользователь шлёт /start дважды")
+
+    order = sub.add_parser("order", parents=[common], help="создание заказа для корзин разного размера")
+    order.add_argument("--orders", type=int, default=200, help="заказов на каждый размер корзины")
+    order.add_argument("--sizes", type=_int_list, default=[1, 10, 50],
+                       help="размеры корзин через запятую")
+
+    contention = sub.add_parser("contention", parents=[common],
+                                help="одновременные записи в SQLite без PRAGMA и с ними")
+    contention.add_argument("--flows", type=int, default=300, help="покупок: заказ, платёж, подтверждение")
+    contention.add_argument("--writers", type=int, default=50, help="одновременных покупок")
+
+    reads = sub.add_parser("reads", parents=[common], help="память и время чтения каталога и заказов")
+    reads.add_argument("--courses", type=int, default=5000)
+    reads.add_argument("--cart", type=int, default=10, help="курсов в корзине и заказе")
+    reads.add_argument("--repeat", type=int, default=50)
+
+    catalog = sub.add_parser("catalog", parents=[common], help="каталог при разном числе курсов")
+    catalog.add_argument("--sizes", type=_int_list, default=[10, 1000, 100_000],
+                         help="размеры каталога через запятую")
+    catalog.add_argument("--repeat", type=int, default=50)
+
+    search = sub.add_parser("search", parents=[common], help="полнотекстовый поиск и inline-запросы")
+    search.add_argument("--courses", type=int, default=100_000)
+    search.add_argument("--queries", type=int, default=200, help="запросов на каждый вид")
+
+    broadcast = sub.add_parser("broadcast", parents=[common], help="рассылка всем пользователям")
+    broadcast.add_argument("--recipients", type=int, default=5000)
+    broadcast.add_argument("--blocked", action="store_true", help="1%% получателей заблокировали бота")
+
+    outbox = sub.add_parser("outbox", parents=[common], help="очередь исходящих и ответы 429")
+    outbox.add_argument("--messages", type=int, default=300)
+    outbox.add_argument("--per-chat", type=int, default=1, help="сообщений на один чат")
+    outbox.add_argument("--p429", type=float, default=0.05, help="доля ответов 429")
+
+    reconciler = sub.add_parser("reconciler", parents=[common], help="сверка зависших платежей")
+    reconciler.add_argument("--payments", type=int, default=2000)
+    reconciler.add_argument("--concurrency", type=int, default=5)
+
+    lost = sub.add_parser("lost_webhook", parents=[common],
+                          help="восстановление оплат с потерянным webhook сверкой")
+    lost.add_argument("--users", type=int, default=60)
+    lost.add_argument("--pay-delay", type=float, default=0.5,
+                      help="через сколько секунд после создания платежа ЮKassa присылает webhook")
+    lost.add_argument("--receipt-timeout", type=float, default=30)
+    return parser
+
+
+def _configure(args: argparse.Namespace, tmp: str) -> None:
+    """Окружение до импорта бота: config читается один раз при импорте."""
+    db = args.db or os.path.join(tmp, "bench.db")
+    rate = args.outbox_rate or (30 if args.scenario == "outbox" else 1000)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{db}",
+        "BOT_TOKEN": "123456:bench",
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{args.port}",
+        "YOOKASSA_BACKEND": "http",
+        "YOOKASSA_API_URL": f"http://127.0.0.1:{args.port + 1}/v3",
+        "YOOKASSA_SHOP_ID": "bench",
+        "YOOKASSA_SECRET": "bench",
+        "TELEGRAM_MODE": getattr(args, "transport", "polling"),
+        "THROTTLE_RATE": "0",
+        "OUTBOX_GLOBAL_RATE": str(rate),
+        "BROADCAST_PROGRESS_INTERVAL": "3600",
+    })
+    if args.scenario == "reconciler":
+        os.environ["RECONCILE_CONCURRENCY"] = str(args.concurrency)
+    if args.scenario == "lost_webhook":
+        # Сверку запускает сам сценарий
+        os.environ["RECONCILE_INTERVAL"] = "0"
+
+
+def main() -> int:
+    args = _parser().parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        _configure(args, tmp)
+        from bench.report import compare, environment, write
+        from bench.scenarios import SCENARIOS
+
+        params = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "db")}
+        results = asyncio.run(SCENARIOS[args.scenario](args))
+    result = {"scenario": args.scenario, "params": params, "env": environment(), "results": results}
+    write(result, args.output)
+
+    failed = [name for name, ok in results.get("checks", {}).items() if not ok]
+    if failed:
+        print(f"Проверки не пройдены: {', '.join(failed)}", file=sys.stderr)
+        return 1
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"Ухудшения больше {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
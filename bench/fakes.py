@@ -0,0 +1,236 @@
+"""Локальные поддельные Telegram Bot API и ЮKassa для нагрузочных тестов.
+
+Оба сервера — aiohttp-приложения на 127.0.0.1 с настраиваемой задержкой
+ответа. Поддельный Telegram записывает отправленные сообщения и умеет
+отвечать 429 и 403; поддельная ЮKassa создаёт платежи (с учётом
+Idempotence-Key) и может сама присылать webhook об успешной оплате.
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from collections.abc import Callable
+
+import aiohttp
+from aiohttp import web
+
+
+async def _start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+class FakeTelegram:
+    """Bot API: /bot{token}/{method}."""
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        p429: float = 0.0,
+        retry_after: int = 1,
+        blocked: Callable[[int], bool] | None = None,
+    ) -> None:
+        self.latency = latency
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.blocked = blocked or (lambda chat_id: False)
+        self.sent: list[tuple[float, int]] = []
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_at: list[float] = []
+        self.forbidden = 0
+        self.request_bytes: dict[str, int] = {}  # метод -> размер последнего запроса
+        self.calls: dict[str, int] = {}  # метод -> число запросов
+        self._message_ids = itertools.count(1)
+        self._waiters: dict[int, list[tuple[Callable[[str], bool], asyncio.Future]]] = {}
+        self._runner: web.AppRunner | None = None
+
+    def _message(self, chat_id: int, text: str = "", photo: bool = False) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if photo:
+            message["photo"] = [{"file_id": "bench-photo", "file_unique_id": "bench", "width": 1, "height": 1}]
+            message["caption"] = text
+        else:
+            message["text"] = text
+        return message
+
+    def wait_for(self, chat_id: int, predicate: Callable[[str], bool]) -> asyncio.Future:
+        """Future, который завершится, когда в chat_id придёт подходящее сообщение."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((predicate, future))
+        return future
+
+    def _deliver(self, chat_id: int, text: str) -> None:
+        self.sent.append((time.monotonic(), chat_id))
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for item in list(waiters):
+            predicate, future = item
+            if not future.done() and predicate(text):
+                future.set_result(text)
+                waiters.remove(item)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        method = request.match_info["method"].lower()
+        self.request_bytes[method] = request.content_length or 0
+        self.calls[method] = self.calls.get(method, 0) + 1
+        data = dict(await request.post())
+        await asyncio.sleep(self.latency)
+
+        if method == "getme":
+            return web.json_response({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot",
+            }})
+        if method not in ("sendmessage", "sendphoto", "editmessagetext", "editmessagecaption"):
+            return web.json_response({"ok": True, "result": True})
+
+        chat_id = int(data.get("chat_id") or 0)
+        if method in ("sendmessage", "sendphoto"):
+            if self.p429 and random.random() < self.p429:
+                self.throttled += 1
+                self.throttled_at.append(time.monotonic())
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }, status=429)
+            if self.blocked(chat_id):
+                self.forbidden += 1
+                return web.json_response({
+                    "ok": False, "error_code": 403,
+                    "description": "Forbidden: bot was blocked by the user",
+                }, status=403)
+        text = data.get("text") or data.get("caption") or ""
+        if method in ("sendmessage", "sendphoto"):
+            self._deliver(chat_id, text)
+        return web.json_response({
+            "ok": True, "result": self._message(chat_id, text, photo=method == "sendphoto"),
+        })
+
+    def api_base(self, port: int) -> str:
+        return f"http://127.0.0.1:{port}"
+
+    async def start(self, port: int) -> None:
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = await _start_site(app, port)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class FakeYooKassa:
+    """API ЮKassa: POST /v3/payments, GET /v3/payments/{id}.
+
+    Если задан webhook_url, через pay_delay после создания платежа
+    присылает payment.succeeded — как будто пользователь оплатил.
+    webhook_mode(payment_id) выбирает судьбу уведомления: "send" — обычная
+    доставка, "drop" — уведомление потерялось, "early" — пришло раньше,
+    чем бот получил ответ на создание платежа (и записал платёж в БД).
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        webhook_url: str | None = None,
+        pay_delay: float = 0.05,
+        status_of: Callable[[str], str] | None = None,
+        webhook_mode: Callable[[str], str] | None = None,
+    ) -> None:
+        self.latency = latency
+        self.webhook_url = webhook_url
+        self.pay_delay = pay_delay
+        self.status_of = status_of or (lambda payment_id: "pending")
+        self.webhook_mode = webhook_mode or (lambda payment_id: "send")
+        self.requests = 0
+        self.created = 0
+        self.fetched = 0
+        self.webhooks_sent = 0
+        self.webhooks_dropped = 0
+        self._ids = itertools.count(1)
+        self._by_key: dict[str, dict] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._session: aiohttp.ClientSession | None = None
+        self._runner: web.AppRunner | None = None
+
+    async def _notify(self, payment: dict, delay: float) -> None:
+        await asyncio.sleep(delay)
+        body = {"type": "notification", "event": "payment.succeeded",
+                "object": {**payment, "status": "succeeded"}}
+        for _ in range(5):
+            try:
+                async with self._session.post(self.webhook_url, json=body) as resp:
+                    if resp.status == 200:
+                        self.webhooks_sent += 1
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+
+    async def _create(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        key = request.headers.get("Idempotence-Key", "")
+        if key in self._by_key:
+            return web.json_response(self._by_key[key])
+        body = await request.json()
+        payment_id = f"bench-{next(self._ids)}"
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "amount": body["amount"],
+            "metadata": body.get("metadata", {}),
+            "confirmation": {"type": "redirect", "confirmation_url": f"https://pay.local/{payment_id}"},
+        }
+        if key:
+            self._by_key[key] = payment
+        self.created += 1
+        mode = self.webhook_mode(payment_id) if self.webhook_url else "drop"
+        if mode == "early":
+            # Уведомление доходит до бота, а ответ на создание задерживается
+            await self._notify(payment, 0)
+            await asyncio.sleep(self.pay_delay)
+        elif mode == "send":
+            task = asyncio.create_task(self._notify(payment, self.pay_delay))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif self.webhook_url:
+            self.webhooks_dropped += 1
+        return web.json_response(payment)
+
+    async def _get(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        self.fetched += 1
+        payment_id = request.match_info["id"]
+        return web.json_response({
+            "id": payment_id,
+            "status": self.status_of(payment_id),
+            "amount": {"value": "100.00", "currency": "RUB"},
+            "metadata": {},
+        })
+
+    async def start(self, port: int) -> None:
+        app = web.Application()
+        app.router.add_post("/v3/payments", self._create)
+        app.router.add_get("/v3/payments/{id}", self._get)
+        self._session = aiohttp.ClientSession()
+        self._runner = await _start_site(app, port)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,156 @@
+"""Сбор замеров, перцентили и сравнение результатов между коммитами."""
+
+import asyncio
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from bot.middlewares.metrics import handler_labels
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: list[float]) -> dict:
+    """count / p50 / p95 / p99 / max в миллисекундах."""
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+class Recorder:
+    """Замеры времени обработчиков и обновлений.
+
+    Время обработчика снимает внутренний middleware, время всего обновления
+    (троттлинг, сессия БД, commit) — обёртка Dispatcher.feed_update. Через
+    неё же сценарий узнаёт, что обновление обработано: в режиме webhook
+    aiogram обрабатывает его в фоне уже после ответа 200.
+    """
+
+    def __init__(self) -> None:
+        self.handlers: dict[str, list[float]] = {}
+        self.updates: list[float] = []
+        self._pending: dict[int, asyncio.Future] = {}
+
+    def expect(self, update_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[update_id] = future
+        return future
+
+    async def _handler_middleware(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        router, name = handler_labels(data["handler"].callback)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.handlers.setdefault(f"{router}.{name}", []).append(time.perf_counter() - start)
+
+    def install(self, dp: Dispatcher) -> None:
+        dp.message.middleware(self._handler_middleware)
+        dp.callback_query.middleware(self._handler_middleware)
+        dp.inline_query.middleware(self._handler_middleware)
+        feed_update = dp.feed_update
+
+        async def timed_feed_update(bot: Bot, update: Update, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await feed_update(bot, update, **kwargs)
+            finally:
+                self.updates.append(time.perf_counter() - start)
+                future = self._pending.pop(update.update_id, None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+
+        # Обе точки входа (feed_update и webhook) вызывают self.feed_update
+        dp.feed_update = timed_feed_update
+
+    def handler_report(self) -> dict:
+        return {name: summarize(samples) for name, samples in sorted(self.handlers.items())}
+
+
+def environment() -> dict:
+    """Коммит и окружение — чтобы результаты разных прогонов были сравнимы."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write(result: dict, path: str | None) -> None:
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def _flatten(result: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+# Метрики, где рост — ухудшение; для остальных (…_per_sec) ухудшение — падение
+_LOWER_IS_BETTER = ("_ms", "_seconds", "_kb", "_mb")
+_COST_PER_UNIT = ("queries_per_", "statements_per_", "requests_per_")
+
+
+def _lower_is_better(name: str) -> bool:
+    return name.endswith(_LOWER_IS_BETTER) or any(part in name for part in _COST_PER_UNIT)
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """Ухудшения больше threshold (доля) относительно baseline."""
+    current, base = _flatten(result.get("results", {})), _flatten(baseline.get("results", {}))
+    regressions = []
+    for name, old in sorted(base.items()):
+        new = current.get(name)
+        if new is None or not old or name.endswith(".count"):
+            continue
+        lower = _lower_is_better(name)
+        if not lower and not name.endswith("_per_sec"):
+            continue
+        change = (new - old) / old
+        worse = change if lower else -change
+        mark = "REGRESSION" if worse > threshold else ""
+        print(f"{name:60} {old:>12.3f} -> {new:>12.3f} {change:+7.1%} {mark}", file=sys.stderr)
+        if mark:
+            regressions.append(name)
+    return regressions
@@ -0,0 +1,899 @@
+"""Сценарии нагрузки.
+
+Модуль импортирует бота, поэтому загружается только после того, как
+bench.__main__ выставил переменные окружения (config читается при импорте).
+"""
+
+import asyncio
+import itertools
+import random
+import resource
+import time
+import tracemalloc
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from aiohttp import ClientSession, web
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from bench.fakes import FakeTelegram, FakeYooKassa
+from bench.report import Recorder, summarize
+from bot.__main__ import create_app, create_bot, create_dispatcher, webhook_secret
+from bot.config import config
+from bot.models import (
+    async_session, engine, init_db, Broadcast, Course, Order, OutboxMessage, Payment, User,
+    UserCourse, WebhookInbox,
+)
+from bot.services import db, metrics, outbox
+from bot.services.broadcast import broadcast_runner, create_broadcast
+from bot.services.cart_store import cart_store
+from bot.services.catalog import catalog_cache
+from bot.services.entitlements import entitlement_cache
+from bot.services.metrics import instrument_engine
+from bot.services.inbox import inbox_processor
+from bot.services.outbox import outbox_dispatcher
+from bot.services.payment import close as close_payment
+from bot.services.reconciler import payment_reconciler
+from bot.services.search import course_search
+from bot.models.engine import create_engine
+from bot.models.migrations import upgrade
+from bot.services.users import UserRecord, user_cache
+
+# Синтетические пользователи — вне диапазона реальных Telegram ID
+USER_ID_BASE = 9_000_000_000
+
+
+def _db_queries() -> int:
+    return metrics.db_query_seconds.total_count()
+
+
+def _max_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _max_in_window(timestamps: list[float], window: float = 1.0) -> int:
+    """Наибольшее число событий в скользящем окне window секунд."""
+    best, start = 0, 0
+    for end, ts in enumerate(timestamps):
+        while ts - timestamps[start] >= window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+async def _seed_courses(count: int, offset: int = 0) -> list[int]:
+    async with async_session() as session:
+        await session.execute(insert(Course.__table__), [
+            {
+                "title": f"Курс {i}",
+                "description": f"Синтетический курс номер {i} для нагрузочного теста",
+                "price": 990 + i % 10 * 100,
+                "material_url": f"https://example.com/materials/{i}",
+                "is_active": True,
+            }
+            for i in range(offset + 1, offset + count + 1)
+        ])
+        await session.commit()
+        return list((await session.execute(select(Course.id))).scalars())
+
+
+async def _seed_users(count: int, id_base: int) -> None:
+    async with async_session() as session:
+        for start in range(0, count, 10_000):
+            await session.execute(insert(User.__table__), [
+                {"telegram_id": id_base + i, "full_name": f"User {i}"}
+                for i in range(start, min(count, start + 10_000))
+            ])
+        await session.commit()
+
+
+# ─── Сценарий покупки ─────────────────────────────────────────
+
+_update_ids = itertools.count(1)
+
+
+def _message_update(user_id: int, text: str) -> dict:
+    update = {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"u{user_id}"},
+            "text": text,
+        },
+    }
+    if text.startswith("/"):
+        update["message"]["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+        ]
+    return update
+
+
+def _callback_update(user_id: int, data: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"u{user_id}"},
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "bench",
+            },
+        },
+    }
+
+
+def _inline_update(user_id: int, query: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "inline_query": {
+            "id": str(next(_update_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"u{user_id}"},
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+class FlowDriver:
+    """Отправка обновлений боту: напрямую в диспетчер (как при polling)
+    или POST-запросом на webhook Telegram."""
+
+    def __init__(self, bot, dp, recorder: Recorder, transport: str, app_url: str) -> None:
+        self.bot = bot
+        self.dp = dp
+        self.recorder = recorder
+        self.transport = transport
+        self.webhook_url = f"{app_url}{config.telegram_webhook_path}"
+        self.http: ClientSession | None = None
+        self.updates = 0
+
+    async def send(self, raw: dict) -> None:
+        self.updates += 1
+        done = self.recorder.expect(raw["update_id"])
+        if self.transport == "webhook":
+            async with self.http.post(
+                self.webhook_url,
+                json=raw,
+                headers={"X-Telegram-Bot-Api-Secret-Token": webhook_secret()},
+            ) as resp:
+                resp.raise_for_status()
+        else:
+            await self.dp.feed_raw_update(self.bot, raw)
+        await done
+
+
+async def _buy_flow(
+    driver: FlowDriver, telegram: FakeTelegram, user_id: int, course_id: int,
+    receipt_timeout: float, receipt_latency: list[float],
+) -> None:
+    """/start → каталог → курс → в корзину → корзина → оплата → webhook → мои курсы."""
+    receipt = telegram.wait_for(user_id, lambda text: "Оплата прошла" in text)
+    await driver.send(_message_update(user_id, "/start"))
+    for data in ("catalog", f"course:{course_id}", f"cart_add:{course_id}", "cart", "checkout"):
+        await driver.send(_callback_update(user_id, data))
+    # ЮKassa присылает webhook сама через pay_delay; ждём уведомление об оплате в чате
+    checkout_done = time.perf_counter()
+    await asyncio.wait_for(receipt, timeout=receipt_timeout)
+    receipt_latency.append(time.perf_counter() - checkout_done)
+    await driver.send(_callback_update(user_id, "my_courses"))
+
+
+async def flow(args) -> dict:
+    instrument_engine(engine)
+    await init_db()
+    course_ids = await _seed_courses(args.courses)
+    await _seed_users(args.seed_users, USER_ID_BASE + 10_000_000)
+
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    await telegram.start(args.port)
+    app_url = f"http://127.0.0.1:{args.port + 2}"
+    yookassa = FakeYooKassa(
+        latency=args.yookassa_latency,
+        webhook_url=f"{app_url}/webhook/yookassa",
+        pay_delay=args.pay_delay,
+    )
+    await yookassa.start(args.port + 1)
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    recorder = Recorder()
+    recorder.install(dp)
+    runner = web.AppRunner(create_app(bot, dp), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port + 2).start()
+
+    driver = FlowDriver(bot, dp, recorder, args.transport, app_url)
+    driver.http = ClientSession()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    receipt_latency: list[float] = []
+    failures: dict[str, int] = {}
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            try:
+                await _buy_flow(
+                    driver, telegram, USER_ID_BASE + i, random.choice(course_ids),
+                    args.receipt_timeout, receipt_latency,
+                )
+            except Exception as e:
+                failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+    queries_before = _db_queries()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    queries = _db_queries() - queries_before
+
+    await driver.http.close()
+    await runner.cleanup()
+    await yookassa.close()
+    await telegram.close()
+
+    completed = args.users - sum(failures.values())
+    return {
+        "flows": args.users,
+        "completed": completed,
+        "failures": failures,
+        "duration_seconds": round(elapsed, 3),
+        "flows_per_sec": round(completed / elapsed, 2),
+        "updates_per_sec": round(driver.updates / elapsed, 2),
+        "db_queries_per_flow": round(queries / max(args.users, 1), 2),
+        "telegram_requests_per_flow": round(telegram.requests / max(args.users, 1), 2),
+        "update": summarize(recorder.updates),
+        "checkout_to_receipt": summarize(receipt_latency),
+        "handlers": recorder.handler_report(),
+        "caches": {
+            "catalog": catalog_cache.stats(),
+            "entitlements": entitlement_cache.stats(),
+            "cart": cart_store.stats(),
+        },
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+# ─── Первый /start ────────────────────────────────────────────
+
+class _UserStatements:
+    """Счётчик SQL-запросов к таблице users."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if " users" in statement:
+            self.count += 1
+
+
+async def start(args) -> dict:
+    """Одновременные /start новых пользователей, затем повторные — из кэша."""
+    instrument_engine(engine)
+    await init_db()
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    await telegram.start(args.port)
+    bot = create_bot()
+    dp = create_dispatcher()
+    recorder = Recorder()
+    recorder.install(dp)
+    driver = FlowDriver(bot, dp, recorder, "polling", "")
+    counter = _UserStatements()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+
+    async def round_(ids) -> dict:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(user_id: int) -> None:
+            async with semaphore:
+                await driver.send(_message_update(user_id, "/start"))
+
+        statements, queries = counter.count, _db_queries()
+        recorder.updates.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(user_id) for user_id in ids))
+        elapsed = time.perf_counter() - started
+        return {
+            "starts": len(ids),
+            "starts_per_sec": round(len(ids) / elapsed, 2),
+            "users_statements_per_start": round((counter.count - statements) / len(ids), 3),
+            "db_queries_per_start": round((_db_queries() - queries) / len(ids), 3),
+            "update": summarize(recorder.updates),
+        }
+
+    # Каждый пользователь шлёт /start дважды одновременно — гонка за создание
+    ids = [USER_ID_BASE + i for i in range(args.users)]
+    first = await round_(ids + ids if args.twice else ids)
+    repeat = await round_(ids)
+    event.remove(engine.sync_engine, "before_cursor_execute", counter)
+    await bot.session.close()
+    await telegram.close()
+
+    async with async_session() as session:
+        rows = await session.scalar(select(func.count(User.id)))
+        distinct = await session.scalar(select(func.count(func.distinct(User.telegram_id))))
+    return {
+        "users": args.users,
+        "rows": rows,
+        "duplicates": rows - distinct,
+        "first": first,
+        "repeat": repeat,
+        "cache": user_cache.stats(),
+    }
+
+
+# ─── Создание заказа ──────────────────────────────────────────
+
+async def order(args) -> dict:
+    """db.create_order для корзин разного размера: запросы и время на заказ."""
+    instrument_engine(engine)
+    await init_db()
+    course_ids = await _seed_courses(max(args.sizes))
+    users = [
+        await user_cache.resolve(USER_ID_BASE + i, f"User {i}")
+        for i in range(args.orders)
+    ]
+    results = {}
+    for size in args.sizes:
+        latencies: list[float] = []
+        queries = _db_queries()
+        for user in users:
+            # Каждый раз новый набор курсов — иначе найдётся неоплаченный заказ
+            cart = random.sample(course_ids, size)
+            started = time.perf_counter()
+            async with async_session() as session:
+                await db.create_order(user, cart, session=session)
+                await session.commit()
+            latencies.append(time.perf_counter() - started)
+        results[f"cart_{size}"] = {
+            "queries_per_order": round((_db_queries() - queries) / len(users), 2),
+            **summarize(latencies),
+        }
+    return results
+
+
+# ─── Конкурентная запись ──────────────────────────────────────
+
+async def _contention_round(bench_engine: AsyncEngine, args) -> dict:
+    """writers одновременных покупок: create_order → платёж → confirm_payment."""
+    async with bench_engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        await conn.execute(insert(Course.__table__), [
+            {"title": f"Курс {i}", "description": "", "price": 990,
+             "material_url": f"https://example.com/{i}", "is_active": True}
+            for i in range(1, 21)
+        ])
+        await conn.execute(insert(User.__table__), [
+            {"telegram_id": USER_ID_BASE + i, "full_name": f"User {i}"} for i in range(args.flows)
+        ])
+        course_ids = list((await conn.execute(select(Course.id))).scalars())
+        user_ids = list((await conn.execute(select(User.id).order_by(User.id))).scalars())
+
+    sessions = async_sessionmaker(bench_engine, class_=AsyncSession, expire_on_commit=False)
+    semaphore = asyncio.Semaphore(args.writers)
+    latency: dict[str, list[float]] = {
+        "create_order": [], "create_payment_record": [], "confirm_payment": [],
+    }
+    errors: dict[str, int] = {}
+
+    async def write(operation: str, func, *call_args):
+        started = time.perf_counter()
+        async with sessions() as session:
+            result = await func(*call_args, session=session)
+            await session.commit()
+        latency[operation].append(time.perf_counter() - started)
+        return result
+
+    async def one(i: int) -> None:
+        user = UserRecord(id=user_ids[i], telegram_id=USER_ID_BASE + i, full_name=f"User {i}", username=None)
+        async with semaphore:
+            try:
+                order = await write("create_order", db.create_order, user, [random.choice(course_ids)])
+                yookassa_id = f"contention-{i}"
+                await write("create_payment_record", db.create_payment_record,
+                            order.id, yookassa_id, order.total_amount)
+                await write("confirm_payment", db.confirm_payment, yookassa_id)
+            except Exception as e:
+                kind = "database_is_locked" if "database is locked" in str(e) else type(e).__name__
+                errors[kind] = errors.get(kind, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.flows)))
+    elapsed = time.perf_counter() - started
+    await bench_engine.dispose()
+    return {
+        "flows": args.flows,
+        "completed": len(latency["confirm_payment"]),
+        "database_is_locked": errors.pop("database_is_locked", 0),
+        "other_errors": errors,
+        "duration_seconds": round(elapsed, 3),
+        **{operation: summarize(samples) for operation, samples in latency.items()},
+    }
+
+
+async def contention(args) -> dict:
+    """Конкурентные писатели на SQLite в трёх профилях движка, каждый в своём файле БД.
+
+    defaults — как до настройки: движок без параметров, журнал отката,
+    synchronous=FULL, ожидание блокировки — таймаут sqlite3 по умолчанию (5 с);
+    no_wait — журнал отката без ожидания блокировки (busy_timeout=0);
+    pragmas — PRAGMA и пул из Config (WAL, synchronous=NORMAL, busy_timeout).
+    """
+    path = Path(make_url(config.database_url).database)
+    results = {}
+    for profile in ("defaults", "no_wait", "pragmas"):
+        url = f"sqlite+aiosqlite:///{path.with_name(f'contention-{profile}.db')}"
+        if profile == "defaults":
+            bench_engine = create_async_engine(url)
+        elif profile == "no_wait":
+            bench_engine = create_engine(replace(
+                config, database_url=url,
+                sqlite_journal_mode="DELETE", sqlite_synchronous="FULL", sqlite_busy_timeout=0,
+            ))
+        else:
+            bench_engine = create_engine(replace(config, database_url=url))
+        results[profile] = await _contention_round(bench_engine, args)
+    return {"writers": args.writers, **results}
+
+
+# ─── Чтение каталога и заказов ────────────────────────────────
+
+async def _measure(func, repeat: int) -> dict:
+    """Память одного вызова (tracemalloc) и время repeat вызовов без трассировки.
+
+    Первый вызов — прогрев: кэш скомпилированных запросов SQLAlchemy не в счёт.
+    """
+    await func()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = await func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - started)
+    return {
+        "peak_kb": round((peak - before) / 1024, 1),
+        "retained_kb": round((current - before) / 1024, 1),
+        **summarize(latencies),
+    }
+
+
+async def reads(args) -> dict:
+    """Горячие пути чтения: каталог, корзина, «Мои курсы», заказ для уведомления."""
+    await init_db()
+    course_ids = await _seed_courses(args.courses)
+    user = await user_cache.resolve(USER_ID_BASE, "Bench")
+    cart = course_ids[:args.cart]
+    async with async_session() as session:
+        placed = await db.create_order(user, cart, session=session)
+        await session.execute(insert(UserCourse.__table__), [
+            {"user_id": user.id, "course_id": cid} for cid in cart
+        ])
+        await session.commit()
+
+    async def catalog():
+        catalog_cache.invalidate()
+        return await catalog_cache.get_page()
+
+    async def with_session(call):
+        async with async_session() as session:
+            return await call(session)
+
+    return {
+        "courses": args.courses,
+        "catalog_load": await _measure(catalog, args.repeat),
+        "admin_course_list": await _measure(
+            lambda: with_session(lambda s: db.get_course_page(session=s)), args.repeat,
+        ),
+        "cart_courses": await _measure(
+            lambda: with_session(lambda s: db.get_courses(cart, session=s)), args.repeat,
+        ),
+        "purchased_courses": await _measure(
+            lambda: with_session(lambda s: db.get_purchased_courses(user, session=s)), args.repeat,
+        ),
+        "order_with_items": await _measure(
+            lambda: with_session(lambda s: db.get_order_with_items(placed.id, session=s)),
+            args.repeat,
+        ),
+    }
+
+
+# ─── Каталог ──────────────────────────────────────────────────
+
+async def catalog(args) -> dict:
+    """Нажатия «Каталог» и карточки курса при разном размере каталога."""
+    instrument_engine(engine)
+    await init_db()
+    telegram = FakeTelegram(latency=0)
+    await telegram.start(args.port)
+    bot = create_bot()
+    dp = create_dispatcher()
+    recorder = Recorder()
+    recorder.install(dp)
+    driver = FlowDriver(bot, dp, recorder, "polling", "")
+
+    async def tap(data: str) -> float:
+        await driver.send(_callback_update(USER_ID_BASE, data))
+        return recorder.updates[-1]
+
+    results = {}
+    seeded: list[int] = []
+    for size in args.sizes:
+        seeded += await _seed_courses(size - len(seeded), offset=len(seeded))
+        seeded.sort()
+        catalog_cache.invalidate()
+        queries = _db_queries()
+        cold = await tap("catalog")
+        cold_queries = _db_queries() - queries
+        payload = telegram.request_bytes.get("editmessagetext", 0)
+        warm = [await tap("catalog") for _ in range(args.repeat)]
+        middle = seeded[len(seeded) // 2]
+        page = [await tap(f"catalog:page:a{middle}") for _ in range(args.repeat)]
+        detail = [await tap(f"course:{random.choice(seeded)}") for _ in range(args.repeat)]
+        results[f"courses_{size}"] = {
+            "first_tap_ms": round(cold * 1000, 3),
+            "first_tap_queries": cold_queries,
+            "keyboard_bytes": payload,
+            "catalog": summarize(warm),
+            "middle_page": summarize(page),
+            "course_detail": summarize(detail),
+            "max_rss_mb": _max_rss_mb(),
+        }
+    await bot.session.close()
+    await telegram.close()
+    return results
+
+
+# ─── Поиск ────────────────────────────────────────────────────
+
+_TOPICS = (
+    "маркетинг", "продажи", "дизайн", "программирование", "аналитика", "финансы", "копирайтинг",
+    "таргетинг", "нейросети", "фотография", "видеомонтаж", "психология", "управление", "бухгалтерия",
+    "инвестиции", "переговоры", "лидерство", "брендинг", "стратегия", "логистика", "рекрутинг",
+    "python", "excel", "telegram", "wildberries", "ozon", "figma", "sql", "seo", "smm",
+)
+_ADJECTIVES = (
+    "базовый", "продвинутый", "практический", "интенсивный", "авторский", "быстрый", "глубокий",
+    "новый", "полный", "экспресс", "личный", "командный", "онлайн", "бизнес",
+)
+_WORDS = _TOPICS + _ADJECTIVES + (
+    "курс", "урок", "модуль", "задание", "разбор", "кейс", "проект", "ошибки", "клиенты", "рост",
+    "доход", "регионы", "контент", "продвижение", "автоматизация", "результат", "практика", "ёлка",
+)
+
+
+async def _seed_search_courses(count: int) -> None:
+    """Курсы со словами из общего словаря: у запросов разная избирательность."""
+    rnd = random.Random(25)
+    async with async_session() as session:
+        for start in range(0, count, 10_000):
+            await session.execute(insert(Course.__table__), [
+                {
+                    "title": f"{rnd.choice(_ADJECTIVES).capitalize()} {rnd.choice(_TOPICS)} {i}",
+                    "description": " ".join(rnd.choices(_WORDS, k=12)),
+                    "price": 990 + i % 10 * 100,
+                    "material_url": f"https://example.com/materials/{i}",
+                    "is_active": True,
+                }
+                for i in range(start + 1, min(count, start + 10_000) + 1)
+            ])
+        await session.commit()
+
+
+async def search(args) -> dict:
+    """Поиск курсов: FTS5-запросы разной избирательности и inline-запросы через диспетчер."""
+    await init_db()
+    started = time.perf_counter()
+    await _seed_search_courses(args.courses)
+    seed_seconds = time.perf_counter() - started
+
+    rnd = random.Random(7)
+    kinds = {
+        # Два символа — самый широкий префикс
+        "prefix_2": lambda: rnd.choice(_WORDS)[:2],
+        "prefix_4": lambda: rnd.choice(_TOPICS)[:4],
+        "word": lambda: rnd.choice(_TOPICS),
+        "two_words": lambda: f"{rnd.choice(_ADJECTIVES)} {rnd.choice(_TOPICS)[:5]}",
+        "title_number": lambda: f"{rnd.choice(_TOPICS)} {rnd.randint(1, args.courses)}",
+    }
+    results: dict = {"courses": args.courses, "seed_seconds": round(seed_seconds, 3)}
+
+    # Без кэша: каждый запрос — MATCH + bm25 по индексу
+    for kind, make in kinds.items():
+        samples = []
+        for _ in range(args.queries):
+            course_search.invalidate()
+            query = make()
+            t = time.perf_counter()
+            await course_search.search(query)
+            samples.append(time.perf_counter() - t)
+        results[f"search_{kind}"] = summarize(samples)
+
+    telegram = FakeTelegram(latency=0)
+    await telegram.start(args.port)
+    bot = create_bot()
+    dp = create_dispatcher()
+    recorder = Recorder()
+    recorder.install(dp)
+    driver = FlowDriver(bot, dp, recorder, "polling", "")
+
+    async def inline(query: str) -> float:
+        await driver.send(_inline_update(USER_ID_BASE, query))
+        return recorder.updates[-1]
+
+    unique = [make() for make in kinds.values() for _ in range(args.queries // len(kinds))]
+    cold = []
+    for query in unique:
+        course_search.invalidate()
+        cold.append(await inline(query))
+    popular = [kinds["word"]() for _ in range(10)]
+    warm = [await inline(rnd.choice(popular)) for _ in range(args.queries)]
+    results.update({
+        "inline_cold": summarize(cold),
+        "inline_warm": summarize(warm),
+        "inline_answer_bytes": telegram.request_bytes.get("answerinlinequery", 0),
+        "cache": course_search.stats(),
+        "max_rss_mb": _max_rss_mb(),
+    })
+    await bot.session.close()
+    await telegram.close()
+    return results
+
+
+# ─── Рассылка ─────────────────────────────────────────────────
+
+async def broadcast(args) -> dict:
+    await init_db()
+    await _seed_users(args.recipients, USER_ID_BASE)
+    telegram = FakeTelegram(
+        latency=args.telegram_latency,
+        blocked=lambda chat_id: chat_id % 100 == 0 if args.blocked else False,
+    )
+    await telegram.start(args.port)
+    bot = create_bot()
+
+    async with async_session() as session:
+        item = await create_broadcast("Бенчмарк рассылки", "all", 1, None, session=session)
+        await session.commit()
+
+    started = time.perf_counter()
+    await outbox_dispatcher.start(bot)
+    await broadcast_runner.start(bot)
+    while True:
+        await asyncio.sleep(0.5)
+        async with async_session() as session:
+            item = await session.get(Broadcast, item.id, populate_existing=True)
+        if item.status != "running":
+            break
+    elapsed = time.perf_counter() - started
+    await broadcast_runner.close()
+    await outbox_dispatcher.close()
+    await bot.session.close()
+    await telegram.close()
+
+    sent = sorted(ts for ts, _ in telegram.sent)
+    return {
+        "recipients": args.recipients,
+        "queued": item.total,
+        "delivered": item.delivered,
+        "failed": item.failed,
+        "duplicates": len(telegram.sent) - len({chat for _, chat in telegram.sent}),
+        "duration_seconds": round(elapsed, 3),
+        "messages_per_sec": round((item.delivered + item.failed) / elapsed, 2),
+        "max_sent_per_1s": _max_in_window(sent),
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+# ─── Исходящие сообщения и 429 ────────────────────────────────
+
+async def outbox_load(args) -> dict:
+    await init_db()
+    telegram = FakeTelegram(latency=args.telegram_latency, p429=args.p429)
+    await telegram.start(args.port)
+    bot = create_bot()
+
+    chats = max(args.messages // args.per_chat, 1)
+    rows = [
+        outbox.message_row(USER_ID_BASE + i % chats, f"Сообщение {i}", priority=outbox.PRIORITY_MARKETING)
+        for i in range(args.messages)
+    ]
+    await outbox.enqueue_many(rows)
+
+    started = time.perf_counter()
+    await outbox_dispatcher.start(bot)
+    while (await outbox_dispatcher.metrics())["depth"] > 0:
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    await outbox_dispatcher.close()
+    await bot.session.close()
+    await telegram.close()
+
+    sent = sorted(ts for ts, _ in telegram.sent)
+    by_chat: dict[int, list[float]] = {}
+    for ts, chat in telegram.sent:
+        by_chat.setdefault(chat, []).append(ts)
+    async with async_session() as session:
+        failed = await session.scalar(
+            select(func.count(OutboxMessage.id)).where(OutboxMessage.status == "failed")
+        )
+    return {
+        "messages": args.messages,
+        "sent": len(telegram.sent),
+        "failed": failed,
+        "responses_429": telegram.throttled,
+        "duration_seconds": round(elapsed, 3),
+        "messages_per_sec": round(len(telegram.sent) / elapsed, 2),
+        "max_sent_per_1s": _max_in_window(sent),
+        "max_chat_sent_per_1s": max((_max_in_window(sorted(t)) for t in by_chat.values()), default=0),
+    }
+
+
+# ─── Сверка платежей ──────────────────────────────────────────
+
+async def reconciler(args) -> dict:
+    await init_db()
+    # Каждый десятый платёж оплачен, каждый десятый + 1 — отменён, прочие ждут оплаты
+    yookassa = FakeYooKassa(
+        latency=args.yookassa_latency,
+        status_of=lambda pid: {0: "succeeded", 1: "canceled"}.get(int(pid.rsplit("-", 1)[1]) % 10, "pending"),
+    )
+    await yookassa.start(args.port + 1)
+
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    async with async_session() as session:
+        await session.execute(insert(User.__table__).values(telegram_id=USER_ID_BASE, full_name="Bench"))
+        await session.execute(insert(Order.__table__), [
+            {"user_id": 1, "total_amount": 100, "status": "pending", "created_at": old}
+            for _ in range(args.payments)
+        ])
+        await session.execute(insert(Payment.__table__), [
+            {
+                "order_id": i + 1, "yookassa_id": f"bench-{i}", "amount": 100,
+                "status": "pending", "created_at": old,
+            }
+            for i in range(args.payments)
+        ])
+        await session.commit()
+
+    started = time.perf_counter()
+    resolved = await payment_reconciler.run()
+    elapsed = time.perf_counter() - started
+    await close_payment()
+    await yookassa.close()
+    return {
+        "payments": args.payments,
+        "concurrency": payment_reconciler.concurrency,
+        "resolved": resolved,
+        "yookassa_requests": yookassa.fetched,
+        "duration_seconds": round(elapsed, 3),
+        "payments_per_sec": round(args.payments / elapsed, 2),
+    }
+
+
+# ─── Потерянный webhook ───────────────────────────────────────
+
+async def _settled() -> None:
+    """Дождаться, пока очереди inbox и outbox опустеют."""
+    while (await inbox_processor.metrics())["depth"] or (await outbox_dispatcher.metrics())["depth"]:
+        await asyncio.sleep(0.1)
+
+
+async def lost_webhook(args) -> dict:
+    """Покупки, у части которых webhook потерялся или пришёл раньше платежа,
+    затем одна сверка: в итоге все платежи оплачены, чек пришёл каждому один раз."""
+    await init_db()
+    course_ids = await _seed_courses(5)
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    await telegram.start(args.port)
+    app_url = f"http://127.0.0.1:{args.port + 2}"
+    # Платёж bench-N: N % 3 == 0 — webhook потерян, N % 3 == 1 — пришёл раньше ответа
+    modes = {0: "drop", 1: "early", 2: "send"}
+    yookassa = FakeYooKassa(
+        latency=args.yookassa_latency,
+        webhook_url=f"{app_url}/webhook/yookassa",
+        pay_delay=args.pay_delay,
+        status_of=lambda pid: "succeeded",
+        webhook_mode=lambda pid: modes[int(pid.rsplit("-", 1)[1]) % 3],
+    )
+    await yookassa.start(args.port + 1)
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    recorder = Recorder()
+    recorder.install(dp)
+    runner = web.AppRunner(create_app(bot, dp), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port + 2).start()
+    driver = FlowDriver(bot, dp, recorder, "polling", app_url)
+
+    user_ids = [USER_ID_BASE + i for i in range(args.users)]
+    receipts = [telegram.wait_for(uid, lambda text: "Оплата прошла" in text) for uid in user_ids]
+
+    async def buy(user_id: int) -> None:
+        course_id = random.choice(course_ids)
+        await driver.send(_message_update(user_id, "/start"))
+        for data in (f"cart_add:{course_id}", "checkout"):
+            await driver.send(_callback_update(user_id, data))
+
+    await asyncio.gather(*(buy(uid) for uid in user_ids))
+    await asyncio.sleep(args.pay_delay)
+    await _settled()
+
+    async def pending() -> int:
+        async with async_session() as session:
+            return await session.scalar(
+                select(func.count(Payment.id)).where(Payment.status == "pending")
+            )
+
+    pending_before = await pending()
+    # Все платежи уже «зависшие»: сверка проверяет каждый pending
+    payment_reconciler.stale_after = 0
+    started = time.perf_counter()
+    await payment_reconciler.run()
+    await _settled()
+    elapsed = time.perf_counter() - started
+    done, _ = await asyncio.wait(receipts, timeout=args.receipt_timeout)
+
+    async with async_session() as session:
+        paid = await session.scalar(select(func.count(Payment.id)).where(Payment.status == "succeeded"))
+        granted = await session.scalar(select(func.count()).select_from(UserCourse))
+        notified = await session.scalar(
+            select(func.count(OutboxMessage.id)).where(OutboxMessage.dedup_key.like("payment:%"))
+        )
+        failed_events = await session.scalar(
+            select(func.count(WebhookInbox.id)).where(WebhookInbox.status == "failed")
+        )
+    pending_after = await pending()
+
+    await runner.cleanup()
+    await yookassa.close()
+    await telegram.close()
+    return {
+        "payments": args.users,
+        "webhooks_sent": yookassa.webhooks_sent,
+        "webhooks_dropped": yookassa.webhooks_dropped,
+        "pending_before_reconcile": pending_before,
+        "reconciler": {
+            key: value for key, value in (await payment_reconciler.metrics()).items()
+            if key in ("checked", "resolved", "requeued", "in_queue", "errors")
+        },
+        "recovery_seconds": round(elapsed, 3),
+        "paid": paid,
+        "pending": pending_after,
+        "granted": granted,
+        "receipts": len(done),
+        "notifications": notified,
+        "failed_events": failed_events,
+        "checks": {
+            "all_paid": paid == args.users and pending_after == 0,
+            "one_receipt_each": len(done) == args.users and notified == args.users,
+        },
+    }
+
+
+SCENARIOS = {
+    "flow": flow,
+    "start": start,
+    "order": order,
+    "contention": contention,
+    "reads": reads,
+    "catalog": catalog,
+    "search": search,
+    "broadcast": broadcast,
+    "outbox": outbox_load,
+    "reconciler": reconciler,
+    "lost_webhook": lost_webhook,
+}
@@ -1,17 +1,47 @@
-"""Точка входа — запуск бота и webhook-сервера."""
+"""Точка входа — запуск бота и webhook-сервера.
+
+Режимы получения обновлений Telegram (TELEGRAM_MODE):
+- polling — один процесс опрашивает Telegram, aiohttp-сервер принимает webhook ЮKassa;
+- webhook — Telegram и ЮKassa присылают запросы в одно aiohttp-приложение.
+  При WORKERS > 1 запускается несколько процессов на одном порту (SO_REUSEPORT),
+  за ними следит процесс-супервизор.
+"""
 
 import asyncio
+import hashlib
 import logging
+import multiprocessing
+import signal
+import time
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 
 from bot.config import config
-from bot.models import init_db
+from bot.models import init_db, engine
 from bot.handlers import register_routers
-from bot.handlers.payment import setup_webhook_routes
+from bot.middlewares import (
+    DbSessionMiddleware, MetricsMiddleware, TelegramRequestMetrics, ThrottlingMiddleware,
+    UserMiddleware,
+    db_session_middleware, metrics_middleware,
+)
+from bot.handlers.payment import setup_webhook_routes, process_payment_event
+from bot.handlers.service import setup_service_routes
+from bot.services import payment
+from bot.services.metrics import instrument_engine
+from bot.services.broadcast import broadcast_runner
+from bot.services.cart_store import cart_store
+from bot.services.fsm_storage import DBStorage
+from bot.services.inbox import inbox_processor
+from bot.services.orders import order_expirer
+from bot.services.outbox import outbox_dispatcher
+from bot.services.reconciler import reconciler_job
+from bot.services.stats import stats_reconciler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,49 +52,202 @@ logger = logging.getLogger(__name__)
 
 async def on_startup(app: web.Application) -> None:
     """Инициализация при старте."""
-    logger.info("Инициализация базы данных...")
-    await init_db()
-    logger.info("БД готова.")
+    await cart_store.start()
+    await inbox_processor.start(process_payment_event)
+    # Периодические задачи по БД достаточно выполнять в одном процессе, а лимиты
+    # Telegram общие для бота — сообщения тоже отправляет один процесс
+    if app["worker_id"] == 0:
+        await outbox_dispatcher.start(app["bot"])
+        await broadcast_runner.start(app["bot"])
+        await stats_reconciler.start()
+        await order_expirer.start()
+        await reconciler_job.start()
 
 
 async def on_shutdown(app: web.Application) -> None:
     """Очистка при остановке."""
     bot: Bot = app["bot"]
+    await reconciler_job.close()
+    await order_expirer.close()
+    await stats_reconciler.close()
+    await inbox_processor.close()
+    await broadcast_runner.close()
+    await outbox_dispatcher.close()
+    await cart_store.close()
     await bot.session.close()
+    await payment.close()
     logger.info("Бот остановлен.")
 
 
-async def main() -> None:
-    """Главная функция запуска."""
+def create_bot() -> Bot:
+    session = None
+    if config.telegram_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.telegram_api_url))
     bot = Bot(
         token=config.bot_token,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-
-    dp = Dispatcher()
+    bot.session.middleware(TelegramRequestMetrics())
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    # Несколько процессов должны видеть одно и то же состояние FSM
+    dp = Dispatcher(storage=DBStorage() if config.multi_worker else None)
+    # Ограничение частоты — до сессии БД: отброшенные обновления не трогают БД
+    dp["throttling"] = ThrottlingMiddleware(
+        rate=config.throttle_rate,
+        burst=config.throttle_burst,
+        locked=tuple(config.throttle_locked),
+    )
+    dp.update.outer_middleware(dp["throttling"])
+    dp.update.outer_middleware(DbSessionMiddleware())
+    # Внутренние middleware диспетчера действуют и на обработчики вложенных роутеров
+    metrics_mw = MetricsMiddleware()
+    dp.message.middleware(metrics_mw)
+    dp.callback_query.middleware(metrics_mw)
+    dp.inline_query.middleware(metrics_mw)
+    # Аргумент user — для обработчиков, которые его объявили
+    user_mw = UserMiddleware()
+    dp.message.middleware(user_mw)
+    dp.callback_query.middleware(user_mw)
     register_routers(dp)
+    return dp
+
+
+def webhook_secret() -> str:
+    """Секрет для заголовка X-Telegram-Bot-Api-Secret-Token.
 
-    # aiohttp-сервер для webhook ЮKassa
-    app = web.Application()
+    Если не задан явно, выводится из токена бота — одинаково во всех процессах.
+    """
+    if config.telegram_webhook_secret:
+        return config.telegram_webhook_secret
+    return hashlib.sha256(config.bot_token.encode()).hexdigest()[:32]
+
+
+def create_app(bot: Bot, dp: Dispatcher, worker_id: int = 0) -> web.Application:
+    """aiohttp-приложение: webhook ЮKassa и (в режиме webhook) обновления Telegram."""
+    instrument_engine(engine)
+    app = web.Application(middlewares=[metrics_middleware, db_session_middleware])
     app["bot"] = bot
+    app["dp"] = dp
+    app["worker_id"] = worker_id
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
     setup_webhook_routes(app)
+    setup_service_routes(app)
+
+    if config.telegram_mode == "webhook":
+        SimpleRequestHandler(
+            dispatcher=dp, bot=bot, secret_token=webhook_secret(),
+        ).register(app, path=config.telegram_webhook_path)
+    return app
+
+
+async def prepare(bot: Bot, dp: Dispatcher) -> None:
+    """Однократная подготовка: БД и регистрация webhook в Telegram."""
+    logger.info("Инициализация базы данных...")
+    await init_db()
+    logger.info("БД готова.")
+
+    if config.telegram_mode == "webhook":
+        url = f"{config.webhook_host.rstrip('/')}{config.telegram_webhook_path}"
+        await bot.set_webhook(
+            url,
+            allowed_updates=dp.resolve_used_update_types(),
+            secret_token=webhook_secret(),
+        )
+        logger.info("Webhook Telegram установлен: %s", url)
+
 
-    # Запускаем webhook-сервер в фоне
+async def serve(worker_id: int = 0, do_prepare: bool = True) -> None:
+    """Запуск одного процесса бота."""
+    bot = create_bot()
+    dp = create_dispatcher()
+    if do_prepare:
+        await prepare(bot, dp)
+
+    app = create_app(bot, dp, worker_id)
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", config.webhook_port)
+    site = web.TCPSite(
+        runner, "0.0.0.0", config.webhook_port, reuse_port=config.multi_worker,
+    )
     await site.start()
-    logger.info("Webhook-сервер запущен на порту %s", config.webhook_port)
+    logger.info("Webhook-сервер запущен на порту %s (процесс %s)", config.webhook_port, worker_id)
 
-    # Запускаем polling
-    logger.info("Бот запущен, polling...")
     try:
-        await dp.start_polling(bot)
+        if config.telegram_mode == "webhook":
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop.set)
+            await stop.wait()
+        else:
+            logger.info("Бот запущен, polling...")
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
         await runner.cleanup()
 
 
+def _worker(worker_id: int) -> None:
+    asyncio.run(serve(worker_id, do_prepare=False))
+
+
+async def _prepare_once() -> None:
+    bot = create_bot()
+    try:
+        await prepare(bot, create_dispatcher())
+    finally:
+        await bot.session.close()
+        # Соединения пула привязаны к этому event loop — закрываем до fork
+        await engine.dispose()
+
+
+def supervise(workers: int) -> None:
+    """Pre-fork супервизор: запускает и перезапускает процессы-обработчики."""
+    asyncio.run(_prepare_once())
+
+    ctx = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def start(worker_id: int) -> multiprocessing.Process:
+        proc = ctx.Process(target=_worker, args=(worker_id,), name=f"bot-worker-{worker_id}")
+        proc.start()
+        return proc
+
+    def stop(*_) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    procs = {i: start(i) for i in range(workers)}
+    logger.info("Запущено процессов: %s", workers)
+    while not stopping:
+        time.sleep(1)
+        for worker_id, proc in procs.items():
+            if not proc.is_alive() and not stopping:
+                logger.error("Процесс %s завершился (код %s), перезапуск", worker_id, proc.exitcode)
+                procs[worker_id] = start(worker_id)
+
+    for proc in procs.values():
+        proc.terminate()
+    for proc in procs.values():
+        proc.join(timeout=10)
+
+
+def main() -> None:
+    """Главная функция запуска."""
+    if config.multi_worker:
+        supervise(config.workers)
+    else:
+        if config.workers > 1:
+            logger.warning("WORKERS > 1 поддерживается только в режиме webhook, запускаем один процесс")
+        asyncio.run(serve())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -24,5 +24,189 @@ class Config:
         "DATABASE_URL", "sqlite+aiosqlite:///data/bot.db"
     ))
 
+    # Пул соединений БД (0 / -1 — значения по умолчанию для диалекта)
+    db_pool_size: int = field(default_factory=lambda: int(os.getenv("DB_POOL_SIZE", "0")))
+    db_max_overflow: int = field(default_factory=lambda: int(os.getenv("DB_MAX_OVERFLOW", "-1")))
+    db_pool_timeout: float = field(default_factory=lambda: float(os.getenv("DB_POOL_TIMEOUT", "30")))
+
+    # PRAGMA для SQLite
+    sqlite_journal_mode: str = field(default_factory=lambda: os.getenv("SQLITE_JOURNAL_MODE", "WAL"))
+    sqlite_synchronous: str = field(default_factory=lambda: os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"))
+    sqlite_busy_timeout: int = field(
+        default_factory=lambda: int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+    )  # мс
+    sqlite_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))
+    )  # отрицательное — в КиБ
+    sqlite_mmap_size: int = field(
+        default_factory=lambda: int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    )
+    sqlite_temp_store: str = field(default_factory=lambda: os.getenv("SQLITE_TEMP_STORE", "MEMORY"))
+
+    # ЮKassa HTTP-клиент: "http" — асинхронный aiohttp, "sdk" — синхронный SDK в потоке
+    yookassa_backend: str = field(default_factory=lambda: os.getenv("YOOKASSA_BACKEND", "http"))
+    yookassa_api_url: str = field(default_factory=lambda: os.getenv(
+        "YOOKASSA_API_URL", "https://api.yookassa.ru/v3"
+    ))
+    yookassa_timeout: float = field(default_factory=lambda: float(os.getenv("YOOKASSA_TIMEOUT", "15")))
+    yookassa_connect_timeout: float = field(
+        default_factory=lambda: float(os.getenv("YOOKASSA_CONNECT_TIMEOUT", "5"))
+    )
+    yookassa_max_connections: int = field(
+        default_factory=lambda: int(os.getenv("YOOKASSA_MAX_CONNECTIONS", "20"))
+    )
+
+    # Корзины: "sqlite" — в БД с отложенной записью, "memory" — только в памяти процесса
+    cart_backend: str = field(default_factory=lambda: os.getenv("CART_BACKEND", "sqlite"))
+    cart_ttl: int = field(default_factory=lambda: int(os.getenv("CART_TTL", str(30 * 24 * 3600))))
+    cart_cache_size: int = field(default_factory=lambda: int(os.getenv("CART_CACHE_SIZE", "100000")))
+    cart_max_items: int = field(default_factory=lambda: int(os.getenv("CART_MAX_ITEMS", "50")))
+    cart_flush_interval: float = field(
+        default_factory=lambda: float(os.getenv("CART_FLUSH_INTERVAL", "1"))
+    )
+
+    # Время жизни кэша каталога, сек (0 — только сброс при изменениях из админки)
+    catalog_cache_ttl: float = field(
+        default_factory=lambda: float(os.getenv("CATALOG_CACHE_TTL", "60"))
+    )
+    # Каталог по страницам: курсов на странице и страниц в кэше
+    catalog_page_size: int = field(
+        default_factory=lambda: int(os.getenv("CATALOG_PAGE_SIZE", "10"))
+    )
+    catalog_cache_pages: int = field(
+        default_factory=lambda: int(os.getenv("CATALOG_CACHE_PAGES", "1000"))
+    )
+
+    # Поиск курсов: результатов на запрос, запросов в кэше и время жизни результата, сек
+    search_results_limit: int = field(
+        default_factory=lambda: int(os.getenv("SEARCH_RESULTS_LIMIT", "20"))
+    )
+    search_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+    )
+    search_cache_ttl: float = field(
+        default_factory=lambda: float(os.getenv("SEARCH_CACHE_TTL", "30"))
+    )
+
+    # Кэш купленных курсов: число пользователей в памяти и время жизни записи, сек
+    entitlement_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("ENTITLEMENT_CACHE_SIZE", "50000"))
+    )
+    entitlement_cache_ttl: float = field(
+        default_factory=lambda: float(os.getenv("ENTITLEMENT_CACHE_TTL", "300"))
+    )
+
+    # Кэш пользователей (telegram_id -> строка users): число записей в памяти
+    user_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("USER_CACHE_SIZE", "100000"))
+    )
+
+    # Вариант приветственного фото: "full" — оригинал, "small" — уменьшенная копия
+    welcome_photo_variant: str = field(
+        default_factory=lambda: os.getenv("WELCOME_PHOTO_VARIANT", "full")
+    )
+
+    # Адрес Bot API (пусто — api.telegram.org); например, локальный telegram-bot-api
+    telegram_api_url: str = field(default_factory=lambda: os.getenv("TELEGRAM_API_URL", ""))
+
+    # Получение обновлений Telegram: "polling" или "webhook"
+    telegram_mode: str = field(default_factory=lambda: os.getenv("TELEGRAM_MODE", "polling"))
+    telegram_webhook_path: str = field(
+        default_factory=lambda: os.getenv("TELEGRAM_WEBHOOK_PATH", "/webhook/telegram")
+    )
+    telegram_webhook_secret: str = field(
+        default_factory=lambda: os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+    )
+    # Число процессов, слушающих один порт (только для TELEGRAM_MODE=webhook)
+    workers: int = field(default_factory=lambda: int(os.getenv("WORKERS", "1")))
+
+    # Токен для служебных маршрутов (/stats, /outbox, /metrics, /webhook/yookassa/inbox):
+    # заголовок Authorization: Bearer <токен>; пусто — маршруты закрыты
+    service_token: str = field(default_factory=lambda: os.getenv("SERVICE_TOKEN", ""))
+
+    # Обработка очереди уведомлений ЮKassa
+    inbox_concurrency: int = field(default_factory=lambda: int(os.getenv("INBOX_CONCURRENCY", "4")))
+    inbox_max_attempts: int = field(default_factory=lambda: int(os.getenv("INBOX_MAX_ATTEMPTS", "8")))
+    inbox_poll_interval: float = field(
+        default_factory=lambda: float(os.getenv("INBOX_POLL_INTERVAL", "1"))
+    )
+
+    # Неоплаченный заказ: сколько секунд его можно переиспользовать для той же корзины
+    # и как часто просроченные заказы помечаются expired
+    order_pending_ttl: int = field(
+        default_factory=lambda: int(os.getenv("ORDER_PENDING_TTL", "3600"))
+    )
+    order_expire_interval: float = field(
+        default_factory=lambda: float(os.getenv("ORDER_EXPIRE_INTERVAL", "300"))
+    )
+
+    # Исходящие сообщения Telegram: общий лимит и лимит на чат (сообщений в секунду),
+    # число одновременных отправок, лимит попыток и период опроса очереди (сек)
+    outbox_global_rate: float = field(
+        default_factory=lambda: float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+    )
+    outbox_chat_rate: float = field(
+        default_factory=lambda: float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+    )
+    outbox_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("OUTBOX_CONCURRENCY", "10"))
+    )
+    outbox_max_attempts: int = field(
+        default_factory=lambda: int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    )
+    outbox_poll_interval: float = field(
+        default_factory=lambda: float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+    )
+
+    # Рассылки: получателей в пачке, сколько сообщений рассылки держать в outbox
+    # и как часто (сек) обновлять сообщение с ходом рассылки
+    broadcast_batch_size: int = field(
+        default_factory=lambda: int(os.getenv("BROADCAST_BATCH_SIZE", "500"))
+    )
+    broadcast_max_backlog: int = field(
+        default_factory=lambda: int(os.getenv("BROADCAST_MAX_BACKLOG", "2000"))
+    )
+    broadcast_progress_interval: float = field(
+        default_factory=lambda: float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+    )
+
+    # Сверка зависших pending-платежей с ЮKassa (на случай потерянного webhook):
+    # период (сек, 0 — выкл.), через сколько секунд платёж считается зависшим,
+    # размер страницы и число одновременных запросов к ЮKassa
+    reconcile_interval: float = field(
+        default_factory=lambda: float(os.getenv("RECONCILE_INTERVAL", "60"))
+    )
+    reconcile_stale_after: int = field(
+        default_factory=lambda: int(os.getenv("RECONCILE_STALE_AFTER", "600"))
+    )
+    reconcile_page_size: int = field(
+        default_factory=lambda: int(os.getenv("RECONCILE_PAGE_SIZE", "200"))
+    )
+    reconcile_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("RECONCILE_CONCURRENCY", "5"))
+    )
+
+    # Ограничение частоты нажатий на пользователя: токенов в секунду (0 — выкл.) и запас;
+    # callback'и из THROTTLE_LOCKED выполняются для пользователя строго по одному
+    throttle_rate: float = field(default_factory=lambda: float(os.getenv("THROTTLE_RATE", "2")))
+    throttle_burst: float = field(default_factory=lambda: float(os.getenv("THROTTLE_BURST", "5")))
+    throttle_locked: list[str] = field(default_factory=lambda: [
+        x.strip() for x in os.getenv("THROTTLE_LOCKED", "checkout").split(",") if x.strip()
+    ])
+
+    # Сверка накопительной статистики с исходными таблицами: период (сек, 0 — выкл.)
+    # и число последних дней, дневные показатели которых пересчитываются
+    stats_reconcile_interval: float = field(
+        default_factory=lambda: float(os.getenv("STATS_RECONCILE_INTERVAL", "600"))
+    )
+    stats_reconcile_days: int = field(
+        default_factory=lambda: int(os.getenv("STATS_RECONCILE_DAYS", "2"))
+    )
+
+    @property
+    def multi_worker(self) -> bool:
+        """Запущено несколько процессов, состояние в памяти у них не общее."""
+        return self.telegram_mode == "webhook" and self.workers > 1
+
 
 config = Config()
@@ -5,6 +5,7 @@ from aiogram import Router
 from bot.handlers.start import router as start_router
 from bot.handlers.cart import router as cart_router
 from bot.handlers.admin import router as admin_router
+from bot.handlers.search import router as search_router
 
 
 def register_routers(main_router: Router) -> None:
@@ -12,3 +13,4 @@ def register_routers(main_router: Router) -> None:
     main_router.include_router(start_router)
     main_router.include_router(cart_router)
     main_router.include_router(admin_router)
+    main_router.include_router(search_router)
@@ -1,17 +1,27 @@
-"""Админ-панель: управление курсами и статистика."""
+"""Админ-панель: управление курсами, статистика и рассылки."""
 
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.config import config
+from bot.models import Broadcast, FIRST_PAGE
 from bot.services import db
-from bot.keyboards import admin_menu_kb, admin_courses_delete_kb, back_to_admin_kb
+from bot.services import broadcast as bc
+from bot.keyboards import (
+    admin_menu_kb, admin_courses_delete_kb, admin_stats_kb, back_to_stats_kb, back_to_admin_kb,
+    broadcast_segments_kb, broadcast_courses_kb, broadcast_confirm_kb, broadcast_progress_kb,
+)
 
 router = Router()
 
+# Глубина разбивок статистики, дней
+STATS_DAYS = 14
+STATS_COURSE_DAYS = 30
+
 
 def is_admin(user_id: int) -> bool:
     return user_id in config.admin_ids
@@ -25,6 +35,12 @@ class AddCourseStates(StatesGroup):
     waiting_url = State()
 
 
+class BroadcastStates(StatesGroup):
+    """Состояния FSM для рассылки."""
+    waiting_text = State()
+    waiting_confirm = State()
+
+
 # ─── Вход в админку ───────────────────────────────────────────
 
 @router.message(Command("admin"))
@@ -105,7 +121,9 @@ async def admin_add_course_price(message: Message, state: FSMContext) -> None:
 
 
 @router.message(AddCourseStates.waiting_url)
-async def admin_add_course_url(message: Message, state: FSMContext) -> None:
+async def admin_add_course_url(
+    message: Message, state: FSMContext, session: AsyncSession
+) -> None:
     if not is_admin(message.from_user.id):
         return
     url = message.text.strip()
@@ -116,7 +134,9 @@ async def admin_add_course_url(message: Message, state: FSMContext) -> None:
         description=data["description"],
         price=data["price"],
         material_url=url,
+        session=session,
     )
+    await session.commit()
     await state.clear()
     await message.answer(
         f"✅ Курс <b>«{course.title}»</b> добавлен!\n"
@@ -130,39 +150,44 @@ async def admin_add_course_url(message: Message, state: FSMContext) -> None:
 # ─── Удаление курса ──────────────────────────────────────────
 
 @router.callback_query(F.data == "admin:delete_course")
-async def admin_delete_course_list(callback: CallbackQuery) -> None:
+@router.callback_query(F.data.startswith("admin:del_page:"))
+async def admin_delete_course_list(callback: CallbackQuery, session: AsyncSession) -> None:
     if not is_admin(callback.from_user.id):
         await callback.answer("⛔ Доступ запрещён.", show_alert=True)
         return
-    courses = await db.get_active_courses()
-    if not courses:
+    # admin:del_page:<курсор>; admin:delete_course — первая страница
+    cursor = callback.data.split(":")[2] if callback.data != "admin:delete_course" else FIRST_PAGE
+    page = await db.get_course_page(cursor, session=session)
+    if not page.courses:
         await callback.answer("Нет активных курсов.", show_alert=True)
         return
     await callback.message.edit_text(
         "🗑 Выбери курс для удаления:",
-        reply_markup=admin_courses_delete_kb(courses),
+        reply_markup=admin_courses_delete_kb(page),
     )
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("admin:del:"))
-async def admin_delete_course(callback: CallbackQuery) -> None:
+async def admin_delete_course(callback: CallbackQuery, session: AsyncSession) -> None:
     if not is_admin(callback.from_user.id):
         await callback.answer("⛔ Доступ запрещён.", show_alert=True)
         return
-    course_id = int(callback.data.split(":")[2])
-    deleted = await db.delete_course(course_id)
+    # admin:del:<id>:<курсор страницы списка>
+    _, _, course_id, *rest = callback.data.split(":")
+    deleted = await db.delete_course(int(course_id), session=session)
+    await session.commit()
     if deleted:
         await callback.answer("✅ Курс удалён")
     else:
         await callback.answer("Курс не найден", show_alert=True)
 
-    # Обновляем список
-    courses = await db.get_active_courses()
-    if courses:
+    # Обновляем ту же страницу списка
+    page = await db.get_course_page(rest[0] if rest else FIRST_PAGE, session=session)
+    if page.courses:
         await callback.message.edit_text(
             "🗑 Выбери курс для удаления:",
-            reply_markup=admin_courses_delete_kb(courses),
+            reply_markup=admin_courses_delete_kb(page),
         )
     else:
         await callback.message.edit_text(
@@ -174,20 +199,219 @@ async def admin_delete_course(callback: CallbackQuery) -> None:
 # ─── Статистика ───────────────────────────────────────────────
 
 @router.callback_query(F.data == "admin:stats")
-async def admin_stats(callback: CallbackQuery) -> None:
+async def admin_stats(callback: CallbackQuery, session: AsyncSession) -> None:
     if not is_admin(callback.from_user.id):
         await callback.answer("⛔ Доступ запрещён.", show_alert=True)
         return
 
-    stats = await db.get_sales_stats()
+    stats = await db.get_sales_stats(session=session)
     text = (
         "📊 <b>Статистика продаж</b>\n\n"
         f"👥 Пользователей: {stats['total_users']}\n"
         f"📦 Заказов всего: {stats['total_orders']}\n"
         f"✅ Оплаченных: {stats['paid_orders']}\n"
-        f"💰 Выручка: {stats['total_revenue']:.0f} ₽"
+        f"💰 Выручка: {stats['total_revenue']:.0f} ₽\n\n"
+        "<b>Сегодня</b>\n"
+        f"👥 Новых: {stats['today_new_users']} · "
+        f"📦 Заказов: {stats['today_orders']} · "
+        f"✅ Оплачено: {stats['today_paid_orders']}\n"
+        f"💰 Выручка: {stats['today_revenue']:.0f} ₽"
+    )
+    await callback.message.edit_text(
+        text, reply_markup=admin_stats_kb(), parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+def _conversion(paid: int, orders: int) -> str:
+    return f"{paid / orders:.0%}" if orders else "—"
+
+
+@router.callback_query(F.data == "admin:stats:days")
+async def admin_stats_days(callback: CallbackQuery, session: AsyncSession) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+
+    days = await db.get_daily_stats(STATS_DAYS, session=session)
+    lines = [f"📅 <b>По дням</b> (последние {STATS_DAYS})\n"]
+    for d in days:
+        lines.append(
+            f"<b>{d.day[8:10]}.{d.day[5:7]}</b> — заказов {d.orders}, "
+            f"оплачено {d.paid_orders} ({_conversion(d.paid_orders, d.orders)}), "
+            f"{float(d.revenue):.0f} ₽, новых {d.new_users}"
+        )
+    if not days:
+        lines.append("Данных пока нет.")
+    await callback.message.edit_text(
+        "\n".join(lines), reply_markup=back_to_stats_kb(), parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "admin:stats:courses")
+async def admin_stats_courses(callback: CallbackQuery, session: AsyncSession) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+
+    courses = await db.get_course_stats(STATS_COURSE_DAYS, session=session)
+    lines = [f"📚 <b>По курсам</b> (последние {STATS_COURSE_DAYS} дней)\n"]
+    for c in courses:
+        lines.append(
+            f"<b>{c['title']}</b>\n"
+            f"   продано {c['paid_orders']} из {c['orders']} "
+            f"({_conversion(c['paid_orders'], c['orders'])}), {c['revenue']:.0f} ₽"
+        )
+    if not courses:
+        lines.append("Данных пока нет.")
+    await callback.message.edit_text(
+        "\n".join(lines), reply_markup=back_to_stats_kb(), parse_mode="HTML"
     )
+    await callback.answer()
+
+
+# ─── Рассылка ─────────────────────────────────────────────────
+
+@router.callback_query(F.data == "admin:broadcast")
+async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+    await state.clear()
     await callback.message.edit_text(
-        text, reply_markup=back_to_admin_kb(), parse_mode="HTML"
+        "📣 <b>Рассылка</b>\n\nКому отправить?",
+        reply_markup=broadcast_segments_kb(),
+        parse_mode="HTML",
     )
     await callback.answer()
+
+
+async def _ask_broadcast_text(
+    callback: CallbackQuery, state: FSMContext, segment: str, course_id: int | None = None,
+) -> None:
+    await state.update_data(segment=segment, course_id=course_id)
+    await state.set_state(BroadcastStates.waiting_text)
+    await callback.message.edit_text(
+        "✏️ Введи <b>текст рассылки</b> (можно с форматированием):",
+        reply_markup=back_to_admin_kb(),
+        parse_mode="HTML",
+    )
+    await callback.answer()
+
+
+async def _ask_broadcast_course(callback: CallbackQuery, session: AsyncSession, cursor: str) -> None:
+    page = await db.get_course_page(cursor, session=session)
+    if not page.courses:
+        await callback.answer("Нет активных курсов.", show_alert=True)
+        return
+    await callback.message.edit_text(
+        "📚 Покупателям какого курса отправить?",
+        reply_markup=broadcast_courses_kb(page),
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("admin:bc:seg:"))
+async def admin_broadcast_segment(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+    segment = callback.data.split(":")[3]
+    if segment != bc.SEGMENT_COURSE:
+        await _ask_broadcast_text(callback, state, segment)
+        return
+    await _ask_broadcast_course(callback, session, FIRST_PAGE)
+
+
+@router.callback_query(F.data.startswith("admin:bc:page:"))
+async def admin_broadcast_course_page(callback: CallbackQuery, session: AsyncSession) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+    await _ask_broadcast_course(callback, session, callback.data.split(":")[3])
+
+
+@router.callback_query(F.data.startswith("admin:bc:course:"))
+async def admin_broadcast_course(callback: CallbackQuery, state: FSMContext) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+    await _ask_broadcast_text(
+        callback, state, bc.SEGMENT_COURSE, int(callback.data.split(":")[3])
+    )
+
+
+@router.message(BroadcastStates.waiting_text)
+async def admin_broadcast_text(
+    message: Message, state: FSMContext, session: AsyncSession
+) -> None:
+    if not is_admin(message.from_user.id):
+        return
+    if not message.text:
+        await message.answer("❌ Пришли текст сообщения.")
+        return
+    data = await state.get_data()
+    text = message.html_text
+    recipients = await bc.count_recipients(data["segment"], data["course_id"], session)
+    await state.update_data(text=text)
+    await state.set_state(BroadcastStates.waiting_confirm)
+    # Предпросмотр — ровно так сообщение увидят получатели
+    await message.answer(text, parse_mode="HTML")
+    segment = await bc.segment_title(
+        Broadcast(segment=data["segment"], course_id=data["course_id"]), session
+    )
+    await message.answer(
+        f"📣 Сегмент: {segment}\n👥 Получателей: {recipients}\n\nОтправить?",
+        reply_markup=broadcast_confirm_kb(),
+    )
+
+
+@router.callback_query(BroadcastStates.waiting_confirm, F.data == "admin:bc:send")
+async def admin_broadcast_send(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+    data = await state.get_data()
+    # Сообщение с подтверждением становится отчётом о ходе рассылки
+    broadcast = await bc.create_broadcast(
+        text=data["text"],
+        segment=data["segment"],
+        course_id=data["course_id"],
+        admin_chat_id=callback.message.chat.id,
+        progress_message_id=callback.message.message_id,
+        session=session,
+    )
+    segment = await bc.segment_title(broadcast, session)
+    await session.commit()
+    await state.clear()
+    bc.broadcast_runner.notify()
+    await callback.message.edit_text(
+        bc.progress_text(broadcast, segment),
+        reply_markup=broadcast_progress_kb(broadcast.id),
+        parse_mode="HTML",
+    )
+    await callback.answer("🚀 Рассылка запущена")
+
+
+@router.callback_query(F.data.startswith("admin:bc:stop:"))
+async def admin_broadcast_stop(callback: CallbackQuery, session: AsyncSession) -> None:
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+        return
+    broadcast_id = int(callback.data.split(":")[3])
+    if not await bc.broadcast_runner.cancel(broadcast_id, session):
+        await callback.answer("Рассылка уже завершена", show_alert=True)
+        return
+    await session.commit()
+    broadcast = await session.get(Broadcast, broadcast_id, populate_existing=True)
+    await callback.message.edit_text(
+        bc.progress_text(broadcast, await bc.segment_title(broadcast, session)),
+        reply_markup=back_to_admin_kb(),
+        parse_mode="HTML",
+    )
+    await callback.answer("⛔ Рассылка остановлена")
@@ -1,42 +1,33 @@
 """Обработчики корзины: добавление, удаление, просмотр, оформление заказа."""
 
-from aiogram import Router, F, Bot
+import logging
+
+from aiogram import Router, F
 from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.services import db
-from bot.services.payment import create_payment
+from bot.services.cart_store import cart_store
+from bot.services.catalog import catalog_cache
+from bot.services.entitlements import entitlement_cache
+from bot.services.payment import create_payment, order_idempotency_key, YooKassaError
+from bot.services.users import UserRecord
 from bot.keyboards import cart_kb, main_menu_kb
 
-router = Router()
-
-# Корзина хранится в памяти бота (dict[telegram_id] -> list[course_id]).
-# Для production-среды лучше хранить в Redis или БД.
-
-
-def _get_cart(bot: Bot, user_id: int) -> list[int]:
-    """Получить корзину пользователя из bot-данных."""
-    key = f"cart:{user_id}"
-    if not hasattr(bot, "_cart_data"):
-        bot._cart_data = {}
-    return bot._cart_data.get(key, [])
+logger = logging.getLogger(__name__)
 
+router = Router()
 
-def _set_cart(bot: Bot, user_id: int, cart: list[int]) -> None:
-    if not hasattr(bot, "_cart_data"):
-        bot._cart_data = {}
-    bot._cart_data[f"cart:{user_id}"] = cart
+# Корзины хранятся в cart_store: в БД с кэшем в памяти или только в памяти (CART_BACKEND).
 
 
-# Делаем корзину доступной через bot.get() для других хендлеров
-# Monkey-patch Bot.get для совместимости
-_original_bot_class = Bot
+async def _get_cart(user_id: int) -> list[int]:
+    """Получить корзину пользователя."""
+    return await cart_store.get(user_id)
 
-def _bot_get_cart(bot: Bot, key: str, default=None):
-    if not hasattr(bot, "_cart_data"):
-        bot._cart_data = {}
-    return bot._cart_data.get(key, default)
 
-Bot.get = _bot_get_cart
+async def _set_cart(user_id: int, cart: list[int]) -> None:
+    await cart_store.set(user_id, cart)
 
 
 # ─── Добавить в корзину ──────────────────────────────────────
@@ -44,43 +35,42 @@ Bot.get = _bot_get_cart
 @router.callback_query(F.data.startswith("cart_add:"))
 async def add_to_cart(callback: CallbackQuery) -> None:
     course_id = int(callback.data.split(":")[1])
-    course = await db.get_course(course_id)
+    course = await catalog_cache.get_course(course_id)
     if not course:
         await callback.answer("Курс не найден", show_alert=True)
         return
-
-    cart = _get_cart(callback.bot, callback.from_user.id)
-    if course_id in cart:
-        await callback.answer("Курс уже в корзине")
+    if await entitlement_cache.owns(callback.from_user.id, course_id):
+        await callback.answer("Этот курс у тебя уже есть — он в «Мои курсы»", show_alert=True)
         return
 
-    cart.append(course_id)
-    _set_cart(callback.bot, callback.from_user.id, cart)
-    await callback.answer(f"✅ «{course.title}» добавлен в корзину")
+    # Проверка и запись — одной операцией хранилища: параллельное нажатие не потеряет курс
+    if await cart_store.add(callback.from_user.id, course_id):
+        await callback.answer(f"✅ «{course.title}» добавлен в корзину")
+    elif course_id in await _get_cart(callback.from_user.id):
+        await callback.answer("Курс уже в корзине")
+    else:
+        await callback.answer(f"В корзине уже {cart_store.max_items} курсов", show_alert=True)
 
 
 # ─── Убрать из корзины ────────────────────────────────────────
 
 @router.callback_query(F.data.startswith("cart_remove:"))
-async def remove_from_cart(callback: CallbackQuery) -> None:
+async def remove_from_cart(callback: CallbackQuery, session: AsyncSession) -> None:
     course_id = int(callback.data.split(":")[1])
-    cart = _get_cart(callback.bot, callback.from_user.id)
-    if course_id in cart:
-        cart.remove(course_id)
-        _set_cart(callback.bot, callback.from_user.id, cart)
+    if await cart_store.remove(callback.from_user.id, course_id):
         await callback.answer("Удалено из корзины")
     else:
         await callback.answer("Курса нет в корзине")
 
     # Обновляем отображение корзины
-    await show_cart(callback)
+    await show_cart(callback, session)
 
 
 # ─── Просмотр корзины ─────────────────────────────────────────
 
 @router.callback_query(F.data == "cart")
-async def show_cart(callback: CallbackQuery) -> None:
-    cart_ids = _get_cart(callback.bot, callback.from_user.id)
+async def show_cart(callback: CallbackQuery, session: AsyncSession) -> None:
+    cart_ids = await _get_cart(callback.from_user.id)
     if not cart_ids:
         await callback.message.edit_text(
             "🛒 Корзина пуста.\n\nДобавь курсы из каталога!",
@@ -89,14 +79,17 @@ async def show_cart(callback: CallbackQuery) -> None:
         await callback.answer()
         return
 
-    courses = []
-    for cid in cart_ids:
-        course = await db.get_course(cid)
-        if course and course.is_active:
-            courses.append(course)
+    owned = await entitlement_cache.owned_course_ids(callback.from_user.id, session=session)
+    courses = [
+        c for c in await db.get_courses(cart_ids, session=session) if c.id not in owned
+    ]
+    if len(courses) != len(cart_ids):
+        # Убираем из корзины курсы, которые сняли с продажи или уже купили.
+        # По одному, а не перезаписью: курс, добавленный параллельно, останется
+        for course_id in set(cart_ids) - {c.id for c in courses}:
+            await cart_store.remove(callback.from_user.id, course_id)
 
     if not courses:
-        _set_cart(callback.bot, callback.from_user.id, [])
         await callback.message.edit_text(
             "🛒 Корзина пуста.",
             reply_markup=main_menu_kb(),
@@ -104,7 +97,7 @@ async def show_cart(callback: CallbackQuery) -> None:
         await callback.answer()
         return
 
-    total = sum(float(c.price) for c in courses)
+    total = sum(c.price for c in courses)
     lines = ["🛒 <b>Корзина</b>\n"]
     for c in courses:
         lines.append(f"• {c.title} — {c.price:.0f} ₽")
@@ -122,51 +115,67 @@ async def show_cart(callback: CallbackQuery) -> None:
 # ─── Оформление заказа ────────────────────────────────────────
 
 @router.callback_query(F.data == "checkout")
-async def checkout(callback: CallbackQuery) -> None:
-    cart_ids = _get_cart(callback.bot, callback.from_user.id)
+async def checkout(callback: CallbackQuery, session: AsyncSession, user: UserRecord) -> None:
+    cart_ids = await _get_cart(callback.from_user.id)
     if not cart_ids:
         await callback.answer("Корзина пуста", show_alert=True)
         return
 
-    user = await db.get_or_create_user(
-        telegram_id=callback.from_user.id,
-        full_name=callback.from_user.full_name,
-        username=callback.from_user.username,
-    )
-
-    order = await db.create_order(user, cart_ids)
+    # Неоплаченный заказ на ту же корзину переиспользуется вместе с платежом
+    order = await db.create_order(user, cart_ids, session=session)
     if not order:
-        await callback.answer("Не удалось создать заказ", show_alert=True)
+        # В корзине не осталось доступных курсов: сняты с продажи или уже куплены
+        await _set_cart(callback.from_user.id, [])
+        await callback.answer("Курсы из корзины уже куплены или недоступны", show_alert=True)
         return
 
-    # Создаём платёж в ЮKassa
-    course_titles = ", ".join(item.course.title for item in order.items)
-    description = f"Оплата курсов: {course_titles}"[:128]
-
-    payment_data = create_payment(
-        amount=float(order.total_amount),
-        order_id=order.id,
-        description=description,
-    )
-
-    # Сохраняем запись о платеже в БД
-    await db.create_payment_record(
-        order_id=order.id,
-        yookassa_id=payment_data["id"],
-        amount=float(order.total_amount),
-    )
+    reused = order.payment is not None and bool(order.payment.confirmation_url)
+    if reused:
+        confirmation_url = order.payment.confirmation_url
+    else:
+        # Заказ сохраняем до запроса в ЮKassa: если запрос не удастся, повторный
+        # checkout найдёт этот заказ и повторит запрос с тем же ключом идемпотентности
+        await session.commit()
+
+        course_titles = ", ".join(item.course.title for item in order.items)
+        description = f"Оплата курсов: {course_titles}"[:128]
+        try:
+            payment_data = await create_payment(
+                amount=order.total_amount,
+                order_id=order.id,
+                description=description,
+                idempotency_key=order_idempotency_key(order.id, order.cart_fingerprint),
+            )
+        except YooKassaError as e:
+            logger.error("Ошибка при создании платежа для заказа #%s: %s", order.id, e)
+            await callback.answer(
+                "Платёжный сервис временно недоступен, попробуй позже", show_alert=True
+            )
+            return
+
+        # Сохраняем запись о платеже в БД
+        await db.create_payment_record(
+            order_id=order.id,
+            yookassa_id=payment_data["id"],
+            amount=order.total_amount,
+            confirmation_url=payment_data["confirmation_url"],
+            session=session,
+        )
+        await session.commit()
+        confirmation_url = payment_data["confirmation_url"]
 
     # Очищаем корзину
-    _set_cart(callback.bot, callback.from_user.id, [])
+    await _set_cart(callback.from_user.id, [])
 
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💳 Перейти к оплате", url=payment_data["confirmation_url"])],
+        [InlineKeyboardButton(text="💳 Перейти к оплате", url=confirmation_url)],
         [InlineKeyboardButton(text="« Главное меню", callback_data="main_menu")],
     ])
 
+    title = f"⏳ Заказ #{order.id} ждёт оплаты." if reused else f"✅ Заказ #{order.id} создан!"
     await callback.message.edit_text(
-        f"✅ Заказ #{order.id} создан!\n\n"
+        f"{title}\n\n"
         f"Сумма: <b>{order.total_amount:.0f} ₽</b>\n\n"
         "Нажми кнопку ниже для перехода к оплате:",
         reply_markup=kb,
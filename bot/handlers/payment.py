@@ -1,15 +1,73 @@
-"""Webhook для приёма уведомлений от ЮKassa."""
+"""Webhook для приёма уведомлений от ЮKassa.
+
+Webhook только кладёт событие в очередь (bot.services.inbox) и сразу
+отвечает 200. Подтверждение оплаты выполняет process_payment_event в
+фоновом обработчике очереди, уведомление пользователя отправляет очередь
+исходящих сообщений (bot.services.outbox).
+"""
 
 import json
 import logging
 
 from aiohttp import web
 
-from bot.services import db
+from bot.handlers.service import require_service_token
+from bot.middlewares import SESSION_KEY
+from bot.models import async_session
+from bot.services import db, inbox, outbox
 
 logger = logging.getLogger(__name__)
 
 
+async def process_payment_event(yookassa_id: str, event: str, payload: dict) -> None:
+    """Обработка события ЮKassa из очереди.
+
+    Уведомление пользователя ставится в outbox в той же транзакции, что и
+    подтверждение оплаты, — оно не потеряется и не продублируется.
+    Ошибка БД пробрасывается — событие будет обработано повторно.
+    """
+    if event not in ("payment.succeeded", "payment.canceled"):
+        return
+
+    async with async_session() as session:
+        if event == "payment.succeeded":
+            payment = await db.confirm_payment(yookassa_id, session=session)
+        else:
+            payment = await db.cancel_payment(yookassa_id, session=session)
+        if payment is None:
+            return
+        # Получаем заказ с деталями для уведомления пользователя
+        order = await db.get_order_with_items(payment.order_id, session=session)
+
+        if event == "payment.succeeded":
+            # Собираем ссылки на материалы
+            lines = ["🎉 <b>Оплата прошла успешно!</b>\n"]
+            lines.append(f"Заказ #{order.id}\n")
+            lines.append("Вот ссылки на материалы курсов:\n")
+            for item in order.items:
+                lines.append(
+                    f"📖 <b>{item.course.title}</b>\n"
+                    f"   🔗 {item.course.material_url}"
+                )
+            text = "\n".join(lines)
+        else:
+            text = (
+                f"❌ Оплата заказа #{order.id} отменена.\n"
+                "Попробуй ещё раз через /start → Корзина."
+            )
+
+        await outbox.enqueue(
+            order.telegram_id,
+            text,
+            priority=outbox.PRIORITY_PAYMENT,
+            disable_web_page_preview=True,
+            dedup_key=f"payment:{yookassa_id}:{event}",
+            session=session,
+        )
+        await session.commit()
+    outbox.outbox_dispatcher.notify()
+
+
 async def yookassa_webhook(request: web.Request) -> web.Response:
     """
     Обработка webhook-уведомлений от ЮKassa.
@@ -24,57 +82,30 @@ async def yookassa_webhook(request: web.Request) -> web.Response:
     payment_obj = body.get("object", {})
     yookassa_id = payment_obj.get("id")
 
-    if not yookassa_id:
+    if not yookassa_id or not event:
         return web.Response(status=400, text="No payment id")
 
     logger.info("Webhook получен: event=%s, payment_id=%s", event, yookassa_id)
 
-    bot = request.app.get("bot")
-
-    if event == "payment.succeeded":
-        payment = await db.confirm_payment(yookassa_id)
-        if payment:
-            # Получаем заказ с деталями для уведомления пользователя
-            order = await db.get_order_with_items(payment.order_id)
-            if order and bot:
-                # Собираем ссылки на материалы
-                lines = ["🎉 <b>Оплата прошла успешно!</b>\n"]
-                lines.append(f"Заказ #{order.id}\n")
-                lines.append("Вот ссылки на материалы курсов:\n")
-                for item in order.items:
-                    lines.append(
-                        f"📖 <b>{item.course.title}</b>\n"
-                        f"   🔗 {item.course.material_url}"
-                    )
-
-                try:
-                    await bot.send_message(
-                        chat_id=order.user.telegram_id,
-                        text="\n".join(lines),
-                        parse_mode="HTML",
-                        disable_web_page_preview=True,
-                    )
-                except Exception as e:
-                    logger.error("Ошибка при отправке уведомления: %s", e)
-
-    elif event == "payment.canceled":
-        payment = await db.cancel_payment(yookassa_id)
-        if payment:
-            order = await db.get_order_with_items(payment.order_id)
-            if order and bot:
-                try:
-                    await bot.send_message(
-                        chat_id=order.user.telegram_id,
-                        text=f"❌ Оплата заказа #{order.id} отменена.\n"
-                             "Попробуй ещё раз через /start → Корзина.",
-                    )
-                except Exception as e:
-                    logger.error("Ошибка при отправке уведомления: %s", e)
+    # Если запись не удалась — отвечаем 500, ЮKassa повторит доставку
+    session = request[SESSION_KEY]
+    if await inbox.enqueue(yookassa_id, event, body, session=session):
+        # Будим обработчик только после commit, иначе он не увидит событие
+        await session.commit()
+        inbox.inbox_processor.notify()
+    else:
+        logger.info("Повторное уведомление: event=%s, payment_id=%s", event, yookassa_id)
 
     # ЮKassa ожидает 200 OK
     return web.Response(status=200, text="OK")
 
 
+async def inbox_metrics(request: web.Request) -> web.Response:
+    """Состояние очереди уведомлений: глубина и задержка обработки."""
+    return web.json_response(await inbox.inbox_processor.metrics())
+
+
 def setup_webhook_routes(app: web.Application) -> None:
     """Регистрация маршрутов webhook."""
     app.router.add_post("/webhook/yookassa", yookassa_webhook)
+    app.router.add_get("/webhook/yookassa/inbox", require_service_token(inbox_metrics))
@@ -0,0 +1,75 @@
+"""Поиск курсов: /search <запрос> и inline-режим (@бот запрос)."""
+
+from html import escape
+
+from aiogram import Bot, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    InlineQuery, InlineQueryResultArticle, InlineQueryResultsButton,
+    InputTextMessageContent, Message,
+)
+
+from bot.config import config
+from bot.keyboards import course_link_kb, main_menu_kb, search_results_kb
+from bot.models import CourseView
+from bot.services.catalog import catalog_cache
+from bot.services.search import course_search
+
+router = Router()
+
+# Длина описания в строке результата inline-поиска
+SNIPPET_LENGTH = 120
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject) -> None:
+    if not command.args:
+        await message.answer(
+            "🔍 Напиши, что ищешь: <code>/search маркетинг</code>\n"
+            "Или в любом чате: <code>@бот запрос</code>",
+            parse_mode="HTML",
+        )
+        return
+    courses = await course_search.search(command.args)
+    if not courses:
+        await message.answer("😔 Ничего не нашлось. Попробуй другие слова.", reply_markup=main_menu_kb())
+        return
+    await message.answer(
+        f"🔍 Найдено по запросу «{escape(command.args)}»:",
+        reply_markup=search_results_kb(courses),
+    )
+
+
+def _inline_result(course: CourseView, bot_username: str) -> InlineQueryResultArticle:
+    description = course.description
+    if len(description) > SNIPPET_LENGTH:
+        description = description[:SNIPPET_LENGTH - 1].rstrip() + "…"
+    return InlineQueryResultArticle(
+        id=str(course.id),
+        title=f"{course.title} — {course.price:.0f} ₽",
+        description=description,
+        input_message_content=InputTextMessageContent(
+            message_text=(
+                f"📖 <b>{escape(course.title)}</b>\n\n"
+                f"{escape(course.description)}\n\n"
+                f"💰 Цена: <b>{course.price:.0f} ₽</b>"
+            ),
+            parse_mode="HTML",
+        ),
+        reply_markup=course_link_kb(f"https://t.me/{bot_username}?start=course_{course.id}"),
+    )
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery, bot: Bot) -> None:
+    # Пустой запрос — первая страница каталога
+    if inline_query.query.strip():
+        courses = await course_search.search(inline_query.query)
+    else:
+        courses = (await catalog_cache.get_page()).courses
+    me = await bot.me()
+    await inline_query.answer(
+        [_inline_result(course, me.username) for course in courses],
+        cache_time=int(config.search_cache_ttl),
+        button=InlineQueryResultsButton(text="📚 Открыть каталог", start_parameter="catalog"),
+    )
@@ -0,0 +1,95 @@
+"""Служебные HTTP-маршруты: состояние кэшей, очередей, фоновых задач и метрики.
+
+Сервер слушает публичный порт, поэтому маршруты отвечают только на запрос
+с заголовком Authorization: Bearer <SERVICE_TOKEN>. Без SERVICE_TOKEN они
+закрыты для всех.
+"""
+
+import functools
+import hmac
+from collections.abc import Awaitable, Callable
+
+from aiohttp import web
+
+from bot.config import config
+from bot.services import metrics
+from bot.services.broadcast import broadcast_runner
+from bot.services.cart_store import cart_store
+from bot.services.catalog import catalog_cache
+from bot.services.entitlements import entitlement_cache
+from bot.services.inbox import inbox_processor
+from bot.services.outbox import outbox_dispatcher
+from bot.services.reconciler import payment_reconciler
+from bot.services.search import course_search
+from bot.services.users import user_cache
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def require_service_token(handler: Handler) -> Handler:
+    """Пропустить запрос к обработчику только с верным токеном SERVICE_TOKEN."""
+
+    @functools.wraps(handler)
+    async def wrapper(request: web.Request) -> web.StreamResponse:
+        if not config.service_token:
+            raise web.HTTPForbidden(text="SERVICE_TOKEN is not configured")
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.strip().encode(), config.service_token.encode()
+        ):
+            raise web.HTTPUnauthorized(headers={"WWW-Authenticate": "Bearer"})
+        return await handler(request)
+
+    return wrapper
+
+
+async def service_stats(request: web.Request) -> web.Response:
+    """Счётчики процесса в JSON."""
+    throttling = request.app["dp"]["throttling"]
+    return web.json_response({
+        "worker_id": request.app["worker_id"],
+        "catalog_cache": catalog_cache.stats(),
+        "entitlement_cache": entitlement_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "search_cache": course_search.stats(),
+        "cart_store": cart_store.stats(),
+        "throttling": throttling.stats(),
+        "payment_reconciler": await payment_reconciler.metrics(),
+        "broadcasts": await broadcast_runner.metrics(),
+    })
+
+
+async def outbox_metrics(request: web.Request) -> web.Response:
+    """Состояние очереди исходящих сообщений Telegram."""
+    return web.json_response(await outbox_dispatcher.metrics())
+
+
+@metrics.registry.collector
+async def _collect_state() -> None:
+    """Снимок кэшей и очередей перед выдачей /metrics."""
+    metrics.observe_cache("catalog", catalog_cache.stats())
+    metrics.observe_cache("entitlements", entitlement_cache.stats())
+    metrics.observe_cache("users", user_cache.stats())
+    metrics.observe_cache("search", course_search.stats())
+    metrics.observe_cache("cart", cart_store.stats())
+    metrics.observe_queue("inbox", await inbox_processor.metrics())
+    metrics.observe_queue("outbox", await outbox_dispatcher.metrics())
+
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    """Метрики процесса в текстовом формате Prometheus."""
+    await metrics.registry.collect()
+    return web.Response(
+        text=metrics.registry.render(),
+        headers={
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+            "X-Worker-Id": str(request.app["worker_id"]),
+        },
+    )
+
+
+def setup_service_routes(app: web.Application) -> None:
+    """Регистрация служебных маршрутов (только с токеном SERVICE_TOKEN)."""
+    app.router.add_get("/stats", require_service_token(service_stats))
+    app.router.add_get("/outbox", require_service_token(outbox_metrics))
+    app.router.add_get("/metrics", require_service_token(prometheus_metrics))
@@ -3,15 +3,35 @@
 from pathlib import Path
 
 from aiogram import Router, F
-from aiogram.filters import CommandStart
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.filters import CommandObject, CommandStart
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from bot.config import config
+from bot.models import CourseView, FIRST_PAGE
 from bot.services import db
+from bot.services.cart_store import cart_store
+from bot.services.catalog import catalog_cache
+from bot.services.entitlements import entitlement_cache
+from bot.services.media import media_registry
+from bot.services.users import UserRecord
 from bot.keyboards import main_menu_kb, catalog_kb, course_detail_kb
 
 router = Router()
 
-WELCOME_PHOTO = Path(__file__).parent.parent.parent / "webapp" / "vardges.jpg"
+WEBAPP_DIR = Path(__file__).parent.parent.parent / "webapp"
+WELCOME_PHOTOS = {
+    "full": WEBAPP_DIR / "vardges.jpg",
+    "small": WEBAPP_DIR / "vardges_small.jpg",
+}
+# Уменьшенная копия — по настройке WELCOME_PHOTO_VARIANT, если файл есть
+WELCOME_PHOTO_VARIANT = (
+    config.welcome_photo_variant
+    if config.welcome_photo_variant in WELCOME_PHOTOS
+    and WELCOME_PHOTOS[config.welcome_photo_variant].exists()
+    else "full"
+)
+WELCOME_PHOTO = WELCOME_PHOTOS[WELCOME_PHOTO_VARIANT]
 
 WELCOME_TEXT = (
     "🎓 <b>VARDGES ACADEMY</b>\n"
@@ -34,21 +54,35 @@ WELCOME_TEXT = (
 )
 
 
-@router.message(CommandStart())
-async def cmd_start(message: Message) -> None:
-    """Приветствие + фото + главное меню."""
-    user = await db.get_or_create_user(
-        telegram_id=message.from_user.id,
-        full_name=message.from_user.full_name,
-        username=message.from_user.username,
+@router.message(CommandStart(deep_link=True, magic=F.args.regexp(r"^course_\d+$")))
+async def cmd_start_course(message: Message, command: CommandObject, user: UserRecord) -> None:
+    """Ссылка t.me/<бот>?start=course_<id> из inline-поиска — сразу карточка курса.
+
+    Аргумент user регистрирует пользователя, как и обычный /start.
+    """
+    course = await catalog_cache.get_course(int(command.args.removeprefix("course_")))
+    if not course:
+        await message.answer("Курс не найден", reply_markup=main_menu_kb())
+        return
+    text, markup = await _course_card(course, message.from_user.id)
+    await message.answer(
+        text,
+        reply_markup=markup,
+        parse_mode="HTML",
+        disable_web_page_preview=True,
     )
 
+
+@router.message(CommandStart())
+async def cmd_start(message: Message, user: UserRecord) -> None:
+    """Приветствие + фото + главное меню."""
     text = WELCOME_TEXT.format(name=user.full_name)
 
     if WELCOME_PHOTO.exists():
-        photo = FSInputFile(WELCOME_PHOTO)
-        await message.answer_photo(
-            photo=photo,
+        await media_registry.answer_photo(
+            message,
+            f"welcome:{WELCOME_PHOTO_VARIANT}",
+            WELCOME_PHOTO,
             caption=text,
             parse_mode="HTML",
             reply_markup=main_menu_kb(),
@@ -116,40 +150,58 @@ async def show_about(callback: CallbackQuery) -> None:
 # ─── Каталог ──────────────────────────────────────────────────
 
 @router.callback_query(F.data == "catalog")
+@router.callback_query(F.data.startswith("catalog:page:"))
 async def show_catalog(callback: CallbackQuery) -> None:
-    courses = await db.get_active_courses()
-    if not courses:
+    # catalog:page:<курсор>; просто catalog — первая страница
+    cursor = callback.data.split(":")[2] if callback.data != "catalog" else FIRST_PAGE
+    page, markup = await catalog_cache.get_page_markup(cursor, catalog_kb)
+    if not page.courses:
         await callback.answer("Курсов пока нет 😔", show_alert=True)
         return
     await callback.message.edit_text(
         "📚 <b>Каталог курсов</b>\n\nВыбери курс для подробностей:",
-        reply_markup=catalog_kb(courses),
+        reply_markup=markup,
         parse_mode="HTML",
     )
     await callback.answer()
 
 
+async def _course_card(
+    course: CourseView, telegram_id: int, cursor: str = FIRST_PAGE,
+) -> tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура карточки курса для пользователя."""
+    owned = await entitlement_cache.owns(telegram_id, course.id)
+    # Проверяем, есть ли курс уже в корзине
+    in_cart = not owned and course.id in await cart_store.get(telegram_id)
+
+    text = (
+        f"📖 <b>{course.title}</b>\n\n"
+        f"{course.description}\n\n"
+    )
+    if owned:
+        text += f"✅ <b>Курс уже куплен</b>\n🔗 {course.material_url}"
+    else:
+        text += f"💰 Цена: <b>{course.price:.0f} ₽</b>"
+    return text, course_detail_kb(course.id, in_cart=in_cart, owned=owned, cursor=cursor)
+
+
 @router.callback_query(F.data.startswith("course:"))
 async def show_course_detail(callback: CallbackQuery) -> None:
-    course_id = int(callback.data.split(":")[1])
-    course = await db.get_course(course_id)
+    # course:<id>:<курсор страницы каталога, куда вернуться>
+    _, course_id, *rest = callback.data.split(":")
+    course = await catalog_cache.get_course(int(course_id))
     if not course:
         await callback.answer("Курс не найден", show_alert=True)
         return
 
-    # Проверяем, есть ли курс уже в корзине
-    cart: list[int] = callback.bot.get(f"cart:{callback.from_user.id}", [])
-    in_cart = course_id in cart
-
-    text = (
-        f"📖 <b>{course.title}</b>\n\n"
-        f"{course.description}\n\n"
-        f"💰 Цена: <b>{course.price:.0f} ₽</b>"
+    text, markup = await _course_card(
+        course, callback.from_user.id, rest[0] if rest else FIRST_PAGE,
     )
     await callback.message.edit_text(
         text,
-        reply_markup=course_detail_kb(course_id, in_cart=in_cart),
+        reply_markup=markup,
         parse_mode="HTML",
+        disable_web_page_preview=True,
     )
     await callback.answer()
 
@@ -157,13 +209,10 @@ async def show_course_detail(callback: CallbackQuery) -> None:
 # ─── Мои курсы ────────────────────────────────────────────────
 
 @router.callback_query(F.data == "my_courses")
-async def show_my_courses(callback: CallbackQuery) -> None:
-    user = await db.get_user_by_telegram_id(callback.from_user.id)
-    if not user:
-        await callback.answer("Пользователь не найден", show_alert=True)
-        return
-
-    courses = await db.get_purchased_courses(user)
+async def show_my_courses(
+    callback: CallbackQuery, session: AsyncSession, user: UserRecord,
+) -> None:
+    courses = await db.get_purchased_courses(user, session=session)
     if not courses:
         await callback.answer("У тебя пока нет купленных курсов", show_alert=True)
         return
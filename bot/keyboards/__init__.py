@@ -4,10 +4,18 @@ from bot.keyboards.inline import (
     main_menu_kb,
     catalog_kb,
     course_detail_kb,
+    search_results_kb,
+    course_link_kb,
     cart_kb,
     admin_menu_kb,
     admin_courses_delete_kb,
+    admin_stats_kb,
+    back_to_stats_kb,
     back_to_admin_kb,
+    broadcast_segments_kb,
+    broadcast_courses_kb,
+    broadcast_confirm_kb,
+    broadcast_progress_kb,
     about_back_kb,
 )
 
@@ -15,9 +23,17 @@ __all__ = [
     "main_menu_kb",
     "catalog_kb",
     "course_detail_kb",
+    "search_results_kb",
+    "course_link_kb",
     "cart_kb",
     "admin_menu_kb",
     "admin_courses_delete_kb",
+    "admin_stats_kb",
+    "back_to_stats_kb",
     "back_to_admin_kb",
+    "broadcast_segments_kb",
+    "broadcast_courses_kb",
+    "broadcast_confirm_kb",
+    "broadcast_progress_kb",
     "about_back_kb",
 ]
@@ -3,7 +3,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.models import Course
+from bot.models import CourseView, CoursePage, FIRST_PAGE
 
 WEBAPP_URL = "https://vardges13.github.io/course-bot/"
 
@@ -33,22 +33,38 @@ def main_menu_kb() -> InlineKeyboardMarkup:
 
 # ─── Каталог ──────────────────────────────────────────────────
 
-def catalog_kb(courses: list[Course]) -> InlineKeyboardMarkup:
+def _page_nav(builder: InlineKeyboardBuilder, page: CoursePage, prefix: str) -> None:
+    """Кнопки «назад» / «вперёд» по страницам: callback_data = prefix + курсор."""
+    buttons = []
+    if page.prev_cursor:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=prefix + page.prev_cursor))
+    if page.next_cursor:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=prefix + page.next_cursor))
+    if buttons:
+        builder.row(*buttons)
+
+
+def catalog_kb(page: CoursePage) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for course in courses:
+    for course in page.courses:
         builder.row(
             InlineKeyboardButton(
                 text=f"{course.title} — {course.price:.0f} ₽",
-                callback_data=f"course:{course.id}",
+                callback_data=f"course:{course.id}:{page.cursor}",
             )
         )
+    _page_nav(builder, page, "catalog:page:")
     builder.row(InlineKeyboardButton(text="« Назад", callback_data="main_menu"))
     return builder.as_markup()
 
 
-def course_detail_kb(course_id: int, in_cart: bool = False) -> InlineKeyboardMarkup:
+def course_detail_kb(
+    course_id: int, in_cart: bool = False, owned: bool = False, cursor: str = FIRST_PAGE,
+) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    if in_cart:
+    if owned:
+        builder.row(InlineKeyboardButton(text="📦 Мои курсы", callback_data="my_courses"))
+    elif in_cart:
         builder.row(
             InlineKeyboardButton(
                 text="❌ Убрать из корзины", callback_data=f"cart_remove:{course_id}"
@@ -60,13 +76,35 @@ def course_detail_kb(course_id: int, in_cart: bool = False) -> InlineKeyboardMar
                 text="🛒 В корзину", callback_data=f"cart_add:{course_id}"
             )
         )
-    builder.row(InlineKeyboardButton(text="« Каталог", callback_data="catalog"))
+    builder.row(InlineKeyboardButton(text="« Каталог", callback_data=f"catalog:page:{cursor}"))
+    return builder.as_markup()
+
+
+# ─── Поиск ────────────────────────────────────────────────────
+
+def search_results_kb(courses: tuple[CourseView, ...]) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for course in courses:
+        builder.row(
+            InlineKeyboardButton(
+                text=f"{course.title} — {course.price:.0f} ₽",
+                callback_data=f"course:{course.id}",
+            )
+        )
+    builder.row(InlineKeyboardButton(text="« Главное меню", callback_data="main_menu"))
+    return builder.as_markup()
+
+
+def course_link_kb(url: str) -> InlineKeyboardMarkup:
+    """Кнопка под результатом inline-поиска: открыть курс в боте."""
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(text="📖 Открыть в боте", url=url))
     return builder.as_markup()
 
 
 # ─── Корзина ──────────────────────────────────────────────────
 
-def cart_kb(courses: list[Course]) -> InlineKeyboardMarkup:
+def cart_kb(courses: list[CourseView]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for course in courses:
         builder.row(
@@ -96,22 +134,81 @@ def admin_menu_kb() -> InlineKeyboardMarkup:
     builder.row(
         InlineKeyboardButton(text="📊 Статистика продаж", callback_data="admin:stats"),
     )
+    builder.row(
+        InlineKeyboardButton(text="📣 Рассылка", callback_data="admin:broadcast"),
+    )
     return builder.as_markup()
 
 
-def admin_courses_delete_kb(courses: list[Course]) -> InlineKeyboardMarkup:
+def admin_courses_delete_kb(page: CoursePage) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for course in courses:
+    for course in page.courses:
         builder.row(
             InlineKeyboardButton(
                 text=f"🗑 {course.title}",
-                callback_data=f"admin:del:{course.id}",
+                callback_data=f"admin:del:{course.id}:{page.cursor}",
             )
         )
+    _page_nav(builder, page, "admin:del_page:")
+    builder.row(InlineKeyboardButton(text="« Админ-панель", callback_data="admin:menu"))
+    return builder.as_markup()
+
+
+def admin_stats_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="📅 По дням", callback_data="admin:stats:days"),
+        InlineKeyboardButton(text="📚 По курсам", callback_data="admin:stats:courses"),
+    )
     builder.row(InlineKeyboardButton(text="« Админ-панель", callback_data="admin:menu"))
     return builder.as_markup()
 
 
+def back_to_stats_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(text="« Статистика", callback_data="admin:stats"))
+    return builder.as_markup()
+
+
+def broadcast_segments_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(text="👥 Все пользователи", callback_data="admin:bc:seg:all"))
+    builder.row(InlineKeyboardButton(text="📚 Покупатели курса", callback_data="admin:bc:seg:course"))
+    builder.row(
+        InlineKeyboardButton(text="🛒 Брошенные заказы", callback_data="admin:bc:seg:abandoned"),
+    )
+    builder.row(InlineKeyboardButton(text="« Админ-панель", callback_data="admin:menu"))
+    return builder.as_markup()
+
+
+def broadcast_courses_kb(page: CoursePage) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for course in page.courses:
+        builder.row(
+            InlineKeyboardButton(text=course.title, callback_data=f"admin:bc:course:{course.id}")
+        )
+    _page_nav(builder, page, "admin:bc:page:")
+    builder.row(InlineKeyboardButton(text="« Назад", callback_data="admin:broadcast"))
+    return builder.as_markup()
+
+
+def broadcast_confirm_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="🚀 Отправить", callback_data="admin:bc:send"),
+        InlineKeyboardButton(text="✖️ Отмена", callback_data="admin:menu"),
+    )
+    return builder.as_markup()
+
+
+def broadcast_progress_kb(broadcast_id: int) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="⛔ Остановить", callback_data=f"admin:bc:stop:{broadcast_id}")
+    )
+    return builder.as_markup()
+
+
 def about_back_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(InlineKeyboardButton(text="« Главное меню", callback_data="main_menu"))
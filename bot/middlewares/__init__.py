@@ -0,0 +1,17 @@
+"""Middleware бота и aiohttp-приложения."""
+
+from bot.middlewares.db import SESSION_KEY, DbSessionMiddleware, db_session_middleware
+from bot.middlewares.metrics import MetricsMiddleware, TelegramRequestMetrics, metrics_middleware
+from bot.middlewares.throttling import ThrottlingMiddleware
+from bot.middlewares.user import UserMiddleware
+
+__all__ = [
+    "SESSION_KEY",
+    "DbSessionMiddleware",
+    "db_session_middleware",
+    "MetricsMiddleware",
+    "TelegramRequestMetrics",
+    "metrics_middleware",
+    "ThrottlingMiddleware",
+    "UserMiddleware",
+]
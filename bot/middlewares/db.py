@@ -0,0 +1,52 @@
+"""Единица работы: одна сессия БД и одна транзакция на обновление или запрос.
+
+Сессия создаётся лениво — соединение берётся из пула только при первом
+обращении к БД, поэтому обработчики без запросов к БД ничего не платят.
+"""
+
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.models import async_session
+
+logger = logging.getLogger(__name__)
+
+# Ключ сессии БД в aiohttp-запросе: request[SESSION_KEY]
+SESSION_KEY = web.RequestKey("session", AsyncSession)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Передаёт обработчикам aiogram аргумент session и коммитит его после обработки."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with async_session() as session:
+            data["session"] = session
+            result = await handler(event, data)
+            # При исключении сессия закроется без commit — транзакция откатится
+            await session.commit()
+            return result
+
+
+@web.middleware
+async def db_session_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    """То же для aiohttp: request[SESSION_KEY], commit после успешного ответа."""
+    async with async_session() as session:
+        request[SESSION_KEY] = session
+        response = await handler(request)
+        if response.status < 400:
+            await session.commit()
+        return response
@@ -0,0 +1,104 @@
+"""Замеры времени обработчиков и запросов к Telegram для /metrics.
+
+- MetricsMiddleware — внутренний middleware aiogram: время конкретного
+  обработчика (router — модуль обработчиков, handler — имя функции);
+- metrics_middleware — то же для HTTP-маршрутов aiohttp (router=http),
+  вместе с commit сессии БД;
+- TelegramRequestMetrics — middleware сессии бота: время вызовов Bot API,
+  ошибки и ответы 429.
+"""
+
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+from bot.services import metrics
+
+
+def handler_labels(callback: Callable) -> tuple[str, str]:
+    """(router, handler) для функции-обработчика: bot.handlers.cart.checkout -> (cart, checkout)."""
+    module = getattr(callback, "__module__", "") or ""
+    return module.rsplit(".", 1)[-1], getattr(callback, "__name__", type(callback).__name__)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Гистограмма времени обработчиков aiogram. Регистрируется на наблюдателях
+    диспетчера и действует на обработчики всех вложенных роутеров."""
+
+    def __init__(self) -> None:
+        self._labels: dict[Callable, tuple[str, str]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        callback = data["handler"].callback
+        labels = self._labels.get(callback)
+        if labels is None:
+            labels = self._labels[callback] = handler_labels(callback)
+        router, name = labels
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.handler_errors.inc(router=router, handler=name)
+            raise
+        finally:
+            metrics.handler_seconds.observe(
+                time.perf_counter() - start, router=router, handler=name
+            )
+
+
+@web.middleware
+async def metrics_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    """Время HTTP-маршрутов: webhook ЮKassa, webhook Telegram, служебные."""
+    route = request.match_info.route
+    if route.resource is None:
+        # 404 / 405 — не засоряем метрики произвольными путями
+        return await handler(request)
+    name = getattr(route.handler, "__qualname__", type(route.handler).__name__)
+    start = time.perf_counter()
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except Exception:
+        metrics.handler_errors.inc(router="http", handler=name)
+        raise
+    finally:
+        metrics.handler_seconds.observe(time.perf_counter() - start, router="http", handler=name)
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Время и ошибки запросов к Telegram Bot API."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            metrics.telegram_retry_after.inc(method=name)
+            raise
+        except Exception as e:
+            metrics.telegram_errors.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            metrics.telegram_seconds.observe(time.perf_counter() - start, method=name)
@@ -0,0 +1,129 @@
+"""Защита от частых нажатий: лимит на пользователя, склейка дублей, блокировки.
+
+- Token bucket на пользователя: лишние обновления отбрасываются, на callback
+  отвечаем коротким уведомлением, чтобы у кнопки пропали «часики».
+- Single-flight: одинаковые callback'и пользователя (та же callback_data),
+  пришедшие, пока первый ещё обрабатывается, не запускают обработчик
+  повторно, а ждут и получают его результат.
+- Callback'и с префиксами из locked (по умолчанию checkout) выполняются
+  для пользователя строго по одному.
+
+Inline-запросы лимит не проходят: клиент шлёт запрос на каждое нажатие
+клавиши, и отброшенным оказался бы последний, полный запрос — без ответа
+у пользователя остались бы устаревшие результаты. Их и так обслуживает
+кэш поиска, а повторы гасит cache_time ответа.
+
+Состояние хранится в памяти процесса. Middleware регистрируется раньше
+DbSessionMiddleware, чтобы отброшенные обновления не трогали БД, а
+блокировка держалась до commit.
+"""
+
+import asyncio
+import logging
+import weakref
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from bot.services.ratelimit import KeyedRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(
+        self, rate: float, burst: float, locked: tuple[str, ...] = ("checkout",),
+    ) -> None:
+        self.limiter = KeyedRateLimiter(rate, burst) if rate > 0 else None
+        self.locked = tuple(locked)
+        self.passed = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.lock_waits = 0
+        self._in_flight: dict[tuple[int, str], asyncio.Future] = {}
+        self._locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or (isinstance(event, Update) and event.inline_query is not None):
+            return await handler(event, data)
+        callback = event.callback_query if isinstance(event, Update) else None
+
+        if self.limiter is not None and self.limiter.consume(user.id):
+            self.rejected += 1
+            if callback is not None:
+                await self._answer(callback, "⏳ Слишком часто, подожди секунду")
+            return None
+
+        if callback is None or not callback.data:
+            self.passed += 1
+            return await handler(event, data)
+
+        key = (user.id, callback.data)
+        running = self._in_flight.get(key)
+        if running is not None:
+            # Такое же нажатие уже обрабатывается — ждём его результат
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+                return None
+            except Exception:
+                return None
+            finally:
+                await self._answer(callback)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.passed += 1
+        try:
+            result = await self._run_locked(handler, event, data, user.id, callback.data)
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получит вызывающий, ожидающим дублям достаточно ответа
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._in_flight[key]
+
+    async def _run_locked(self, handler, event, data, user_id: int, callback_data: str) -> Any:
+        if not callback_data.startswith(self.locked):
+            return await handler(event, data)
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        if lock.locked():
+            self.lock_waits += 1
+        async with lock:
+            return await handler(event, data)
+
+    @staticmethod
+    async def _answer(callback: CallbackQuery, text: str | None = None) -> None:
+        try:
+            await callback.answer(text)
+        except Exception as e:
+            logger.debug("Не удалось ответить на callback: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "passed": self.passed,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "lock_waits": self.lock_waits,
+            "in_flight": len(self._in_flight),
+            "tracked_users": len(self.limiter) if self.limiter is not None else 0,
+        }
@@ -0,0 +1,38 @@
+"""Пользователь обновления для обработчиков: аргумент user (UserRecord).
+
+Пользователь разрешается только для обработчиков, которые объявили
+параметр user, — каталог и карточки курсов не трогают таблицу users.
+"""
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.services.users import user_cache
+
+
+class UserMiddleware(BaseMiddleware):
+    """Внутренний middleware: после фильтров, внутри сессии DbSessionMiddleware."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is not None and "user" in data["handler"].params:
+            session: AsyncSession = data["session"]
+            data["user"] = await user_cache.resolve(
+                telegram_id=from_user.id,
+                full_name=from_user.full_name,
+                username=from_user.username,
+                session=session,
+            )
+            # Не держим блокировку записи users до конца обработчика
+            if session.in_transaction():
+                await session.commit()
+        return await handler(event, data)
@@ -1,12 +1,36 @@
 """Экспорт всех моделей."""
 
-from bot.models.base import Base, engine, async_session, init_db
+from bot.models.base import (
+    Base, engine, async_session, init_db, dialect_insert, use_session, after_commit,
+    utcnow, as_utc,
+)
 from bot.models.user import User
 from bot.models.course import Course
+from bot.models.search import create_search_index
 from bot.models.order import Order, OrderItem, Payment
+from bot.models.cart import Cart
+from bot.models.media import MediaAsset
+from bot.models.fsm import FsmRecord
+from bot.models.inbox import WebhookInbox
+from bot.models.ledger import ProcessedWebhook
+from bot.models.entitlement import UserCourse
+from bot.models.stats import StatsCounter, StatsDaily
+from bot.models.outbox import OutboxMessage
+from bot.models.broadcast import Broadcast
+from bot.models.migrations import SchemaMigration
+from bot.models.views import (
+    CourseView, CoursePage, OrderItemView, OrderView, PaymentView, FIRST_PAGE,
+    COURSE_COLUMNS, ORDER_COLUMNS, ORDER_ITEM_COLUMNS, PAYMENT_COLUMNS, order_item_view,
+)
 
 __all__ = [
-    "Base", "engine", "async_session", "init_db",
-    "User", "Course",
+    "Base", "engine", "async_session", "init_db", "dialect_insert",
+    "use_session", "after_commit", "utcnow", "as_utc",
+    "User", "Course", "create_search_index",
     "Order", "OrderItem", "Payment",
+    "Cart", "MediaAsset", "FsmRecord", "WebhookInbox", "ProcessedWebhook",
+    "UserCourse", "StatsCounter", "StatsDaily", "OutboxMessage", "Broadcast",
+    "SchemaMigration",
+    "CourseView", "CoursePage", "OrderItemView", "OrderView", "PaymentView", "FIRST_PAGE",
+    "COURSE_COLUMNS", "ORDER_COLUMNS", "ORDER_ITEM_COLUMNS", "PAYMENT_COLUMNS", "order_item_view",
 ]
@@ -1,11 +1,18 @@
 """Базовый класс моделей и движок БД."""
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from bot.config import config
+from bot.models.engine import create_engine
 
-engine = create_async_engine(config.database_url, echo=False)
+engine = create_engine(config)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -13,7 +20,42 @@ class Base(DeclarativeBase):
     pass
 
 
+@asynccontextmanager
+async def use_session(session: AsyncSession | None) -> AsyncIterator[AsyncSession]:
+    """Сессия вызывающего или собственная с commit в конце."""
+    if session is not None:
+        yield session
+        return
+    async with async_session() as own:
+        yield own
+        await own.commit()
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Выполнить callback после успешного commit транзакции сессии."""
+    event.listen(session.sync_session, "after_commit", lambda _: callback(), once=True)
+
+
+def utcnow() -> datetime:
+    """Текущее время в UTC — все даты в БД хранятся в UTC."""
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value: datetime) -> datetime:
+    """Дата из БД с часовым поясом: SQLite возвращает даты без него."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def dialect_insert(model):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта (SQLite / PostgreSQL)."""
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
 async def init_db() -> None:
-    """Создание всех таблиц при старте бота."""
+    """Создание таблиц и применение миграций при старте бота."""
+    from bot.models.migrations import upgrade
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade)
@@ -0,0 +1,33 @@
+"""Модель рассылки администратора."""
+
+from sqlalchemy import BigInteger, Boolean, String, Text, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class Broadcast(Base):
+    """Рассылка по сегменту пользователей.
+
+    last_user_id — контрольная точка: получатели с id не больше неё уже
+    поставлены в outbox. После перезапуска рассылка продолжается с неё.
+    """
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    segment: Mapped[str] = mapped_column(String(32), nullable=False)  # all / course / abandoned
+    course_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    status: Mapped[str] = mapped_column(
+        String(20), default="running", nullable=False
+    )  # running / done / cancelled
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    exhausted: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    planned: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    delivered: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    admin_chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    progress_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    finished_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,17 @@
+"""Модель корзины."""
+
+from sqlalchemy import BigInteger, Text, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class Cart(Base):
+    """Корзина пользователя — id курсов через запятую."""
+    __tablename__ = "carts"
+
+    telegram_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    course_ids: Mapped[str] = mapped_column(Text, nullable=False)
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
@@ -1,6 +1,6 @@
 """Модель курса."""
 
-from sqlalchemy import String, Text, Numeric, Boolean
+from sqlalchemy import String, Text, Numeric, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from bot.models.base import Base
@@ -8,6 +8,9 @@ from bot.models.base import Base
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (
+        Index("ix_courses_active", "is_active", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
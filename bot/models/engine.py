@@ -0,0 +1,70 @@
+"""Профиль движка БД: параметры пула и PRAGMA для SQLite.
+
+Для SQLite по умолчанию включаются WAL (читатели не блокируют писателя),
+synchronous=NORMAL (безопасно в режиме WAL и заметно быстрее FULL) и
+busy_timeout, чтобы параллельные записи ждали блокировку, а не падали
+с «database is locked». Все значения настраиваются через Config.
+"""
+
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from bot.config import Config
+
+
+def sqlite_pragmas(cfg: Config) -> dict[str, str | int]:
+    return {
+        "journal_mode": cfg.sqlite_journal_mode,
+        "synchronous": cfg.sqlite_synchronous,
+        "busy_timeout": cfg.sqlite_busy_timeout,
+        "cache_size": cfg.sqlite_cache_size,
+        "mmap_size": cfg.sqlite_mmap_size,
+        "temp_store": cfg.sqlite_temp_store,
+    }
+
+
+def engine_options(cfg: Config) -> dict:
+    """Параметры create_async_engine для диалекта из DATABASE_URL."""
+    url = make_url(cfg.database_url)
+    options: dict = {"echo": False}
+
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # In-memory БД живёт в одном соединении — пул не настраиваем
+            return options
+        # Писатель в SQLite один, большой пул лишь множит ожидающих блокировку
+        options["pool_size"] = cfg.db_pool_size or 5
+        options["max_overflow"] = cfg.db_max_overflow if cfg.db_max_overflow >= 0 else 5
+        options["connect_args"] = {"timeout": cfg.sqlite_busy_timeout / 1000}
+    else:
+        options["pool_size"] = cfg.db_pool_size or 10
+        options["max_overflow"] = cfg.db_max_overflow if cfg.db_max_overflow >= 0 else 20
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = 1800
+
+    options["pool_timeout"] = cfg.db_pool_timeout
+    return options
+
+
+def create_engine(cfg: Config) -> AsyncEngine:
+    url = make_url(cfg.database_url)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    if is_sqlite and url.database not in (None, "", ":memory:"):
+        Path(url.database).parent.mkdir(parents=True, exist_ok=True)
+
+    engine = create_async_engine(cfg.database_url, **engine_options(cfg))
+
+    if is_sqlite:
+        pragmas = sqlite_pragmas(cfg)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
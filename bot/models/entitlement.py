@@ -0,0 +1,25 @@
+"""Модель права доступа пользователя к курсу."""
+
+from sqlalchemy import ForeignKey, Integer, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class UserCourse(Base):
+    """Курс, купленный пользователем.
+
+    Заполняется в транзакции подтверждения оплаты. Первичный ключ
+    (user_id, course_id) — «Мои курсы» и проверка владения читают одну
+    ветку индекса, без соединения с заказами.
+    """
+    __tablename__ = "user_courses"
+    __table_args__ = (
+        # Покупатели курса — для рассылок по сегменту
+        Index("ix_user_courses_course", "course_id", "user_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    course_id: Mapped[int] = mapped_column(ForeignKey("courses.id"), primary_key=True)
+    order_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    granted_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
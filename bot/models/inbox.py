@@ -0,0 +1,28 @@
+"""Входящие уведомления ЮKassa, ожидающие обработки."""
+
+from sqlalchemy import String, Text, Integer, DateTime, Index, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class WebhookInbox(Base):
+    __tablename__ = "webhook_inbox"
+    __table_args__ = (
+        UniqueConstraint("yookassa_id", "event", name="uq_webhook_inbox_payment_event"),
+        Index("ix_webhook_inbox_status_next", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    yookassa_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    event: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(
+        String(20), default="pending", nullable=False
+    )  # pending / processing / done / failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[str] = mapped_column(DateTime(timezone=True), nullable=False)
+    locked_until: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    processed_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,18 @@
+"""Журнал обработанных уведомлений ЮKassa."""
+
+from sqlalchemy import String, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class ProcessedWebhook(Base):
+    """Уведомление, побочные эффекты которого уже применены.
+
+    Ключ — «<id платежа ЮKassa>:<событие>».
+    """
+    __tablename__ = "processed_webhooks"
+
+    key: Mapped[str] = mapped_column(String(320), primary_key=True)
+    order_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    processed_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,18 @@
+"""Модель загруженного в Telegram медиафайла."""
+
+from sqlalchemy import String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class MediaAsset(Base):
+    """file_id файла в Telegram и хэш содержимого, с которым он был загружен."""
+    __tablename__ = "media_assets"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    file_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
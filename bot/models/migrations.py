@@ -0,0 +1,162 @@
+"""Миграции схемы БД.
+
+init_db создаёт недостающие таблицы (create_all), затем применяет
+миграции, которых ещё нет в таблице schema_migrations. Так существующие
+файлы data/bot.db обновляются на месте при старте бота.
+
+На новой БД create_all сразу создаёт актуальную схему, поэтому миграции
+только отмечаются применёнными. Чтобы добавить миграцию, опишите изменение
+в моделях и зарегистрируйте функцию через @migration(<следующий номер>, ...).
+"""
+
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import Connection, Integer, String, DateTime, inspect, insert, select, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+from bot.models.search import create_search_index
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    description: Mapped[str] = mapped_column(String(255), nullable=False)
+    applied_at: Mapped[str] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Зарегистрировать функцию миграции (выполняется синхронно в транзакции)."""
+    def decorator(func: Callable[[Connection], None]) -> Callable[[Connection], None]:
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+
+def _create_indexes(conn: Connection, table: str, *names: str) -> None:
+    for index in Base.metadata.tables[table].indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _add_columns(conn: Connection, table: str, *names: str) -> None:
+    """ALTER TABLE ... ADD COLUMN для описанных в модели колонок, которых нет в БД."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name in names:
+        if name in existing:
+            continue
+        column = Base.metadata.tables[table].c[name]
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN {name} {column.type.compile(conn.dialect)}"
+        ))
+
+
+# ─── Миграции ─────────────────────────────────────────────────
+
+@migration(1, "Индексы горячих запросов: заказы, элементы заказов, платежи, курсы")
+def _hot_path_indexes(conn: Connection) -> None:
+    _create_indexes(conn, "orders", "ix_orders_user_status", "ix_orders_status")
+    _create_indexes(conn, "order_items", "ix_order_items_order_id", "ix_order_items_course_id")
+    _create_indexes(conn, "payments", "ix_payments_status")
+    _create_indexes(conn, "courses", "ix_courses_active")
+
+
+@migration(2, "Таблица user_courses: права на курсы из оплаченных заказов")
+def _backfill_user_courses(conn: Connection) -> None:
+    # Таблицу уже создал create_all; переносим покупки из оплаченных заказов
+    conn.execute(text(
+        "INSERT INTO user_courses (user_id, course_id, order_id, granted_at) "
+        "SELECT o.user_id, oi.course_id, MIN(o.id), MIN(o.created_at) "
+        "FROM orders o JOIN order_items oi ON oi.order_id = o.id "
+        "WHERE o.status = 'paid' "
+        "GROUP BY o.user_id, oi.course_id"
+    ))
+
+
+@migration(3, "Накопительная статистика: stats_counters и stats_daily по всей истории")
+def _backfill_stats(conn: Connection) -> None:
+    from bot.services.stats import rebuild
+
+    rebuild(conn)
+
+
+@migration(4, "Повторное использование неоплаченных заказов: отпечаток корзины, срок жизни, ссылка на оплату")
+def _reusable_orders(conn: Connection) -> None:
+    _add_columns(conn, "orders", "cart_fingerprint", "expires_at")
+    _add_columns(conn, "payments", "confirmation_url")
+    _create_indexes(conn, "orders", "ix_orders_status_expires")
+
+
+@migration(5, "Индекс для обхода pending-платежей сверкой с ЮKassa")
+def _pending_payments_index(conn: Connection) -> None:
+    _create_indexes(conn, "payments", "ix_payments_status_id")
+
+
+@migration(6, "Рассылки: broadcast_id в outbox, индекс покупателей курса")
+def _broadcasts(conn: Connection) -> None:
+    _add_columns(conn, "outbox", "broadcast_id")
+    _create_indexes(conn, "outbox", "ix_outbox_broadcast")
+    _create_indexes(conn, "user_courses", "ix_user_courses_course")
+
+
+@migration(7, "Полнотекстовый поиск курсов: FTS5-индекс courses_fts и триггеры")
+def _course_search(conn: Connection) -> None:
+    create_search_index(conn)
+
+
+@migration(8, "Индекс неоплаченных заказов пользователя с expires_at вместо ix_orders_user_status")
+def _user_pending_orders_index(conn: Connection) -> None:
+    conn.execute(text("DROP INDEX IF EXISTS ix_orders_user_status"))
+    _create_indexes(conn, "orders", "ix_orders_user_status_expires")
+
+
+@migration(9, "Уникальный неоплаченный заказ на корзину вместо ix_orders_user_status_expires")
+def _unique_pending_cart(conn: Connection) -> None:
+    # Дубли, созданные до индекса: оставляем последний заказ, остальные — expired.
+    # Платежи не трогаем: если оплата всё же пройдёт, webhook переведёт заказ в paid
+    conn.execute(text(
+        "UPDATE orders SET status = 'expired' "
+        "WHERE status = 'pending' AND cart_fingerprint IS NOT NULL AND id < ("
+        "SELECT MAX(o.id) FROM orders o WHERE o.status = 'pending' "
+        "AND o.user_id = orders.user_id AND o.cart_fingerprint = orders.cart_fingerprint)"
+    ))
+    _create_indexes(conn, "orders", "ux_orders_user_pending_cart")
+    # Поиск неоплаченного заказа теперь идёт по уникальному индексу
+    conn.execute(text("DROP INDEX IF EXISTS ix_orders_user_status_expires"))
+
+
+# ─── Применение ───────────────────────────────────────────────
+
+def upgrade(conn: Connection) -> None:
+    """Привести схему БД к актуальной версии."""
+    fresh = not inspect(conn).has_table("users")
+    Base.metadata.create_all(conn)
+
+    applied = set(conn.execute(select(SchemaMigration.version)).scalars())
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        if m.version in applied:
+            continue
+        if not fresh:
+            logger.info("Миграция %s: %s", m.version, m.description)
+            m.upgrade(conn)
+        conn.execute(insert(SchemaMigration).values(
+            version=m.version,
+            description=m.description,
+            applied_at=datetime.now(timezone.utc),
+        ))
@@ -1,6 +1,6 @@
 """Модели заказа и платежа."""
 
-from sqlalchemy import BigInteger, ForeignKey, String, DateTime, Numeric, func
+from sqlalchemy import BigInteger, ForeignKey, String, DateTime, Numeric, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from bot.models.base import Base
@@ -8,14 +8,30 @@ from bot.models.base import Base
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_status", "status"),
+        Index("ix_orders_status_expires", "status", "expires_at"),
+        # Один неоплаченный заказ на корзину: два checkout в разных процессах
+        # (WORKERS > 1) не создадут два заказа и два платежа. По нему же
+        # ищется неоплаченный заказ пользователя на ту же корзину
+        Index(
+            "ux_orders_user_pending_cart", "user_id", "cart_fingerprint",
+            unique=True,
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     status: Mapped[str] = mapped_column(
         String(50), default="pending", nullable=False
-    )  # pending / paid / cancelled
+    )  # pending / paid / cancelled / expired
     total_amount: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # sha256 набора курсов и цен — повторный checkout той же корзины находит этот заказ
+    cart_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    expires_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     user: Mapped["User"] = relationship(back_populates="orders")  # noqa: F821
     items: Mapped[list["OrderItem"]] = relationship(back_populates="order", cascade="all, delete-orphan")
@@ -25,6 +41,10 @@ class Order(Base):
 class OrderItem(Base):
     """Элемент заказа — связь заказа с курсом."""
     __tablename__ = "order_items"
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+        Index("ix_order_items_course_id", "course_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), nullable=False)
@@ -37,6 +57,12 @@ class OrderItem(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # status + amount — выручка считается по индексу, без чтения таблицы
+        Index("ix_payments_status", "status", "amount"),
+        # Постраничный обход зависших pending-платежей по id
+        Index("ix_payments_status_id", "status", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), unique=True, nullable=False)
@@ -47,5 +73,6 @@ class Payment(Base):
     )  # pending / succeeded / canceled
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
     paid_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    confirmation_url: Mapped[str | None] = mapped_column(String(1024), nullable=True)
 
     order: Mapped["Order"] = relationship(back_populates="payment")
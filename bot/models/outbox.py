@@ -0,0 +1,37 @@
+"""Исходящие сообщения Telegram, ожидающие отправки."""
+
+from sqlalchemy import (
+    BigInteger, Boolean, String, Text, Integer, DateTime, Index, func,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_claim", "status", "priority", "id"),
+        Index("ix_outbox_broadcast", "broadcast_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    parse_mode: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    disable_web_page_preview: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    reply_markup: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    # Меньше — раньше: уведомления об оплате идут до рассылок
+    priority: Mapped[int] = mapped_column(Integer, default=5, nullable=False)
+    # Ключ от повторной постановки того же сообщения (например, «payment:<id>:<событие>»)
+    dedup_key: Mapped[str | None] = mapped_column(String(255), unique=True, nullable=True)
+    broadcast_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    status: Mapped[str] = mapped_column(
+        String(20), default="pending", nullable=False
+    )  # pending / sending / sent / failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[str] = mapped_column(DateTime(timezone=True), nullable=False)
+    locked_until: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    sent_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
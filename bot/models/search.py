@@ -0,0 +1,71 @@
+"""Полнотекстовый индекс курсов (SQLite FTS5).
+
+courses_fts — FTS5-таблица с внешним содержимым (content='courses'):
+хранит только индекс по названию и описанию активных курсов. Индекс
+обновляют триггеры на courses, поэтому любая запись в таблицу курсов —
+из админки, миграции или прямым INSERT — сразу видна в поиске.
+
+Токенизатор unicode61 приводит регистр (в том числе кириллицы), но не
+считает «ё» буквой «е» с диакритикой — триггеры и запрос поиска заменяют
+«ё» на «е» сами. Префиксные индексы на 2 и 3 символа ускоряют запросы
+вида «прог*».
+
+На PostgreSQL таблица не создаётся — поиск использует ILIKE
+(bot.services.search).
+"""
+
+from sqlalchemy import Connection, DDL, event, text
+
+from bot.models.course import Course
+
+
+def _fold(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _index_row(alias: str) -> str:
+    return f"{alias}.id, {_fold(f'{alias}.title')}, {_fold(f'{alias}.description')}"
+
+
+SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5("
+    "title, description, content='courses', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS courses_fts_insert AFTER INSERT ON courses "
+    "WHEN new.is_active BEGIN "
+    f"INSERT INTO courses_fts (rowid, title, description) VALUES ({_index_row('new')}); "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS courses_fts_delete AFTER DELETE ON courses "
+    "WHEN old.is_active BEGIN "
+    "INSERT INTO courses_fts (courses_fts, rowid, title, description) "
+    f"VALUES ('delete', {_index_row('old')}); "
+    "END",
+
+    # Мягкое удаление (is_active = 0) убирает курс из индекса, восстановление — возвращает
+    "CREATE TRIGGER IF NOT EXISTS courses_fts_update "
+    "AFTER UPDATE OF title, description, is_active ON courses BEGIN "
+    "INSERT INTO courses_fts (courses_fts, rowid, title, description) "
+    f"SELECT 'delete', {_index_row('old')} WHERE old.is_active; "
+    "INSERT INTO courses_fts (rowid, title, description) "
+    f"SELECT {_index_row('new')} WHERE new.is_active; "
+    "END",
+)
+
+# Новая БД: индекс и триггеры создаются вместе с таблицей courses (create_all)
+for _statement in SEARCH_DDL:
+    event.listen(Course.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def create_search_index(conn: Connection) -> None:
+    """Создать индекс и триггеры в существующей БД и проиндексировать активные курсы."""
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in SEARCH_DDL:
+        conn.execute(text(statement))
+    conn.execute(text("INSERT INTO courses_fts (courses_fts) VALUES ('delete-all')"))
+    conn.execute(text(
+        "INSERT INTO courses_fts (rowid, title, description) "
+        f"SELECT {_index_row('c')} FROM courses c WHERE c.is_active"
+    ))
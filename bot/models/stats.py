@@ -0,0 +1,30 @@
+"""Модели накопительной статистики продаж."""
+
+from sqlalchemy import String, Integer, Numeric
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.models.base import Base
+
+
+class StatsCounter(Base):
+    """Итоговый счётчик: users, orders, paid_orders, revenue."""
+    __tablename__ = "stats_counters"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+
+
+class StatsDaily(Base):
+    """Показатели за день (UTC): итог дня (course_id = 0) и по каждому курсу.
+
+    Для курсов orders / paid_orders — число позиций в заказах, revenue —
+    сумма их цен. new_users заполняется только в строке итога дня.
+    """
+    __tablename__ = "stats_daily"
+
+    day: Mapped[str] = mapped_column(String(10), primary_key=True)  # YYYY-MM-DD
+    course_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    paid_orders: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    revenue: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    new_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,84 @@
+"""Модели чтения: неизменяемые срезы строк для обработчиков и клавиатур.
+
+Заполняются из кортежей Core-запросов — без identity map и
+инструментирования ORM. Записи по-прежнему идут через ORM-модели.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import Row
+
+from bot.models.course import Course
+from bot.models.order import Order, OrderItem, Payment
+from bot.models.user import User
+
+
+@dataclass(frozen=True, slots=True)
+class CourseView:
+    id: int
+    title: str
+    description: str
+    price: Decimal
+    material_url: str
+
+
+# Курсор страницы каталога (keyset): "a<id>" — курсы с id больше <id>,
+# "b<id>" — последние курсы с id меньше <id>
+FIRST_PAGE = "a0"
+
+
+@dataclass(frozen=True, slots=True)
+class CoursePage:
+    cursor: str
+    courses: tuple[CourseView, ...]
+    prev_cursor: str | None
+    next_cursor: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class PaymentView:
+    id: int
+    yookassa_id: str
+    status: str
+    amount: Decimal
+    confirmation_url: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class OrderItemView:
+    id: int
+    price: Decimal
+    course: CourseView
+
+
+@dataclass(frozen=True, slots=True)
+class OrderView:
+    id: int
+    user_id: int
+    telegram_id: int
+    status: str
+    total_amount: Decimal
+    cart_fingerprint: str | None
+    created_at: datetime | None
+    expires_at: datetime | None
+    items: tuple[OrderItemView, ...]
+    payment: PaymentView | None
+
+
+# Столбцы в порядке полей — строку запроса можно распаковать в конструктор
+COURSE_COLUMNS = (Course.id, Course.title, Course.description, Course.price, Course.material_url)
+PAYMENT_COLUMNS = (
+    Payment.id, Payment.yookassa_id, Payment.status, Payment.amount, Payment.confirmation_url,
+)
+ORDER_COLUMNS = (
+    Order.id, Order.user_id, User.telegram_id, Order.status, Order.total_amount,
+    Order.cart_fingerprint, Order.created_at, Order.expires_at,
+)
+ORDER_ITEM_COLUMNS = (OrderItem.id, OrderItem.price, *COURSE_COLUMNS)
+
+
+def order_item_view(row: Row) -> OrderItemView:
+    item_id, price, *course = row
+    return OrderItemView(item_id, price, CourseView(*course))
@@ -0,0 +1,330 @@
+"""Рассылки администратора по сегментам пользователей.
+
+Получатели читаются из БД пачками по BROADCAST_BATCH_SIZE с постраничным
+обходом по users.id (keyset) — весь сегмент в память не загружается.
+Каждая пачка ставится в outbox вместе с контрольной точкой last_user_id в
+одной транзакции, поэтому после падения процесса рассылка продолжается
+ровно с того места, где остановилась. Скорость отправки задаёт диспетчер
+outbox (лимиты Telegram), а рассылка держит в очереди не больше
+BROADCAST_MAX_BACKLOG своих сообщений, чтобы не раздувать таблицу и не
+задерживать остальные уведомления. Итог каждого сообщения диспетчер
+записывает в счётчики delivered / failed рассылки.
+
+Ход рассылки раз в BROADCAST_PROGRESS_INTERVAL секунд обновляется в
+сообщении администратора. Рассылками управляет один процесс — тот же, что
+отправляет outbox.
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from sqlalchemy import select, update, delete, func, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from bot.config import config
+from bot.keyboards import broadcast_progress_kb, back_to_admin_kb
+from bot.models import (
+    async_session, utcnow, Broadcast, Course, Order, OutboxMessage, User, UserCourse,
+)
+from bot.services import outbox
+
+logger = logging.getLogger(__name__)
+
+# Сегменты получателей
+SEGMENT_ALL = "all"
+SEGMENT_COURSE = "course"
+SEGMENT_ABANDONED = "abandoned"
+
+SEGMENT_TITLES = {
+    SEGMENT_ALL: "все пользователи",
+    SEGMENT_COURSE: "покупатели курса",
+    SEGMENT_ABANDONED: "брошенные заказы",
+}
+
+
+def recipients_query(segment: str, course_id: int | None = None):
+    """SELECT (users.id, users.telegram_id) получателей сегмента."""
+    stmt = select(User.id, User.telegram_id)
+    if segment == SEGMENT_COURSE:
+        stmt = stmt.join(UserCourse, UserCourse.user_id == User.id).where(
+            UserCourse.course_id == course_id
+        )
+    elif segment == SEGMENT_ABANDONED:
+        # Есть неоплаченный заказ, после которого пользователь ничего не купил
+        abandoned, paid = aliased(Order), aliased(Order)
+        bought_later = exists().where(
+            paid.user_id == abandoned.user_id,
+            paid.status == "paid",
+            paid.id > abandoned.id,
+        ).correlate(abandoned)
+        stmt = stmt.where(
+            exists().where(
+                abandoned.user_id == User.id,
+                abandoned.status.in_(("pending", "expired")),
+                ~bought_later,
+            )
+        )
+    elif segment != SEGMENT_ALL:
+        raise ValueError(f"Неизвестный сегмент: {segment}")
+    return stmt
+
+
+async def count_recipients(
+    segment: str, course_id: int | None, session: AsyncSession,
+) -> int:
+    subq = recipients_query(segment, course_id).subquery()
+    return await session.scalar(select(func.count()).select_from(subq)) or 0
+
+
+async def create_broadcast(
+    text: str,
+    segment: str,
+    admin_chat_id: int,
+    progress_message_id: int | None,
+    course_id: int | None = None,
+    session: AsyncSession | None = None,
+) -> Broadcast:
+    """Создать рассылку в статусе running. Запускает её BroadcastRunner после commit."""
+    broadcast = Broadcast(
+        text=text,
+        segment=segment,
+        course_id=course_id,
+        planned=await count_recipients(segment, course_id, session),
+        admin_chat_id=admin_chat_id,
+        progress_message_id=progress_message_id,
+    )
+    session.add(broadcast)
+    await session.flush()
+    return broadcast
+
+
+async def segment_title(broadcast: Broadcast, session: AsyncSession) -> str:
+    title = SEGMENT_TITLES.get(broadcast.segment, broadcast.segment)
+    if broadcast.segment == SEGMENT_COURSE:
+        course = await session.get(Course, broadcast.course_id)
+        title += f" «{course.title}»" if course else f" #{broadcast.course_id}"
+    return title
+
+
+def progress_text(broadcast: Broadcast, segment: str, rate: float | None = None) -> str:
+    status = {
+        "running": "⏳ идёт",
+        "done": "✅ завершена",
+        "cancelled": "⛔ остановлена",
+    }.get(broadcast.status, broadcast.status)
+    done = broadcast.delivered + broadcast.failed
+    planned = max(broadcast.planned, broadcast.total)
+    percent = f" ({done / planned:.0%})" if planned else ""
+    lines = [
+        f"📣 <b>Рассылка #{broadcast.id}</b> — {status}",
+        f"Сегмент: {segment}\n",
+        f"👥 Получателей: {planned}",
+        f"📤 Обработано: {done}{percent}",
+        f"✅ Доставлено: {broadcast.delivered}",
+        f"❌ Не доставлено: {broadcast.failed}",
+    ]
+    if broadcast.status == "running" and rate:
+        left = max(planned - done, 0)
+        lines.append(f"⚡ {rate:.1f} сообщ./с, осталось ~{left / rate / 60:.0f} мин")
+    return "\n".join(lines)
+
+
+class BroadcastRunner:
+    """Фоновая постановка рассылок в outbox и отчёт о ходе в чат администратора."""
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        max_backlog: int = 2000,
+        progress_interval: float = 5.0,
+        poll_interval: float = 2.0,
+    ) -> None:
+        self.batch_size = batch_size
+        self.max_backlog = max_backlog
+        self.progress_interval = progress_interval
+        self.poll_interval = poll_interval
+        self.enqueued = 0
+        self._bot: Bot | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # broadcast_id -> (monotonic, обработано) последнего отчёта
+        self._reported: dict[int, tuple[float, int]] = {}
+
+    def notify(self) -> None:
+        """Разбудить обработчик — создана или остановлена рассылка."""
+        self._wakeup.set()
+
+    async def _backlog(self, broadcast_id: int, session: AsyncSession) -> int:
+        return await session.scalar(
+            select(func.count(OutboxMessage.id)).where(
+                OutboxMessage.broadcast_id == broadcast_id,
+                OutboxMessage.status.in_(("pending", "sending")),
+            )
+        ) or 0
+
+    async def _enqueue_batch(self, broadcast: Broadcast, session: AsyncSession) -> int:
+        """Поставить в outbox следующую пачку получателей и сдвинуть контрольную точку."""
+        rows = (await session.execute(
+            recipients_query(broadcast.segment, broadcast.course_id)
+            .where(User.id > broadcast.last_user_id)
+            .order_by(User.id)
+            .limit(self.batch_size)
+        )).all()
+        if not rows:
+            broadcast.exhausted = True
+            return 0
+        # Сообщения и контрольная точка пишутся одной транзакцией;
+        # dedup_key — дополнительная защита от повторной постановки
+        added = await outbox.enqueue_many([
+            outbox.message_row(
+                telegram_id,
+                broadcast.text,
+                priority=outbox.PRIORITY_MARKETING,
+                dedup_key=f"broadcast:{broadcast.id}:{user_id}",
+                broadcast_id=broadcast.id,
+            )
+            for user_id, telegram_id in rows
+        ], session=session)
+        broadcast.last_user_id = rows[-1][0]
+        broadcast.total += added
+        if len(rows) < self.batch_size:
+            broadcast.exhausted = True
+        self.enqueued += added
+        return added
+
+    async def _step(self, broadcast_id: int) -> bool:
+        """Один шаг рассылки. True — поставлена новая пачка, можно сразу продолжать."""
+        async with async_session() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            if broadcast is None or broadcast.status != "running":
+                return False
+            backlog = await self._backlog(broadcast_id, session)
+            added = 0
+            if not broadcast.exhausted and backlog < self.max_backlog:
+                added = await self._enqueue_batch(broadcast, session)
+            elif broadcast.exhausted and backlog == 0:
+                broadcast.status = "done"
+                broadcast.finished_at = utcnow()
+                logger.info(
+                    "Рассылка %s завершена: доставлено %s, не доставлено %s",
+                    broadcast.id, broadcast.delivered, broadcast.failed,
+                )
+            await session.commit()
+        if added:
+            outbox.outbox_dispatcher.notify()
+        await self.report(broadcast_id, force=broadcast.status != "running")
+        return added > 0 and not broadcast.exhausted
+
+    async def report(self, broadcast_id: int, force: bool = False) -> None:
+        """Обновить сообщение с ходом рассылки (не чаще progress_interval)."""
+        now = time.monotonic()
+        last = self._reported.get(broadcast_id)
+        if not force and last is not None and now - last[0] < self.progress_interval:
+            return
+        async with async_session() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            if broadcast is None or broadcast.progress_message_id is None:
+                return
+            segment = await segment_title(broadcast, session)
+        done = broadcast.delivered + broadcast.failed
+        rate = (done - last[1]) / (now - last[0]) if last and now > last[0] else None
+        self._reported[broadcast_id] = (now, done)
+        if broadcast.status != "running":
+            self._reported.pop(broadcast_id, None)
+        if self._bot is None:
+            return
+        try:
+            await self._bot.edit_message_text(
+                text=progress_text(broadcast, segment, rate),
+                chat_id=broadcast.admin_chat_id,
+                message_id=broadcast.progress_message_id,
+                reply_markup=(
+                    broadcast_progress_kb(broadcast.id)
+                    if broadcast.status == "running" else back_to_admin_kb()
+                ),
+                parse_mode="HTML",
+            )
+        except (TelegramBadRequest, TelegramRetryAfter) as e:
+            # «message is not modified», удалённое сообщение или flood control —
+            # отчёт просто пропускается, рассылка продолжается
+            logger.debug("Отчёт о рассылке %s не обновлён: %s", broadcast_id, e)
+        except Exception as e:
+            logger.warning("Ошибка обновления отчёта о рассылке %s: %s", broadcast_id, e)
+
+    async def cancel(self, broadcast_id: int, session: AsyncSession) -> bool:
+        """Остановить рассылку и убрать из outbox её неотправленные сообщения."""
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == "running")
+            .values(status="cancelled", finished_at=utcnow())
+        )
+        if not result.rowcount:
+            return False
+        await session.execute(
+            delete(OutboxMessage).where(
+                OutboxMessage.broadcast_id == broadcast_id,
+                OutboxMessage.status == "pending",
+            )
+        )
+        return True
+
+    async def _running_ids(self) -> list[int]:
+        async with async_session() as session:
+            return list((await session.execute(
+                select(Broadcast.id).where(Broadcast.status == "running").order_by(Broadcast.id)
+            )).scalars())
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            busy = False
+            try:
+                for broadcast_id in await self._running_ids():
+                    busy |= await self._step(broadcast_id)
+            except Exception as e:
+                logger.error("Ошибка обработки рассылок: %s", e)
+            if not busy:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def start(self, bot: Bot) -> None:
+        """Запуск; рассылки, прерванные остановкой процесса, продолжаются."""
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def metrics(self) -> dict:
+        async with async_session() as session:
+            running = (await session.execute(
+                select(
+                    func.count(Broadcast.id),
+                    func.coalesce(func.sum(Broadcast.total - Broadcast.delivered - Broadcast.failed), 0),
+                ).where(Broadcast.status == "running")
+            )).one()
+        return {
+            "running": running[0],
+            "in_queue": running[1],
+            "enqueued": self.enqueued,
+        }
+
+
+broadcast_runner = BroadcastRunner(
+    batch_size=config.broadcast_batch_size,
+    max_backlog=config.broadcast_max_backlog,
+    progress_interval=config.broadcast_progress_interval,
+)
@@ -0,0 +1,360 @@
+"""Хранилище корзин пользователей.
+
+Два бэкенда:
+- MemoryCartStore — в памяти процесса, LRU + TTL, ограничено по числу корзин;
+- SQLiteCartStore — таблица carts в БД с отложенной пакетной записью,
+  перед ней — ограниченный LRU-кэш для чтения.
+
+Нажатия «в корзину» и «убрать» меняют корзину через add/remove, а не
+чтением и записью всего списка: два одновременных нажатия не теряют курс.
+В памяти процесса изменение выполняется без переключения задач, в режиме
+shared — одним SQL-запросом.
+"""
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, update, case, func, literal
+
+from bot.config import config
+from bot.models import async_session, dialect_insert, Cart
+
+logger = logging.getLogger(__name__)
+
+
+class CartStore(ABC):
+    """Интерфейс хранилища корзин: telegram_id -> список id курсов."""
+
+    # Не больше курсов в одной корзине
+    max_items: int
+
+    @abstractmethod
+    async def get(self, user_id: int) -> list[int]:
+        ...
+
+    @abstractmethod
+    async def set(self, user_id: int, cart: list[int]) -> None:
+        ...
+
+    async def add(self, user_id: int, course_id: int) -> bool:
+        """Добавить курс в корзину. False — он уже там или корзина заполнена.
+
+        После get до set управление другим задачам не передаётся, поэтому
+        для корзин в памяти процесса изменение атомарно.
+        """
+        cart = await self.get(user_id)
+        if course_id in cart or len(cart) >= self.max_items:
+            return False
+        await self.set(user_id, cart + [course_id])
+        return True
+
+    async def remove(self, user_id: int, course_id: int) -> bool:
+        """Убрать курс из корзины. False — его там не было."""
+        cart = await self.get(user_id)
+        if course_id not in cart:
+            return False
+        cart.remove(course_id)
+        await self.set(user_id, cart)
+        return True
+
+    async def clear(self, user_id: int) -> None:
+        await self.set(user_id, [])
+
+    def stats(self) -> dict:
+        """Счётчики кэша корзин в памяти."""
+        return {}
+
+    async def start(self) -> None:
+        """Запуск фоновых задач (если нужны)."""
+
+    async def close(self) -> None:
+        """Остановка с сохранением несброшенных данных."""
+
+
+class MemoryCartStore(CartStore):
+    """Корзины в памяти с вытеснением по LRU и TTL.
+
+    Память ограничена: не более max_carts корзин по max_items курсов.
+    """
+
+    def __init__(self, max_carts: int, ttl: float, max_items: int) -> None:
+        self.max_carts = max_carts
+        self.ttl = ttl
+        self.max_items = max_items
+        self._data: OrderedDict[int, tuple[float, tuple[int, ...]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _load(self, user_id: int) -> tuple[int, ...] | None:
+        """Корзина из памяти или None, если её нет или она устарела."""
+        entry = self._data.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, items = entry
+        if expires_at < time.monotonic():
+            del self._data[user_id]
+            self.misses += 1
+            return None
+        self._data.move_to_end(user_id)
+        self.hits += 1
+        return items
+
+    def _store(self, user_id: int, items: tuple[int, ...]) -> None:
+        self._data[user_id] = (time.monotonic() + self.ttl, items[: self.max_items])
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_carts:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    async def get(self, user_id: int) -> list[int]:
+        return list(self._load(user_id) or ())
+
+    async def set(self, user_id: int, cart: list[int]) -> None:
+        if cart:
+            self._store(user_id, tuple(cart))
+        else:
+            self._data.pop(user_id, None)
+
+
+class SQLiteCartStore(CartStore):
+    """Корзины в таблице carts с отложенной записью (write-behind).
+
+    Изменения копятся в памяти и сбрасываются в БД пачками раз в
+    flush_interval секунд или при накоплении batch_size изменений.
+    Чтения обслуживает ограниченный LRU-кэш, промахи идут в БД.
+
+    В режиме shared (несколько процессов бота) кэш и отложенная запись
+    отключены: каждое чтение и запись идут напрямую в БД.
+    """
+
+    def __init__(
+        self,
+        cache: MemoryCartStore,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        purge_interval: float = 3600,
+        shared: bool = False,
+    ) -> None:
+        self._cache = cache
+        self.shared = shared
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.purge_interval = purge_interval
+        self._dirty: dict[int, tuple[int, ...]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._last_purge = 0.0
+
+    @property
+    def max_items(self) -> int:
+        return self._cache.max_items
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["dirty"] = len(self._dirty)
+        return stats
+
+    async def get(self, user_id: int) -> list[int]:
+        if not self.shared:
+            if user_id in self._dirty:
+                return list(self._dirty[user_id])
+            items = self._cache._load(user_id)
+            if items is not None:
+                return list(items)
+
+        async with async_session() as session:
+            raw = await session.scalar(
+                select(Cart.course_ids).where(Cart.telegram_id == user_id)
+            )
+        items = tuple(int(x) for x in raw.split(",") if x) if raw else ()
+        if not self.shared:
+            # Пока ждали БД, корзину могли изменить: свежая версия — в _dirty
+            if user_id in self._dirty:
+                return list(self._dirty[user_id])
+            # Пустые корзины тоже кэшируем, чтобы не ходить за ними в БД
+            self._cache._store(user_id, items)
+        return list(items)
+
+    async def set(self, user_id: int, cart: list[int]) -> None:
+        items = tuple(cart)[: self._cache.max_items]
+        if self.shared:
+            await self._write({user_id: items})
+            return
+        self._cache._store(user_id, items)
+        self._dirty[user_id] = items
+        if len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    async def add(self, user_id: int, course_id: int) -> bool:
+        if self.shared:
+            return await self._add_shared(user_id, course_id)
+        return await super().add(user_id, course_id)
+
+    async def remove(self, user_id: int, course_id: int) -> bool:
+        if self.shared:
+            return await self._remove_shared(user_id, course_id)
+        return await super().remove(user_id, course_id)
+
+    async def _add_shared(self, user_id: int, course_id: int) -> bool:
+        """Дописать курс одним INSERT ... ON CONFLICT DO UPDATE ... RETURNING.
+
+        Условие DO UPDATE проверяет корзину в момент записи: курса ещё нет и
+        место есть. Если условие не выполнено, строка не возвращается.
+        """
+        item = str(course_id)
+        stored = Cart.__table__.c.course_ids
+        items_in_cart = func.length(stored) - func.length(func.replace(stored, ",", "")) + 1
+        stmt = dialect_insert(Cart).values(
+            telegram_id=user_id, course_ids=item, updated_at=datetime.now(timezone.utc),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Cart.telegram_id],
+            set_={
+                "course_ids": stored + "," + stmt.excluded.course_ids,
+                "updated_at": stmt.excluded.updated_at,
+            },
+            where=(
+                ~(literal(",") + stored + ",").contains(f",{item},")
+                & (items_in_cart < self.max_items)
+            ),
+        ).returning(Cart.course_ids)
+        async with async_session() as session:
+            added = (await session.execute(stmt)).scalar() is not None
+            await session.commit()
+        return added
+
+    async def _remove_shared(self, user_id: int, course_id: int) -> bool:
+        """Вырезать курс одним UPDATE ... RETURNING; опустевшую корзину удалить."""
+        wrapped = literal(",") + Cart.course_ids + ","
+        without = func.replace(wrapped, f",{course_id},", ",")
+        stmt = (
+            update(Cart)
+            .where(Cart.telegram_id == user_id, wrapped.contains(f",{course_id},"))
+            .values(
+                # ",1,3," -> "1,3"; от последнего курса остаётся ","
+                course_ids=case(
+                    (without == ",", ""),
+                    else_=func.substr(without, 2, func.length(without) - 2),
+                ),
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(Cart.course_ids)
+            .execution_options(synchronize_session=False)
+        )
+        async with async_session() as session:
+            left = (await session.execute(stmt)).scalar()
+            if left == "":
+                await session.execute(
+                    delete(Cart).where(Cart.telegram_id == user_id, Cart.course_ids == "")
+                )
+            await session.commit()
+        return left is not None
+
+    async def _write(self, batch: dict[int, tuple[int, ...]]) -> None:
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"telegram_id": uid, "course_ids": ",".join(map(str, items)), "updated_at": now}
+            for uid, items in batch.items() if items
+        ]
+        empty = [uid for uid, items in batch.items() if not items]
+        async with async_session() as session:
+            if rows:
+                stmt = dialect_insert(Cart)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Cart.telegram_id],
+                    set_={
+                        "course_ids": stmt.excluded.course_ids,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                )
+                await session.execute(stmt, rows)
+            if empty:
+                await session.execute(delete(Cart).where(Cart.telegram_id.in_(empty)))
+            await session.commit()
+
+    async def flush(self) -> None:
+        """Сбросить накопленные изменения в БД."""
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        try:
+            await self._write(batch)
+        except Exception:
+            # Возвращаем несохранённое, не затирая более свежие изменения
+            for uid, items in batch.items():
+                self._dirty.setdefault(uid, items)
+            raise
+
+    async def purge_expired(self) -> None:
+        """Удалить корзины, не менявшиеся дольше TTL."""
+        border = datetime.now(timezone.utc) - timedelta(seconds=self._cache.ttl)
+        async with async_session() as session:
+            await session.execute(delete(Cart).where(Cart.updated_at < border))
+            await session.commit()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_purge > self.purge_interval:
+                    await self.purge_expired()
+                    self._last_purge = time.monotonic()
+            except Exception as e:
+                logger.error("Ошибка при сохранении корзин: %s", e)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def create_cart_store() -> CartStore:
+    """Хранилище корзин согласно CART_BACKEND."""
+    memory = MemoryCartStore(
+        max_carts=config.cart_cache_size,
+        ttl=config.cart_ttl,
+        max_items=config.cart_max_items,
+    )
+    if config.multi_worker:
+        if config.cart_backend == "memory":
+            logger.warning("CART_BACKEND=memory не работает с несколькими процессами, используем БД")
+        return SQLiteCartStore(memory, shared=True)
+    if config.cart_backend == "memory":
+        return memory
+    return SQLiteCartStore(memory, flush_interval=config.cart_flush_interval)
+
+
+cart_store = create_cart_store()
@@ -0,0 +1,202 @@
+"""Каталог активных курсов по страницам и его кэш в памяти процесса.
+
+Страница выбирается по keyset-курсору (см. FIRST_PAGE): запрос читает не
+больше page_size + 1 строк по индексу id, сколько бы курсов ни было в
+каталоге. Курс открывается отдельным запросом по первичному ключу —
+весь каталог в память не загружается.
+
+Каталог меняется только из админки (db.add_course / db.delete_course),
+которые сбрасывают кэш. Дополнительно можно ограничить время жизни
+кэша (CATALOG_CACHE_TTL) — полезно, если процессов несколько.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import select, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from bot.config import config
+from bot.models import async_session, Course, CourseView, CoursePage, COURSE_COLUMNS, FIRST_PAGE
+
+
+def parse_cursor(cursor: str) -> tuple[bool, int] | None:
+    """(вперёд?, id) из курсора страницы или None, если курсор испорчен."""
+    if len(cursor) < 2 or cursor[0] not in "ab" or not cursor[1:].isdigit():
+        return None
+    return cursor[0] == "a", int(cursor[1:])
+
+
+async def fetch_course_page(session: AsyncSession, cursor: str, limit: int) -> CoursePage:
+    """Страница активных курсов по курсору одним запросом.
+
+    Лишняя (limit + 1) строка показывает, есть ли страница дальше по
+    направлению курсора; EXISTS в том же запросе — есть ли в обратную
+    сторону. Пустая страница (курсы удалены, испорченный курсор) заменяется
+    первой.
+    """
+    parsed = parse_cursor(cursor)
+    if parsed is None:
+        cursor, parsed = FIRST_PAGE, parse_cursor(FIRST_PAGE)
+    forward, key = parsed
+
+    other = aliased(Course)
+    if forward:
+        where, order = Course.id > key, Course.id
+        behind = exists().where(other.is_active.is_(True), other.id <= key)
+    else:
+        where, order = Course.id < key, Course.id.desc()
+        behind = exists().where(other.is_active.is_(True), other.id >= key)
+    stmt = (
+        select(*COURSE_COLUMNS, behind)
+        .where(Course.is_active.is_(True), where)
+        .order_by(order)
+        .limit(limit + 1)
+    )
+    rows = (await session.execute(stmt)).all()
+    if not rows:
+        if cursor == FIRST_PAGE:
+            return CoursePage(cursor, (), None, None)
+        return await fetch_course_page(session, FIRST_PAGE, limit)
+
+    ahead, has_behind = len(rows) > limit, rows[0][-1]
+    courses = [CourseView(*row[:-1]) for row in rows[:limit]]
+    if not forward:
+        courses.reverse()
+    has_prev, has_next = (has_behind, ahead) if forward else (ahead, has_behind)
+    return CoursePage(
+        cursor=cursor,
+        courses=tuple(courses),
+        prev_cursor=f"b{courses[0].id}" if has_prev else None,
+        next_cursor=f"a{courses[-1].id}" if has_next else None,
+    )
+
+
+class CatalogCache:
+    """Read-through кэш страниц каталога, их клавиатур и курсов по id (LRU)."""
+
+    def __init__(self, page_size: int, max_pages: int, ttl: float = 0) -> None:
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.max_courses = max_pages * page_size
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        # cursor -> [время загрузки, страница, клавиатура или None]
+        self._pages: OrderedDict[str, list] = OrderedDict()
+        # id -> (время загрузки, курс)
+        self._courses: OrderedDict[int, tuple[float, CourseView]] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def invalidate(self) -> None:
+        """Сбросить кэш после изменения каталога."""
+        self.version += 1
+        self._pages.clear()
+        self._courses.clear()
+
+    def _is_fresh(self, loaded_at: float) -> bool:
+        return not self.ttl or time.monotonic() - loaded_at < self.ttl
+
+    def _cached_page(self, cursor: str) -> list | None:
+        entry = self._pages.get(cursor)
+        if entry is None or not self._is_fresh(entry[0]):
+            return None
+        self._pages.move_to_end(cursor)
+        return entry
+
+    def _put_course(self, loaded_at: float, course: CourseView) -> None:
+        self._courses[course.id] = (loaded_at, course)
+        self._courses.move_to_end(course.id)
+        while len(self._courses) > self.max_courses:
+            self._courses.popitem(last=False)
+
+    async def _page_entry(self, cursor: str) -> list:
+        entry = self._cached_page(cursor)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        lock = self._locks.setdefault(cursor, asyncio.Lock())
+        async with lock:
+            # Пока ждали блокировку, страницу мог загрузить другой запрос
+            entry = self._cached_page(cursor)
+            if entry is not None:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            version = self.version
+            async with async_session() as session:
+                page = await fetch_course_page(session, cursor, self.page_size)
+            entry = [time.monotonic(), page, None]
+
+            # Если каталог изменился во время загрузки — результат не кэшируем
+            if version == self.version:
+                self._pages[cursor] = entry
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+                for course in page.courses:
+                    self._put_course(entry[0], course)
+                # Блокировка больше не нужна: ожидающие и новые запросы найдут
+                # страницу в кэше. Убираем её, пока держим, — иначе новый запрос
+                # создал бы вторую блокировку рядом с ещё занятой первой
+                if self._locks.get(cursor) is lock:
+                    del self._locks[cursor]
+        return entry
+
+    async def get_page(self, cursor: str = FIRST_PAGE) -> CoursePage:
+        """Страница активных курсов по курсору."""
+        return (await self._page_entry(cursor))[1]
+
+    async def get_page_markup(
+        self, cursor: str, render: Callable[[CoursePage], Any],
+    ) -> tuple[CoursePage, Any]:
+        """Страница и её клавиатура: render вызывается один раз на страницу."""
+        entry = await self._page_entry(cursor)
+        if entry[2] is None:
+            entry[2] = render(entry[1])
+        return entry[1], entry[2]
+
+    async def get_course(self, course_id: int) -> CourseView | None:
+        """Активный курс по id или None."""
+        cached = self._courses.get(course_id)
+        if cached is not None and self._is_fresh(cached[0]):
+            self._courses.move_to_end(course_id)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        version = self.version
+        async with async_session() as session:
+            row = (await session.execute(
+                select(*COURSE_COLUMNS).where(Course.id == course_id, Course.is_active.is_(True))
+            )).one_or_none()
+        if row is None:
+            return None
+        course = CourseView(*row)
+        if version == self.version:
+            self._put_course(time.monotonic(), course)
+        return course
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "pages": len(self._pages),
+            "courses": len(self._courses),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+catalog_cache = CatalogCache(
+    page_size=config.catalog_page_size,
+    max_pages=config.catalog_cache_pages,
+    ttl=config.catalog_cache_ttl,
+)
@@ -1,230 +1,436 @@
-"""Сервис работы с базой данных — CRUD-операции."""
+"""Сервис работы с базой данных — CRUD-операции.
 
+Все функции принимают необязательную session. Обработчики получают её из
+DbSessionMiddleware (одна сессия и транзакция на обновление/запрос) и
+передают дальше — тогда функции только делают flush, а commit выполняет
+middleware. Без session функция открывает свою сессию и сама делает commit.
+"""
+
+import hashlib
 from decimal import Decimal
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import select, func
+from sqlalchemy import Row, select, insert, update, exists, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from bot.config import config
 from bot.models import (
-    async_session, User, Course, Order, OrderItem, Payment,
+    use_session, after_commit, dialect_insert,
+    User, Course, Order, OrderItem, Payment, ProcessedWebhook, UserCourse,
+    StatsCounter, StatsDaily,
+    CourseView, CoursePage, OrderItemView, OrderView, PaymentView, FIRST_PAGE,
+    COURSE_COLUMNS, ORDER_COLUMNS, ORDER_ITEM_COLUMNS, PAYMENT_COLUMNS, order_item_view,
 )
-
-
-# ─── Пользователи ────────────────────────────────────────────
-
-async def get_or_create_user(
-    telegram_id: int, full_name: str, username: str | None = None
-) -> User:
-    """Получить пользователя или создать нового."""
-    async with async_session() as session:
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        if user is None:
-            user = User(telegram_id=telegram_id, full_name=full_name, username=username)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-        return user
-
-
-async def get_user_by_telegram_id(telegram_id: int) -> User | None:
-    async with async_session() as session:
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await session.execute(stmt)
-        return result.scalar_one_or_none()
+from bot.services import stats
+from bot.services.catalog import catalog_cache, fetch_course_page
+from bot.services.entitlements import entitlement_cache
+from bot.services.search import course_search
+from bot.services.users import UserRecord
 
 
 # ─── Курсы ────────────────────────────────────────────────────
 
-async def get_active_courses() -> list[Course]:
-    """Список активных курсов."""
-    async with async_session() as session:
-        stmt = select(Course).where(Course.is_active.is_(True)).order_by(Course.id)
-        result = await session.execute(stmt)
-        return list(result.scalars().all())
-
-
-async def get_course(course_id: int) -> Course | None:
-    async with async_session() as session:
-        return await session.get(Course, course_id)
-
-
-async def add_course(title: str, description: str, price: float, material_url: str) -> Course:
-    async with async_session() as session:
+async def get_course_page(
+    cursor: str = FIRST_PAGE, limit: int | None = None, session: AsyncSession | None = None,
+) -> CoursePage:
+    """Страница активных курсов по keyset-курсору, без кэша (для админки)."""
+    async with use_session(session) as session:
+        return await fetch_course_page(session, cursor, limit or config.catalog_page_size)
+
+
+async def get_course(course_id: int, session: AsyncSession | None = None) -> CourseView | None:
+    async with use_session(session) as session:
+        row = (await session.execute(
+            select(*COURSE_COLUMNS).where(Course.id == course_id)
+        )).one_or_none()
+        return CourseView(*row) if row else None
+
+
+async def get_courses(
+    course_ids: list[int], session: AsyncSession | None = None
+) -> list[CourseView]:
+    """Активные курсы по списку id одним запросом, в порядке списка."""
+    if not course_ids:
+        return []
+    async with use_session(session) as session:
+        return await _load_courses(session, course_ids)
+
+
+async def _load_courses(
+    session: AsyncSession, course_ids: list[int], *where,
+) -> list[CourseView]:
+    stmt = select(*COURSE_COLUMNS).where(
+        Course.id.in_(course_ids), Course.is_active.is_(True), *where,
+    )
+    by_id = {row.id: CourseView(*row) for row in await session.execute(stmt)}
+    return [by_id[cid] for cid in dict.fromkeys(course_ids) if cid in by_id]
+
+
+async def add_course(
+    title: str, description: str, price: float, material_url: str,
+    session: AsyncSession | None = None,
+) -> Course:
+    async with use_session(session) as session:
         course = Course(
             title=title, description=description,
             price=price, material_url=material_url, is_active=True,
         )
         session.add(course)
-        await session.commit()
-        await session.refresh(course)
+        await session.flush()
+        after_commit(session, catalog_cache.invalidate)
+        after_commit(session, course_search.invalidate)
         return course
 
 
-async def delete_course(course_id: int) -> bool:
+async def delete_course(course_id: int, session: AsyncSession | None = None) -> bool:
     """Мягкое удаление — помечаем курс неактивным."""
-    async with async_session() as session:
+    async with use_session(session) as session:
         course = await session.get(Course, course_id)
         if course is None:
             return False
         course.is_active = False
-        await session.commit()
+        await session.flush()
+        after_commit(session, catalog_cache.invalidate)
+        after_commit(session, course_search.invalidate)
         return True
 
 
 # ─── Заказы ───────────────────────────────────────────────────
 
-async def create_order(user: User, course_ids: list[int]) -> Order | None:
-    """Создать заказ из списка id курсов. Возвращает None, если курсы не найдены."""
-    async with async_session() as session:
-        stmt = select(Course).where(Course.id.in_(course_ids), Course.is_active.is_(True))
-        result = await session.execute(stmt)
-        courses = list(result.scalars().all())
+def cart_fingerprint(courses: list[CourseView]) -> str:
+    """Отпечаток набора курсов с ценами: одинаковые корзины дают одинаковый отпечаток."""
+    items = sorted((c.id, Decimal(str(c.price))) for c in courses)
+    return hashlib.sha256(";".join(f"{cid}:{price:.2f}" for cid, price in items).encode()).hexdigest()
+
+
+async def create_order(
+    user: UserRecord, course_ids: list[int], session: AsyncSession | None = None
+) -> OrderView | None:
+    """Создать заказ из списка id курсов.
+
+    Уже купленные пользователем курсы в заказ не попадают. Если у пользователя
+    есть непросроченный неоплаченный заказ на тот же набор курсов и цен,
+    возвращается он — вместе с платежом, если тот уже создан. Возвращает
+    None, если покупать нечего.
+
+    Новый заказ записывается двумя INSERT ... RETURNING (заказ и все позиции
+    одним запросом) и собирается из уже загруженных курсов, без перечитывания.
+    Блокировка checkout в ThrottlingMiddleware действует в одном процессе;
+    между процессами дубль не даёт уникальный индекс неоплаченных заказов
+    (ux_orders_user_pending_cart): при конфликте возвращается заказ, который
+    успел создать параллельный checkout.
+    """
+    async with use_session(session) as session:
+        owned = exists().where(UserCourse.user_id == user.id, UserCourse.course_id == Course.id)
+        courses = await _load_courses(session, course_ids, ~owned)
         if not courses:
             return None
 
-        total = sum(Decimal(str(c.price)) for c in courses)
-        order = Order(user_id=user.id, total_amount=float(total), status="pending")
-        session.add(order)
-        await session.flush()
+        fingerprint = cart_fingerprint(courses)
+        now = datetime.now(timezone.utc)
+        same_cart = (
+            Order.user_id == user.id,
+            Order.status == "pending",
+            Order.cart_fingerprint == fingerprint,
+        )
+        pending = (
+            select(Order.id)
+            .where(*same_cart, Order.expires_at > now)
+            .order_by(Order.id.desc())
+            .limit(1)
+        )
+        pending_id = await session.scalar(pending)
+        if pending_id is not None:
+            return await _load_order(session, pending_id)
+
+        total = sum((c.price for c in courses), Decimal(0))
+        values = {
+            "user_id": user.id,
+            "status": "pending",
+            "total_amount": total,
+            "cart_fingerprint": fingerprint,
+            "expires_at": now + timedelta(seconds=config.order_pending_ttl),
+        }
+        orders, items = Order.__table__, OrderItem.__table__
+        insert_order = (
+            dialect_insert(orders)
+            .values(values)
+            .on_conflict_do_nothing(
+                index_elements=[orders.c.user_id, orders.c.cart_fingerprint],
+                index_where=orders.c.status == "pending",
+            )
+            .returning(orders.c.id, orders.c.created_at)
+        )
+        while (row := (await session.execute(insert_order)).one_or_none()) is None:
+            # Заказ на эту корзину только что создал checkout в другом процессе
+            pending_id = await session.scalar(pending)
+            if pending_id is not None:
+                return await _load_order(session, pending_id)
+            # Или мешает просроченный заказ, который ещё не помечен expired
+            await session.execute(
+                update(Order).where(*same_cart).values(status="expired")
+                .execution_options(synchronize_session=False)
+            )
+        order_id, created_at = row
+        # Одним запросом; порядок строк RETURNING не гарантирован — сопоставляем по курсу
+        item_ids = dict((await session.execute(
+            insert(items)
+            .values([{"order_id": order_id, "course_id": c.id, "price": c.price} for c in courses])
+            .returning(items.c.course_id, items.c.id)
+        )).all())
+        await stats.order_created(session, [c.id for c in courses])
+
+        return OrderView(
+            id=order_id,
+            telegram_id=user.telegram_id,
+            created_at=created_at,
+            items=tuple(OrderItemView(item_ids[c.id], c.price, c) for c in courses),
+            payment=None,
+            **values,
+        )
 
-        for c in courses:
-            item = OrderItem(order_id=order.id, course_id=c.id, price=float(c.price))
-            session.add(item)
 
-        await session.commit()
-        # Перезагружаем с items
-        stmt = (
-            select(Order)
-            .options(selectinload(Order.items).selectinload(OrderItem.course))
-            .where(Order.id == order.id)
+async def _load_order(session: AsyncSession, order_id: int) -> OrderView | None:
+    """Заказ с курсами и платежом: два запроса, без ORM-объектов."""
+    row = (await session.execute(
+        select(*ORDER_COLUMNS, *PAYMENT_COLUMNS)
+        .join(User, User.id == Order.user_id)
+        .outerjoin(Payment, Payment.order_id == Order.id)
+        .where(Order.id == order_id)
+    )).one_or_none()
+    if row is None:
+        return None
+    items = await session.execute(
+        select(*ORDER_ITEM_COLUMNS)
+        .join(Course, Course.id == OrderItem.course_id)
+        .where(OrderItem.order_id == order_id)
+        .order_by(OrderItem.id)
+    )
+    order, payment = row[:len(ORDER_COLUMNS)], row[len(ORDER_COLUMNS):]
+    return OrderView(
+        *order,
+        items=tuple(order_item_view(item) for item in items),
+        payment=PaymentView(*payment) if payment[0] is not None else None,
+    )
+
+
+async def expire_pending_orders(session: AsyncSession | None = None) -> int:
+    """Пометить expired неоплаченные заказы с истёкшим сроком. Возвращает их число.
+
+    Платежи не трогаем: если оплата всё же пройдёт, webhook переведёт
+    заказ в paid.
+    """
+    now = datetime.now(timezone.utc)
+    stmt = (
+        update(Order)
+        .where(
+            Order.status == "pending",
+            or_(
+                Order.expires_at < now,
+                # Заказы, созданные до появления срока жизни
+                and_(
+                    Order.expires_at.is_(None),
+                    Order.created_at < now - timedelta(seconds=config.order_pending_ttl),
+                ),
+            ),
         )
-        result = await session.execute(stmt)
-        return result.scalar_one()
+        .values(status="expired")
+        .execution_options(synchronize_session=False)
+    )
+    async with use_session(session) as session:
+        return (await session.execute(stmt)).rowcount
 
 
-async def get_order_with_items(order_id: int) -> Order | None:
-    async with async_session() as session:
-        stmt = (
-            select(Order)
-            .options(
-                selectinload(Order.items).selectinload(OrderItem.course),
-                selectinload(Order.user),
-            )
-            .where(Order.id == order_id)
-        )
-        result = await session.execute(stmt)
-        return result.scalar_one_or_none()
+async def get_order_with_items(
+    order_id: int, session: AsyncSession | None = None
+) -> OrderView | None:
+    async with use_session(session) as session:
+        return await _load_order(session, order_id)
 
 
-async def mark_order_paid(order_id: int) -> Order | None:
-    async with async_session() as session:
+async def mark_order_paid(order_id: int, session: AsyncSession | None = None) -> Order | None:
+    async with use_session(session) as session:
         order = await session.get(Order, order_id)
         if order:
             order.status = "paid"
-            await session.commit()
-            await session.refresh(order)
+            await session.flush()
         return order
 
 
 # ─── Платежи ──────────────────────────────────────────────────
 
 async def create_payment_record(
-    order_id: int, yookassa_id: str, amount: float
+    order_id: int, yookassa_id: str, amount: Decimal,
+    confirmation_url: str | None = None,
+    session: AsyncSession | None = None,
 ) -> Payment:
-    async with async_session() as session:
+    async with use_session(session) as session:
         payment = Payment(
             order_id=order_id, yookassa_id=yookassa_id,
-            amount=amount, status="pending",
+            amount=amount, status="pending", confirmation_url=confirmation_url,
         )
         session.add(payment)
-        await session.commit()
-        await session.refresh(payment)
+        await session.flush()
         return payment
 
 
-async def confirm_payment(yookassa_id: str) -> Payment | None:
-    """Подтверждение платежа по yookassa_id. Обновляет статус платежа и заказа."""
-    async with async_session() as session:
-        stmt = select(Payment).where(Payment.yookassa_id == yookassa_id)
-        result = await session.execute(stmt)
-        payment = result.scalar_one_or_none()
-        if payment is None:
-            return None
+async def _apply_payment_event(
+    session: AsyncSession | None,
+    yookassa_id: str, event: str, payment_status: str, order_status: str, **payment_values,
+) -> Payment | None:
+    """Перевести платёж из pending в payment_status ровно один раз.
 
-        payment.status = "succeeded"
-        payment.paid_at = datetime.now(timezone.utc)
+    Первая доставка события меняет платёж и заказ и пишет запись в журнал
+    processed_webhooks в той же транзакции. Повторные доставки видят запись
+    в журнале (или уже не pending платёж) и не трогают orders и payments.
+    """
+    key = f"{yookassa_id}:{event}"
+    async with use_session(session) as session:
+        if await session.get(ProcessedWebhook, key) is not None:
+            return None
 
-        # Обновляем заказ
-        order = await session.get(Order, payment.order_id)
-        if order:
-            order.status = "paid"
+        # Условный UPDATE: из параллельных доставок строку изменит только одна
+        stmt = (
+            update(Payment)
+            .where(Payment.yookassa_id == yookassa_id, Payment.status == "pending")
+            .values(status=payment_status, **payment_values)
+            .returning(Payment)
+            .execution_options(synchronize_session=False)
+        )
+        payment = (await session.execute(stmt)).scalar_one_or_none()
+        if payment is None:
+            return None
 
-        await session.commit()
-        await session.refresh(payment)
+        await session.execute(
+            update(Order).where(Order.id == payment.order_id).values(status=order_status)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            dialect_insert(ProcessedWebhook)
+            .values(key=key, order_id=payment.order_id)
+            .on_conflict_do_nothing(index_elements=[ProcessedWebhook.key])
+        )
+        if payment_status == "succeeded":
+            await _grant_courses(session, payment.order_id)
+            items = (await session.execute(
+                select(OrderItem.course_id, OrderItem.price)
+                .where(OrderItem.order_id == payment.order_id)
+            )).all()
+            await stats.order_paid(session, payment.amount, items)
         return payment
 
 
-async def cancel_payment(yookassa_id: str) -> Payment | None:
-    async with async_session() as session:
-        stmt = select(Payment).where(Payment.yookassa_id == yookassa_id)
-        result = await session.execute(stmt)
-        payment = result.scalar_one_or_none()
-        if payment is None:
-            return None
-        payment.status = "canceled"
-        order = await session.get(Order, payment.order_id)
-        if order:
-            order.status = "cancelled"
-        await session.commit()
-        await session.refresh(payment)
-        return payment
+async def _grant_courses(session: AsyncSession, order_id: int) -> None:
+    """Выдать права на курсы оплаченного заказа (в транзакции подтверждения)."""
+    items = (
+        select(Order.user_id, OrderItem.course_id, Order.id)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.id == order_id)
+    )
+    await session.execute(
+        dialect_insert(UserCourse)
+        .from_select(["user_id", "course_id", "order_id"], items)
+        .on_conflict_do_nothing(index_elements=[UserCourse.user_id, UserCourse.course_id])
+    )
+    telegram_id = await session.scalar(
+        select(User.telegram_id).join(Order, Order.user_id == User.id).where(Order.id == order_id)
+    )
+    after_commit(session, lambda: entitlement_cache.invalidate(telegram_id))
+
+
+async def confirm_payment(
+    yookassa_id: str, session: AsyncSession | None = None
+) -> Payment | None:
+    """Подтверждение платежа по yookassa_id. Обновляет статус платежа и заказа.
+
+    Возвращает платёж только при первой обработке; для неизвестного или уже
+    обработанного платежа — None.
+    """
+    return await _apply_payment_event(
+        session, yookassa_id, "payment.succeeded", "succeeded", "paid",
+        paid_at=datetime.now(timezone.utc),
+    )
+
+
+async def cancel_payment(
+    yookassa_id: str, session: AsyncSession | None = None
+) -> Payment | None:
+    """Отмена платежа; как и confirm_payment, срабатывает только один раз."""
+    return await _apply_payment_event(
+        session, yookassa_id, "payment.canceled", "canceled", "cancelled",
+    )
 
 
 # ─── Статистика ───────────────────────────────────────────────
 
-async def get_sales_stats() -> dict:
-    """Статистика продаж для админ-панели."""
-    async with async_session() as session:
-        # Общее число заказов
-        total_orders = (await session.execute(
-            select(func.count(Order.id))
-        )).scalar() or 0
-
-        # Оплаченные заказы
-        paid_orders = (await session.execute(
-            select(func.count(Order.id)).where(Order.status == "paid")
-        )).scalar() or 0
-
-        # Сумма продаж
-        total_revenue = (await session.execute(
-            select(func.sum(Payment.amount)).where(Payment.status == "succeeded")
-        )).scalar() or 0
-
-        # Число пользователей
-        total_users = (await session.execute(
-            select(func.count(User.id))
-        )).scalar() or 0
+async def get_sales_stats(session: AsyncSession | None = None) -> dict:
+    """Статистика продаж для админ-панели — из накопительных счётчиков."""
+    async with use_session(session) as session:
+        counters = dict((await session.execute(
+            select(StatsCounter.name, StatsCounter.value)
+        )).all())
+        today = await session.get(StatsDaily, (stats.today(), stats.TOTAL))
 
         return {
-            "total_orders": total_orders,
-            "paid_orders": paid_orders,
-            "total_revenue": float(total_revenue),
-            "total_users": total_users,
+            "total_orders": int(counters.get("orders", 0)),
+            "paid_orders": int(counters.get("paid_orders", 0)),
+            "total_revenue": float(counters.get("revenue", 0)),
+            "total_users": int(counters.get("users", 0)),
+            "today_orders": today.orders if today else 0,
+            "today_paid_orders": today.paid_orders if today else 0,
+            "today_revenue": float(today.revenue) if today else 0.0,
+            "today_new_users": today.new_users if today else 0,
         }
 
 
-async def get_purchased_courses(user: User) -> list[Course]:
-    """Список курсов, оплаченных пользователем."""
-    async with async_session() as session:
+async def get_daily_stats(days: int, session: AsyncSession | None = None) -> list[Row]:
+    """Итоги по дням за последние days дней, новые дни первыми."""
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+    async with use_session(session) as session:
+        stmt = (
+            select(
+                StatsDaily.day, StatsDaily.orders, StatsDaily.paid_orders,
+                StatsDaily.revenue, StatsDaily.new_users,
+            )
+            .where(StatsDaily.day >= since, StatsDaily.course_id == stats.TOTAL)
+            .order_by(StatsDaily.day.desc())
+        )
+        return list(await session.execute(stmt))
+
+
+async def get_course_stats(days: int, session: AsyncSession | None = None) -> list[dict]:
+    """Продажи по курсам за последние days дней, по убыванию выручки."""
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+    async with use_session(session) as session:
+        revenue = func.sum(StatsDaily.revenue)
+        stmt = (
+            select(
+                StatsDaily.course_id, Course.title,
+                func.sum(StatsDaily.orders), func.sum(StatsDaily.paid_orders), revenue,
+            )
+            .join(Course, Course.id == StatsDaily.course_id)
+            .where(StatsDaily.day >= since, StatsDaily.course_id != stats.TOTAL)
+            .group_by(StatsDaily.course_id, Course.title)
+            .order_by(revenue.desc())
+        )
+        return [
+            {
+                "course_id": course_id, "title": title,
+                "orders": orders, "paid_orders": paid, "revenue": float(total or 0),
+            }
+            for course_id, title, orders, paid, total in await session.execute(stmt)
+        ]
+
+
+async def get_purchased_courses(
+    user: UserRecord, session: AsyncSession | None = None
+) -> list[CourseView]:
+    """Список курсов, купленных пользователем, в порядке покупки."""
+    async with use_session(session) as session:
         stmt = (
-            select(Course)
-            .join(OrderItem, OrderItem.course_id == Course.id)
-            .join(Order, Order.id == OrderItem.order_id)
-            .where(Order.user_id == user.id, Order.status == "paid")
+            select(*COURSE_COLUMNS)
+            .join(UserCourse, UserCourse.course_id == Course.id)
+            .where(UserCourse.user_id == user.id)
+            .order_by(UserCourse.granted_at, Course.id)
         )
-        result = await session.execute(stmt)
-        return list(result.scalars().all())
+        return [CourseView(*row) for row in await session.execute(stmt)]
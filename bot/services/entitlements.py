@@ -0,0 +1,93 @@
+"""Кэш купленных курсов пользователя.
+
+Права хранятся в таблице user_courses и выдаются в транзакции
+подтверждения оплаты (db.confirm_payment). После commit запись
+пользователя в кэше сбрасывается. Время жизни записи
+(ENTITLEMENT_CACHE_TTL) ограничивает устаревание, если процессов несколько.
+"""
+
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import config
+from bot.models import use_session, User, UserCourse
+
+
+class EntitlementCache:
+    """LRU-кэш: telegram_id -> множество id купленных курсов."""
+
+    def __init__(self, max_users: int, ttl: float = 0) -> None:
+        self.max_users = max_users
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[int, tuple[float, frozenset[int]]] = OrderedDict()
+        # Растёт при каждом сбросе: загруженное до сброса не кэшируем
+        self._generation = 0
+
+    def invalidate(self, telegram_id: int) -> None:
+        """Сбросить запись пользователя после выдачи новых прав."""
+        self._data.pop(telegram_id, None)
+        self._generation += 1
+
+    def _get(self, telegram_id: int) -> frozenset[int] | None:
+        entry = self._data.get(telegram_id)
+        if entry is None:
+            return None
+        loaded_at, owned = entry
+        if self.ttl and time.monotonic() - loaded_at >= self.ttl:
+            del self._data[telegram_id]
+            return None
+        self._data.move_to_end(telegram_id)
+        return owned
+
+    def _put(self, telegram_id: int, owned: frozenset[int]) -> None:
+        self._data[telegram_id] = (time.monotonic(), owned)
+        self._data.move_to_end(telegram_id)
+        while len(self._data) > self.max_users:
+            self._data.popitem(last=False)
+
+    async def owned_course_ids(
+        self, telegram_id: int, session: AsyncSession | None = None
+    ) -> frozenset[int]:
+        """id курсов, купленных пользователем."""
+        owned = self._get(telegram_id)
+        if owned is not None:
+            self.hits += 1
+            return owned
+
+        self.misses += 1
+        generation = self._generation
+        async with use_session(session) as session:
+            stmt = (
+                select(UserCourse.course_id)
+                .join(User, User.id == UserCourse.user_id)
+                .where(User.telegram_id == telegram_id)
+            )
+            owned = frozenset((await session.execute(stmt)).scalars())
+        if generation == self._generation:
+            self._put(telegram_id, owned)
+        return owned
+
+    async def owns(
+        self, telegram_id: int, course_id: int, session: AsyncSession | None = None
+    ) -> bool:
+        return course_id in await self.owned_course_ids(telegram_id, session=session)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+entitlement_cache = EntitlementCache(
+    max_users=config.entitlement_cache_size,
+    ttl=config.entitlement_cache_ttl,
+)
@@ -0,0 +1,52 @@
+"""FSM-хранилище aiogram в БД — общее для нескольких процессов бота."""
+
+import json
+from collections.abc import Mapping
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey, DefaultKeyBuilder
+
+from bot.models import async_session, dialect_insert, FsmRecord
+
+
+class DBStorage(BaseStorage):
+    """Состояния и данные FSM в таблице fsm_states."""
+
+    def __init__(self) -> None:
+        self._key_builder = DefaultKeyBuilder(with_destiny=True)
+
+    def _key(self, key: StorageKey) -> str:
+        return self._key_builder.build(key)
+
+    async def _upsert(self, key: StorageKey, **values: Any) -> None:
+        stmt = dialect_insert(FsmRecord).values(key=self._key(key), **values)
+        stmt = stmt.on_conflict_do_update(index_elements=[FsmRecord.key], set_=values)
+        async with async_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def _get(self, key: StorageKey) -> FsmRecord | None:
+        async with async_session() as session:
+            return await session.get(FsmRecord, self._key(key))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = await self._get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        await self._upsert(key, data=json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = await self._get(key)
+        return json.loads(record.data) if record and record.data else {}
+
+    async def close(self) -> None:
+        pass
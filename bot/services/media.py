@@ -0,0 +1,93 @@
+"""Реестр медиафайлов: каждый файл загружается в Telegram один раз.
+
+После первой отправки сохраняем file_id вместе с sha256 содержимого (в памяти
+и в таблице media_assets). Следующие отправки идут по file_id без загрузки
+файла. Если файл на диске изменился, хэш не совпадёт и файл загрузится заново.
+"""
+
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from bot.models import async_session, dialect_insert, MediaAsset
+
+logger = logging.getLogger(__name__)
+
+
+class MediaRegistry:
+    def __init__(self) -> None:
+        # key -> (sha256, file_id)
+        self._file_ids: dict[str, tuple[str, str]] = {}
+        # путь -> ((mtime_ns, size), sha256), чтобы не хэшировать файл на каждой отправке
+        self._digests: dict[Path, tuple[tuple[int, int], str]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def _digest(self, path: Path) -> str:
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._digests.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = await asyncio.to_thread(
+            lambda: hashlib.sha256(path.read_bytes()).hexdigest()
+        )
+        self._digests[path] = (stamp, digest)
+        return digest
+
+    async def _lookup(self, key: str, digest: str) -> str | None:
+        cached = self._file_ids.get(key)
+        if cached is None:
+            async with async_session() as session:
+                asset = await session.get(MediaAsset, key)
+            if asset is None:
+                return None
+            cached = (asset.sha256, asset.file_id)
+            self._file_ids[key] = cached
+        sha, file_id = cached
+        return file_id if sha == digest else None
+
+    async def _remember(self, key: str, digest: str, file_id: str) -> None:
+        self._file_ids[key] = (digest, file_id)
+        stmt = dialect_insert(MediaAsset).values(key=key, sha256=digest, file_id=file_id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MediaAsset.key],
+            set_={"sha256": stmt.excluded.sha256, "file_id": stmt.excluded.file_id},
+        )
+        async with async_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    def forget(self, key: str) -> None:
+        self._file_ids.pop(key, None)
+
+    async def answer_photo(self, message: Message, key: str, path: Path, **kwargs) -> Message:
+        """Ответить фото из файла path, по возможности по сохранённому file_id."""
+        digest = await self._digest(path)
+        file_id = await self._lookup(key, digest)
+        if file_id is None:
+            # Первую загрузку делает один запрос, остальные дождутся его file_id
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                file_id = await self._lookup(key, digest)
+                if file_id is None:
+                    sent = await message.answer_photo(photo=FSInputFile(path), **kwargs)
+                    await self._remember(key, digest, sent.photo[-1].file_id)
+                    logger.info("Медиафайл %s загружен в Telegram", key)
+                    return sent
+
+        try:
+            return await message.answer_photo(photo=file_id, **kwargs)
+        except TelegramBadRequest as e:
+            # file_id мог стать недействительным (например, сменили бота)
+            logger.warning("file_id для %s не принят (%s), загружаем заново", key, e)
+            self.forget(key)
+            sent = await message.answer_photo(photo=FSInputFile(path), **kwargs)
+            await self._remember(key, digest, sent.photo[-1].file_id)
+            return sent
+
+
+media_registry = MediaRegistry()
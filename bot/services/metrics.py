@@ -0,0 +1,285 @@
+"""Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Небольшой реестр без внешних зависимостей: счётчики, gauge и гистограммы
+с метками. Значения живут в памяти процесса; при WORKERS > 1 каждый
+процесс отдаёт свои метрики.
+
+Источники:
+- обработчики aiogram и HTTP-маршруты — bot.middlewares.metrics;
+- запросы к БД — события движка SQLAlchemy (instrument_engine);
+- запросы к Telegram Bot API — middleware сессии бота;
+- запросы к ЮKassa — bot.services.payment;
+- очереди и кэши — снимаются при каждом чтении /metrics (collect).
+"""
+
+import time
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels: str) -> None:
+        """Перенести значение внешнего счётчика (например, hits кэша)."""
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счётчики корзин (+Inf последним), сумма]
+        self._values: dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def total_count(self) -> int:
+        """Число наблюдений по всем меткам."""
+        return sum(sum(counts) for counts, _ in self._values.values())
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {cumulative}"
+
+
+Collector = Callable[[], Awaitable[None]]
+
+
+class Registry:
+    """Набор метрик процесса и функций, обновляющих их перед выдачей."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, func: Collector) -> Collector:
+        """Зарегистрировать функцию, обновляющую gauge при чтении /metrics."""
+        self._collectors.append(func)
+        return func
+
+    async def collect(self) -> None:
+        for func in self._collectors:
+            await func()
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# ─── Обработчики ──────────────────────────────────────────────
+
+handler_seconds = registry.histogram(
+    "bot_handler_duration_seconds",
+    "Время обработки: обработчики aiogram (router — модуль) и HTTP-маршруты (router=http)",
+    ("router", "handler"),
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("router", "handler"),
+)
+
+# ─── БД ───────────────────────────────────────────────────────
+
+db_query_seconds = registry.histogram(
+    "bot_db_query_duration_seconds", "Время SQL-запросов по типу", ("operation",), DB_BUCKETS,
+)
+db_errors = registry.counter("bot_db_errors_total", "Ошибки SQL-запросов", ("operation",))
+
+# ─── Внешние API ──────────────────────────────────────────────
+
+telegram_seconds = registry.histogram(
+    "bot_telegram_request_duration_seconds", "Время запросов к Telegram Bot API", ("method",),
+)
+telegram_errors = registry.counter(
+    "bot_telegram_errors_total", "Ошибки запросов к Telegram Bot API", ("method", "error"),
+)
+telegram_retry_after = registry.counter(
+    "bot_telegram_retry_after_total", "Ответы 429 (flood control) Telegram", ("method",),
+)
+yookassa_seconds = registry.histogram(
+    "bot_yookassa_request_duration_seconds", "Время запросов к ЮKassa", ("operation",),
+)
+yookassa_errors = registry.counter(
+    "bot_yookassa_errors_total", "Ошибки запросов к ЮKassa", ("operation", "status"),
+)
+
+# ─── Очереди и кэши ───────────────────────────────────────────
+
+webhook_lag_seconds = registry.histogram(
+    "bot_webhook_lag_seconds",
+    "Задержка от приёма уведомления ЮKassa до его обработки",
+    ("event",),
+    LAG_BUCKETS,
+)
+queue_depth = registry.gauge("bot_queue_depth", "Необработанных записей в очереди", ("queue",))
+queue_lag = registry.gauge(
+    "bot_queue_lag_seconds", "Возраст самой старой необработанной записи", ("queue",),
+)
+cache_hits = registry.counter("bot_cache_hits_total", "Попадания в кэши", ("cache",))
+cache_misses = registry.counter("bot_cache_misses_total", "Промахи кэшей", ("cache",))
+cache_hit_ratio = registry.gauge("bot_cache_hit_ratio", "Доля попаданий в кэш", ("cache",))
+
+
+def observe_cache(name: str, stats: dict) -> None:
+    """Перенести hits / misses из stats() кэша в метрики."""
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    cache_hits.set(hits, cache=name)
+    cache_misses.set(misses, cache=name)
+    cache_hit_ratio.set(hits / (hits + misses) if hits + misses else 0.0, cache=name)
+
+
+def observe_queue(name: str, metrics: dict) -> None:
+    queue_depth.set(metrics["depth"], queue=name)
+    queue_lag.set(metrics["lag_seconds"], queue=name)
+
+
+# ─── Инструментирование движка БД ─────────────────────────────
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Считать запросы и их время через события движка (повторный вызов ничего не делает)."""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(sync_engine, "handle_error", _on_error)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = conn.info["query_start"].pop()
+    db_query_seconds.observe(time.perf_counter() - start, operation=_operation(statement))
+
+
+def _on_error(context) -> None:
+    starts = context.connection.info.get("query_start") if context.connection else None
+    if starts:
+        starts.pop()
+    db_errors.inc(operation=_operation(context.statement or ""))
@@ -0,0 +1,22 @@
+"""Срок жизни неоплаченных заказов.
+
+Неоплаченный заказ переиспользуется повторным checkout той же корзины
+ORDER_PENDING_TTL секунд, затем фоновая задача помечает его expired.
+"""
+
+import logging
+
+from bot.config import config
+from bot.services import db
+from bot.services.scheduler import Periodic
+
+logger = logging.getLogger(__name__)
+
+
+async def expire_stale_orders() -> None:
+    expired = await db.expire_pending_orders()
+    if expired:
+        logger.info("Просрочено неоплаченных заказов: %s", expired)
+
+
+order_expirer = Periodic("orders", config.order_expire_interval, expire_stale_orders)
@@ -0,0 +1,284 @@
+"""Очередь исходящих сообщений Telegram (outbox).
+
+Уведомления не отправляются прямо из обработчиков: они записываются в
+таблицу outbox (в той же транзакции, что и изменения, о которых
+сообщают), а фоновый диспетчер отправляет их с соблюдением лимитов
+Telegram:
+- не больше OUTBOX_GLOBAL_RATE сообщений в секунду на бота
+  и OUTBOX_CHAT_RATE в секунду в один чат (время отправки раздаётся
+  по очереди, без всплесков);
+- ответ 429 останавливает все отправки на retry_after секунд, сообщение
+  возвращается в очередь без траты попытки; взятые сообщения, которым
+  пауза не даёт уложиться в срок аренды, тоже возвращаются в очередь до
+  конца паузы — иначе их забрал бы повторно другой проход и отправил дважды;
+- сетевые и серверные ошибки повторяются с экспоненциальной задержкой и
+  случайным разбросом, заблокировавший бота пользователь — сразу failed;
+- очередь разбирается по приоритету: уведомления об оплате раньше рассылок.
+
+Лимиты Telegram общие для бота, поэтому диспетчер работает в одном процессе.
+Выборка, аренда и повторы — общие с inbox (bot.services.queue).
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter, TelegramUnauthorizedError,
+)
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import config
+from bot.models import (
+    as_utc, async_session, dialect_insert, use_session, utcnow, Broadcast, OutboxMessage,
+)
+from bot.services.queue import LeasedQueue
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше — раньше
+PRIORITY_PAYMENT = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_MARKETING = 10
+
+# Запас до конца аренды на саму отправку и запись итога, сек
+LEASE_MARGIN = 10.0
+
+
+def message_row(
+    chat_id: int,
+    text: str,
+    priority: int = PRIORITY_DEFAULT,
+    parse_mode: str | None = "HTML",
+    disable_web_page_preview: bool = False,
+    reply_markup: InlineKeyboardMarkup | None = None,
+    dedup_key: str | None = None,
+    broadcast_id: int | None = None,
+) -> dict:
+    """Строка таблицы outbox для enqueue_many."""
+    return {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": parse_mode,
+        "disable_web_page_preview": disable_web_page_preview,
+        "reply_markup": reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+        "priority": priority,
+        "dedup_key": dedup_key,
+        "broadcast_id": broadcast_id,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": utcnow(),
+    }
+
+
+async def enqueue_many(rows: list[dict], session: AsyncSession | None = None) -> int:
+    """Поставить сообщения в очередь. Возвращает число новых (без дублей dedup_key)."""
+    if not rows:
+        return 0
+    # Core-вставка по таблице: rowcount показывает, сколько строк добавлено
+    stmt = dialect_insert(OutboxMessage.__table__).on_conflict_do_nothing(
+        index_elements=[OutboxMessage.dedup_key]
+    )
+    async with use_session(session) as session:
+        result = await session.execute(stmt, rows)
+    return result.rowcount
+
+
+async def enqueue(
+    chat_id: int, text: str, *, session: AsyncSession | None = None, **kwargs,
+) -> bool:
+    """Поставить сообщение в очередь. Отправку будит notify() после commit."""
+    return await enqueue_many([message_row(chat_id, text, **kwargs)], session=session) > 0
+
+
+class OutboxDispatcher(LeasedQueue):
+    """Фоновая отправка сообщений из outbox с соблюдением лимитов Telegram."""
+
+    model = OutboxMessage
+    working_status = "sending"
+    order_by = (OutboxMessage.priority,)
+    name = "сообщений"
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        concurrency: int = 10,
+        poll_interval: float = 0.5,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        lease: float = 120.0,
+        retention: float = 7 * 24 * 3600,
+        purge_interval: float = 3600,
+    ) -> None:
+        super().__init__(
+            concurrency=concurrency,
+            batch_size=concurrency,
+            poll_interval=poll_interval,
+            max_attempts=max_attempts,
+            base_delay=base_delay,
+            max_delay=max_delay,
+            lease=lease,
+        )
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.sent = 0
+        self.throttled = 0
+        self.postponed = 0
+        self._global_interval = 1 / global_rate
+        self._chat_interval = 1 / chat_rate
+        self._global_next = 0.0
+        self._chat_next: dict[int, float] = {}
+        self._paused_until = 0.0
+        self._bot: Bot | None = None
+        self._last_purge = 0.0
+
+    def _reserve(self, chat_id: int) -> float:
+        """Занять ближайшее время отправки в chat_id. Возвращает, сколько ждать.
+
+        Время отправки раздаётся по порядку обращений: каждое сообщение
+        сдвигает следующее общее время на 1 / global_rate, а следующее время
+        в этот чат — на 1 / chat_rate.
+        """
+        now = time.monotonic()
+        start = max(now, self._paused_until, self._global_next, self._chat_next.get(chat_id, 0.0))
+        self._global_next = start + self._global_interval
+        self._chat_next[chat_id] = start + self._chat_interval
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+        return start - now
+
+    async def _wait_turn(self, chat_id: int, deadline: float) -> bool:
+        """Дождаться, пока отправка в chat_id уложится в лимиты.
+
+        False — до конца аренды (deadline) отправить не успеть: сообщение
+        нужно вернуть в очередь.
+        """
+        while True:
+            if self._paused_until > deadline - LEASE_MARGIN:
+                return False
+            delay = self._reserve(chat_id)
+            if time.monotonic() + delay > deadline - LEASE_MARGIN:
+                return False
+            await asyncio.sleep(delay)
+            # Пока ждали, пришёл 429 — занимаем время заново, после паузы
+            if self._paused_until <= time.monotonic():
+                return True
+
+    def _postpone(self, row: OutboxMessage, delay: float) -> dict:
+        """Вернуть сообщение в очередь через delay секунд, не засчитывая попытку."""
+        return {
+            "status": "pending",
+            "attempts": row.attempts,
+            "next_attempt_at": utcnow() + timedelta(seconds=delay + random.uniform(0, 1)),
+        }
+
+    def _idle_for(self) -> float:
+        # Во время паузы 429 не забираем сообщения — их всё равно пришлось бы вернуть
+        return self._paused_until - time.monotonic()
+
+    async def _handle(self, row: OutboxMessage, deadline: float) -> None:
+        attempts = row.attempts + 1
+        if not await self._wait_turn(row.chat_id, deadline):
+            # Пауза дольше аренды: отдаём сообщение до её конца, чтобы его не забрали повторно
+            self.postponed += 1
+            await self._save(row, self._postpone(row, max(self._paused_until - time.monotonic(), 0.0)))
+            return
+
+        try:
+            await self._bot.send_message(
+                chat_id=row.chat_id,
+                text=row.text,
+                parse_mode=row.parse_mode,
+                disable_web_page_preview=row.disable_web_page_preview,
+                reply_markup=(
+                    InlineKeyboardMarkup.model_validate_json(row.reply_markup)
+                    if row.reply_markup else None
+                ),
+            )
+        except TelegramRetryAfter as e:
+            # Flood control: пауза для всех отправок, попытка не засчитывается
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            values = {**self._postpone(row, e.retry_after), "last_error": repr(e)[:1000]}
+        except (TelegramForbiddenError, TelegramBadRequest, TelegramUnauthorizedError) as e:
+            # Бот заблокирован, чат не найден, сообщение некорректно — повтор не поможет
+            logger.warning("Сообщение %s в чат %s не доставлено: %s", row.id, row.chat_id, e)
+            values = {"status": "failed", "last_error": repr(e)[:1000]}
+            self.failed += 1
+        except Exception as e:
+            logger.warning(
+                "Ошибка отправки сообщения %s в чат %s (попытка %s): %s", row.id, row.chat_id, attempts, e,
+            )
+            values = self._retry(attempts, e)
+        else:
+            values = {"status": "sent", "sent_at": utcnow()}
+            self.sent += 1
+        await self._save(row, values)
+
+    async def _after_save(self, session: AsyncSession, row: OutboxMessage, values: dict) -> None:
+        if row.broadcast_id is not None and values["status"] in ("sent", "failed"):
+            # Итог сообщения рассылки — в её счётчики, в той же транзакции
+            counter = "delivered" if values["status"] == "sent" else "failed"
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == row.broadcast_id)
+                .values({counter: getattr(Broadcast, counter) + 1})
+            )
+
+    async def purge_sent(self) -> None:
+        """Удалить отправленные сообщения старше retention."""
+        border = utcnow() - timedelta(seconds=self.retention)
+        async with async_session() as session:
+            await session.execute(
+                delete(OutboxMessage)
+                .where(OutboxMessage.status == "sent", OutboxMessage.sent_at < border)
+            )
+            await session.commit()
+
+    async def _housekeeping(self) -> None:
+        if time.monotonic() - self._last_purge > self.purge_interval:
+            await self.purge_sent()
+            self._last_purge = time.monotonic()
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        self._start()
+
+    async def metrics(self) -> dict:
+        """Глубина очереди по приоритетам и задержка самого старого сообщения."""
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(OutboxMessage.priority, func.count(OutboxMessage.id), func.min(OutboxMessage.created_at))
+                .where(OutboxMessage.status.in_(("pending", "sending")))
+                .group_by(OutboxMessage.priority)
+            )).all()
+        oldest = min((o for _, _, o in rows if o is not None), default=None)
+        lag = (utcnow() - as_utc(oldest)).total_seconds() if oldest is not None else 0.0
+        return {
+            "depth": sum(n for _, n, _ in rows),
+            "depth_by_priority": {str(p): n for p, n, _ in rows},
+            "lag_seconds": round(max(lag, 0.0), 3),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "postponed": self.postponed,
+            "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "in_flight": len(self._running),
+        }
+
+
+outbox_dispatcher = OutboxDispatcher(
+    global_rate=config.outbox_global_rate,
+    chat_rate=config.outbox_chat_rate,
+    concurrency=config.outbox_concurrency,
+    poll_interval=config.outbox_poll_interval,
+    max_attempts=config.outbox_max_attempts,
+)
@@ -1,52 +1,219 @@
-"""Сервис оплаты через ЮKassa."""
+"""Сервис оплаты через ЮKassa.
 
+По умолчанию запросы идут через асинхронный HTTP-клиент поверх общей
+aiohttp-сессии, чтобы вызов ЮKassa не блокировал event loop бота.
+Синхронный SDK остаётся запасным вариантом (YOOKASSA_BACKEND=sdk) и
+выполняется в отдельном потоке.
+"""
+
+import asyncio
+import base64
+import logging
+import time
 import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from decimal import Decimal
 
+import aiohttp
 from yookassa import Configuration, Payment as YooPayment
 
 from bot.config import config
+from bot.services import metrics
+
+logger = logging.getLogger(__name__)
 
 # Инициализация SDK
 Configuration.account_id = config.yookassa_shop_id
 Configuration.secret_key = config.yookassa_secret
 
 
-def create_payment(amount: float, order_id: int, description: str) -> dict:
+class YooKassaError(Exception):
+    """Ошибка обращения к API ЮKassa."""
+
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class YooKassaClient:
+    """Асинхронный клиент API ЮKassa с пулом keep-alive соединений.
+
+    Сессия создаётся лениво внутри работающего event loop и переиспользуется
+    всеми запросами. Число одновременных запросов ограничено семафором.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        shop_id: str,
+        secret_key: str,
+        timeout: float = 15,
+        connect_timeout: float = 5,
+        max_connections: int = 20,
+    ) -> None:
+        self.api_url = api_url.rstrip("/")
+        # Заголовок Basic-авторизации собираем сами: aiohttp.BasicAuth и
+        # параметр auth= сессии устарели
+        credentials = base64.b64encode(f"{shop_id}:{secret_key}".encode()).decode()
+        self._headers = {"Authorization": f"Basic {credentials}"}
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_connections,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._timeout,
+                headers=self._headers,
+            )
+        return self._session
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: dict | None = None,
+        idempotency_key: str | None = None,
+    ) -> dict:
+        headers = {}
+        if idempotency_key:
+            headers["Idempotence-Key"] = idempotency_key
+
+        async with self._semaphore:
+            try:
+                async with self._get_session().request(
+                    method, f"{self.api_url}{path}", json=payload, headers=headers,
+                ) as resp:
+                    if resp.status >= 400:
+                        text = await resp.text()
+                        raise YooKassaError(
+                            f"ЮKassa {method} {path}: HTTP {resp.status}: {text[:500]}",
+                            status=resp.status,
+                        )
+                    return await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise YooKassaError(f"ЮKassa {method} {path}: {e!r}") from e
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+client = YooKassaClient(
+    api_url=config.yookassa_api_url,
+    shop_id=config.yookassa_shop_id,
+    secret_key=config.yookassa_secret,
+    timeout=config.yookassa_timeout,
+    connect_timeout=config.yookassa_connect_timeout,
+    max_connections=config.yookassa_max_connections,
+)
+
+
+def _payment_request(amount: Decimal, order_id: int, description: str) -> dict:
+    return {
+        "amount": {
+            "value": f"{amount:.2f}",
+            "currency": "RUB",
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": f"{config.webhook_host}/payment/success?order_id={order_id}",
+        },
+        "capture": True,
+        "description": description,
+        "metadata": {
+            "order_id": str(order_id),
+        },
+    }
+
+
+async def _sdk_call(func, *args):
+    """Вызов синхронного SDK в отдельном потоке."""
+    try:
+        return await asyncio.to_thread(func, *args)
+    except Exception as e:
+        raise YooKassaError(f"ЮKassa SDK: {e!r}") from e
+
+
+@contextmanager
+def _observed(operation: str) -> Iterator[None]:
+    """Время и ошибки вызова ЮKassa в метриках."""
+    start = time.perf_counter()
+    try:
+        yield
+    except YooKassaError as e:
+        metrics.yookassa_errors.inc(operation=operation, status=str(e.status or "error"))
+        raise
+    finally:
+        metrics.yookassa_seconds.observe(time.perf_counter() - start, operation=operation)
+
+
+# Пространство имён для ключей идемпотентности заказов
+_IDEMPOTENCY_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "course-bot/yookassa/payments")
+
+
+def order_idempotency_key(order_id: int, cart_fingerprint: str | None) -> str:
+    """Ключ идемпотентности платежа заказа.
+
+    Один и тот же для повторных попыток оплатить тот же заказ: если прошлый
+    запрос дошёл до ЮKassa, а ответ потерялся, ЮKassa вернёт уже созданный
+    платёж вместо нового.
+    """
+    return str(uuid.uuid5(_IDEMPOTENCY_NAMESPACE, f"order:{order_id}:{cart_fingerprint or ''}"))
+
+
+async def create_payment(
+    amount: Decimal, order_id: int, description: str, idempotency_key: str | None = None,
+) -> dict:
     """
     Создать платёж в ЮKassa.
     Возвращает dict с ключами: id, confirmation_url.
     """
-    idempotency_key = str(uuid.uuid4())
-    payment = YooPayment.create(
-        {
-            "amount": {
-                "value": f"{amount:.2f}",
-                "currency": "RUB",
-            },
-            "confirmation": {
-                "type": "redirect",
-                "return_url": f"{config.webhook_host}/payment/success?order_id={order_id}",
-            },
-            "capture": True,
-            "description": description,
-            "metadata": {
-                "order_id": str(order_id),
-            },
-        },
-        idempotency_key,
-    )
+    idempotency_key = idempotency_key or str(uuid.uuid4())
+    payload = _payment_request(amount, order_id, description)
+
+    with _observed("create_payment"):
+        if config.yookassa_backend == "sdk":
+            payment = await _sdk_call(YooPayment.create, payload, idempotency_key)
+            return {
+                "id": payment.id,
+                "confirmation_url": payment.confirmation.confirmation_url,
+            }
+        data = await client.request("POST", "/payments", payload, idempotency_key=idempotency_key)
     return {
-        "id": payment.id,
-        "confirmation_url": payment.confirmation.confirmation_url,
+        "id": data["id"],
+        "confirmation_url": data["confirmation"]["confirmation_url"],
     }
 
 
-def get_payment_info(payment_id: str) -> dict:
+async def get_payment_info(payment_id: str) -> dict:
     """Получить информацию о платеже."""
-    payment = YooPayment.find_one(payment_id)
+    with _observed("get_payment"):
+        if config.yookassa_backend == "sdk":
+            payment = await _sdk_call(YooPayment.find_one, payment_id)
+            return {
+                "id": payment.id,
+                "status": payment.status,
+                "amount": payment.amount.value,
+                "metadata": payment.metadata,
+            }
+        data = await client.request("GET", f"/payments/{payment_id}")
     return {
-        "id": payment.id,
-        "status": payment.status,
-        "amount": payment.amount.value,
-        "metadata": payment.metadata,
+        "id": data["id"],
+        "status": data["status"],
+        "amount": data["amount"]["value"],
+        "metadata": data.get("metadata", {}),
     }
+
+
+async def close() -> None:
+    """Закрыть HTTP-сессию клиента (при остановке бота)."""
+    await client.close()
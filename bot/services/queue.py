@@ -0,0 +1,191 @@
+"""Общий фоновый обработчик очередей с арендой строк (inbox, outbox).
+
+Строка очереди ждёт в статусе pending до next_attempt_at. Обработчик
+забирает готовые строки пачкой: условный UPDATE переводит строку в
+рабочий статус, увеличивает attempts и ставит аренду locked_until, поэтому
+два процесса не возьмут одну строку. Строку, взятую упавшим процессом,
+можно забрать снова после истечения аренды. Неудачная попытка
+возвращает строку в pending с экспоненциальной задержкой и случайным
+разбросом, после max_attempts попыток — failed.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.models import async_session, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+class LeasedQueue:
+    """Пул фоновых обработчиков таблицы-очереди.
+
+    Наследник задаёт model, working_status, order_by и name и реализует
+    _handle(row, deadline): обработку строки и запись итога через _save.
+    """
+
+    model: Any
+    # Статус взятой в работу строки
+    working_status: str
+    # Порядок выбора готовых строк
+    order_by: tuple = ()
+    # Название очереди для журнала
+    name: str = "queue"
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        batch_size: int = 20,
+        poll_interval: float = 1.0,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 600.0,
+        lease: float = 300.0,
+    ) -> None:
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.retried = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    def notify(self) -> None:
+        """Разбудить обработчик — в очереди появились строки."""
+        self._wakeup.set()
+
+    def _claimable(self, now: datetime):
+        model = self.model
+        return or_(
+            and_(model.status == "pending", model.next_attempt_at <= now),
+            # Строка, взятая упавшим процессом, возвращается после истечения аренды
+            and_(model.status == self.working_status, model.locked_until < now),
+        )
+
+    async def _claim(self, limit: int) -> list:
+        """Забрать до limit готовых строк. Условный UPDATE не даст двум
+        процессам взять одну и ту же строку."""
+        model = self.model
+        now = utcnow()
+        claimed = []
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(model)
+                .where(self._claimable(now))
+                .order_by(*self.order_by, model.id)
+                .limit(limit)
+            )).scalars().all()
+            for row in rows:
+                result = await session.execute(
+                    update(model)
+                    .where(model.id == row.id, self._claimable(now))
+                    .values(
+                        status=self.working_status,
+                        attempts=model.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.lease),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount:
+                    claimed.append(row)
+            await session.commit()
+        return claimed
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry(self, attempts: int, error: Exception) -> dict:
+        """Итог неудачной попытки: повтор с задержкой или failed после max_attempts."""
+        values = {"last_error": repr(error)[:1000]}
+        if attempts >= self.max_attempts:
+            values["status"] = "failed"
+            self.failed += 1
+        else:
+            values["status"] = "pending"
+            values["next_attempt_at"] = utcnow() + timedelta(seconds=self._backoff(attempts))
+            self.retried += 1
+        return values
+
+    async def _save(self, row, values: dict) -> None:
+        """Записать итог обработки строки и снять аренду."""
+        async with async_session() as session:
+            await session.execute(
+                update(self.model).where(self.model.id == row.id).values(locked_until=None, **values)
+            )
+            await self._after_save(session, row, values)
+            await session.commit()
+
+    async def _after_save(self, session: AsyncSession, row, values: dict) -> None:
+        """Дополнительные изменения в транзакции итога строки."""
+
+    async def _handle(self, row, deadline: float) -> None:
+        """Обработать строку; deadline — время окончания аренды (time.monotonic)."""
+        raise NotImplementedError
+
+    def _idle_for(self) -> float:
+        """Сколько секунд не забирать строки (например, пауза по лимитам)."""
+        return 0.0
+
+    async def _housekeeping(self) -> None:
+        """Периодическое обслуживание очереди между выборками."""
+
+    async def _run(self) -> None:
+        while True:
+            if len(self._running) >= self.concurrency:
+                await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            idle = self._idle_for()
+            if idle > 0:
+                await asyncio.sleep(idle)
+                continue
+
+            self._wakeup.clear()
+            # Аренда отсчитывается в _claim чуть позже — срок по часам процесса не позже её конца
+            deadline = time.monotonic() + self.lease
+            try:
+                rows = await self._claim(min(self.concurrency - len(self._running), self.batch_size))
+                await self._housekeeping()
+            except Exception as e:
+                logger.error("Ошибка чтения очереди %s: %s", self.name, e)
+                rows = []
+
+            for row in rows:
+                task = asyncio.create_task(self._handle(row, deadline))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            if not rows:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Даём начатым обработкам завершиться; незавершённые вернутся по аренде
+        if self._running:
+            await asyncio.wait(self._running, timeout=10)
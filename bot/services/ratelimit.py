@@ -0,0 +1,61 @@
+"""Ограничение частоты: token bucket и набор bucket'ов по ключу."""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+
+class TokenBucket:
+    """Bucket на capacity токенов, пополняется со скоростью rate токенов в секунду."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount: float = 1.0, now: float | None = None) -> float:
+        """Взять amount токенов.
+
+        Возвращает 0, если токены взяты, иначе — через сколько секунд их хватит
+        (токены при этом не списываются).
+        """
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class KeyedRateLimiter:
+    """Отдельный TokenBucket на каждый ключ (пользователя, чат).
+
+    Хранит не больше max_keys bucket'ов: давно не использованные вытесняются —
+    их владельцы и так успели накопить полный запас токенов.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, key: Hashable, amount: float = 1.0, now: float | None = None) -> float:
+        """Как TokenBucket.consume для bucket'а ключа key."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.consume(amount, now)
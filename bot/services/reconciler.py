@@ -0,0 +1,168 @@
+"""Сверка зависших платежей с ЮKassa.
+
+Если webhook ЮKassa потерялся, платёж навсегда остаётся pending, а
+пользователь не получает материалы. Сверка периодически обходит
+pending-платежи старше RECONCILE_STALE_AFTER секунд (постранично, по id),
+запрашивает их статус в ЮKassa с ограниченной параллельностью и кладёт
+итоговые события в очередь уведомлений (inbox) — дальше их обрабатывает
+тот же код, что и события из webhook. Событие, которое уже ждёт в
+очереди, не дублируется. Если же событие уже обработано (done / failed),
+а платёж всё ещё pending — например, webhook пришёл раньше, чем платёж
+записан в БД, — оно возвращается в очередь со сброшенными попытками.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from bot.config import config
+from bot.models import as_utc, async_session, utcnow, Payment
+from bot.services import inbox
+from bot.services.payment import get_payment_info, YooKassaError
+from bot.services.scheduler import Periodic
+
+logger = logging.getLogger(__name__)
+
+# Статус платежа в ЮKassa -> событие webhook
+FINAL_EVENTS = {
+    "succeeded": "payment.succeeded",
+    "canceled": "payment.canceled",
+}
+
+
+class PaymentReconciler:
+    def __init__(
+        self, stale_after: float = 600, page_size: int = 200, concurrency: int = 5,
+    ) -> None:
+        self.stale_after = stale_after
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.checked = 0
+        self.resolved = 0
+        self.requeued = 0
+        self.in_queue = 0
+        self.errors = 0
+        self.last_run_at: datetime | None = None
+        self.last_run_seconds = 0.0
+        self.last_run_checked = 0
+
+    def _border(self) -> datetime:
+        return utcnow() - timedelta(seconds=self.stale_after)
+
+    async def _page(self, border: datetime, after_id: int) -> list[tuple[int, str]]:
+        """Следующая страница зависших платежей: (id, yookassa_id) с id > after_id."""
+        async with async_session() as session:
+            rows = await session.execute(
+                select(Payment.id, Payment.yookassa_id)
+                .where(
+                    Payment.status == "pending",
+                    Payment.id > after_id,
+                    Payment.created_at < border,
+                )
+                .order_by(Payment.id)
+                .limit(self.page_size)
+            )
+            return list(rows.tuples())
+
+    async def _check(self, semaphore: asyncio.Semaphore, yookassa_id: str) -> dict | None:
+        async with semaphore:
+            try:
+                return await get_payment_info(yookassa_id)
+            except YooKassaError as e:
+                self.errors += 1
+                logger.warning("Сверка: не удалось получить платёж %s: %s", yookassa_id, e)
+                return None
+
+    async def _enqueue(self, events: list[tuple[str, str, dict]]) -> tuple[int, int, int]:
+        """Поставить итоговые события в inbox. Возвращает (новых, возвращённых, уже в очереди)."""
+        queued, requeued, in_queue = 0, 0, 0
+        async with async_session() as session:
+            for yookassa_id, event, info in events:
+                payload = {"event": event, "object": info, "source": "reconciler"}
+                if await inbox.enqueue(yookassa_id, event, payload, session=session):
+                    queued += 1
+                elif await inbox.requeue(yookassa_id, event, payload, session=session):
+                    requeued += 1
+                    logger.warning(
+                        "Сверка: событие %s платежа %s уже обработано, а платёж pending — повтор",
+                        event, yookassa_id,
+                    )
+                else:
+                    in_queue += 1
+            await session.commit()
+        inbox.inbox_processor.notify()
+        return queued, requeued, in_queue
+
+    async def run(self) -> int:
+        """Один проход по всем зависшим платежам. Возвращает число поставленных в очередь событий."""
+        started = time.monotonic()
+        border = self._border()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        after_id, checked, queued, requeued, in_queue = 0, 0, 0, 0, 0
+
+        while True:
+            page = await self._page(border, after_id)
+            if not page:
+                break
+            after_id = page[-1][0]
+            infos = await asyncio.gather(*(self._check(semaphore, yid) for _, yid in page))
+            checked += len(page)
+
+            events = [
+                (info["id"], FINAL_EVENTS[info["status"]], info)
+                for info in infos if info and info["status"] in FINAL_EVENTS
+            ]
+            if events:
+                new, again, waiting = await self._enqueue(events)
+                queued, requeued, in_queue = queued + new, requeued + again, in_queue + waiting
+            if len(page) < self.page_size:
+                break
+
+        resolved = queued + requeued
+        self.checked += checked
+        self.resolved += resolved
+        self.requeued += requeued
+        self.in_queue += in_queue
+        self.last_run_at = utcnow()
+        self.last_run_seconds = time.monotonic() - started
+        self.last_run_checked = checked
+        if resolved or in_queue:
+            logger.info(
+                "Сверка платежей: проверено %s, в очередь %s, повторно %s, уже в очереди %s",
+                checked, queued, requeued, in_queue,
+            )
+        return resolved
+
+    async def metrics(self) -> dict:
+        """Число зависших платежей и возраст самого старого из них."""
+        async with async_session() as session:
+            backlog, oldest = (await session.execute(
+                select(func.count(Payment.id), func.min(Payment.created_at))
+                .where(Payment.status == "pending", Payment.created_at < self._border())
+            )).one()
+        lag = (utcnow() - as_utc(oldest)).total_seconds() if oldest is not None else 0.0
+        return {
+            "backlog": backlog,
+            "lag_seconds": round(max(lag, 0.0), 3),
+            "checked": self.checked,
+            "resolved": self.resolved,
+            "requeued": self.requeued,
+            "in_queue": self.in_queue,
+            "errors": self.errors,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+            "last_run_per_second": round(
+                self.last_run_checked / self.last_run_seconds, 1
+            ) if self.last_run_seconds else 0.0,
+        }
+
+
+payment_reconciler = PaymentReconciler(
+    stale_after=config.reconcile_stale_after,
+    page_size=config.reconcile_page_size,
+    concurrency=config.reconcile_concurrency,
+)
+reconciler_job = Periodic("payments", config.reconcile_interval, payment_reconciler.run)
@@ -0,0 +1,50 @@
+"""Периодические фоновые задачи процесса бота."""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Periodic:
+    """Вызывает func раз в interval секунд, пока процесс работает.
+
+    Ошибка одного запуска логируется и не останавливает задачу.
+    """
+
+    def __init__(
+        self, name: str, interval: float, func: Callable[[], Awaitable[None]],
+    ) -> None:
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.runs = 0
+        self.errors = 0
+        self._task: asyncio.Task | None = None
+
+    async def run_once(self) -> None:
+        try:
+            await self.func()
+            self.runs += 1
+        except Exception:
+            self.errors += 1
+            logger.exception("Ошибка фоновой задачи %s", self.name)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name=f"periodic:{self.name}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
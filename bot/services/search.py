@@ -0,0 +1,151 @@
+"""Поиск курсов по названию и описанию: /search и inline-режим.
+
+На SQLite запрос идёт в FTS5-индекс courses_fts (bot.models.search):
+каждое слово запроса ищется по префиксу («курс» найдёт «курсы»,
+«курсов»), все слова должны встретиться, порядок — BM25, совпадение в
+названии весит больше, чем в описании. На PostgreSQL — ILIKE по тем же
+словам в порядке id.
+
+Результаты популярных запросов кэшируются на SEARCH_CACHE_TTL секунд;
+изменение каталога из админки сбрасывает кэш.
+"""
+
+import re
+import time
+from collections import OrderedDict
+
+from sqlalchemy import and_, column, literal_column, or_, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import config
+from bot.models import async_session, engine, Course, CourseView, COURSE_COLUMNS
+
+_WORD = re.compile(r"\w+")
+# Больше слов в запросе не ищем — длинный запрос только замедляет MATCH
+MAX_TERMS = 8
+# Вес совпадения в названии и в описании для bm25()
+TITLE_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 1.0
+
+courses_fts = table("courses_fts", column("rowid"))
+
+
+def query_terms(query: str) -> tuple[str, ...]:
+    """Слова запроса в нижнем регистре, «ё» → «е»."""
+    query = query.lower().replace("ё", "е")
+    return tuple(_WORD.findall(query))[:MAX_TERMS]
+
+
+def match_expression(terms: tuple[str, ...]) -> str:
+    """Запрос FTS5: все слова, от двух букв — по префиксу.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 (OR, NEAR, *, -)
+    из пользовательского ввода не интерпретируется.
+    """
+    return " ".join(f'"{t}"*' if len(t) > 1 else f'"{t}"' for t in terms)
+
+
+async def _search_fts(session: AsyncSession, terms: tuple[str, ...], limit: int) -> list[CourseView]:
+    # Ранжируем и обрезаем внутри индекса: строки courses читаются только для limit лучших
+    rank = literal_column(f"bm25(courses_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})")
+    best = (
+        select(courses_fts.c.rowid, rank.label("rank"))
+        .where(text("courses_fts MATCH :match").bindparams(match=match_expression(terms)))
+        .order_by(rank)
+        .limit(limit)
+        .subquery()
+    )
+    stmt = (
+        select(*COURSE_COLUMNS)
+        .join_from(best, Course, Course.id == best.c.rowid)
+        .where(Course.is_active.is_(True))
+        .order_by(best.c.rank)
+    )
+    return [CourseView(*row) for row in await session.execute(stmt)]
+
+
+async def _search_like(session: AsyncSession, terms: tuple[str, ...], limit: int) -> list[CourseView]:
+    def contains(term: str):
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return or_(
+            Course.title.ilike(pattern, escape="\\"),
+            Course.description.ilike(pattern, escape="\\"),
+        )
+
+    stmt = (
+        select(*COURSE_COLUMNS)
+        .where(Course.is_active.is_(True), and_(*(contains(t) for t in terms)))
+        .order_by(Course.id)
+        .limit(limit)
+    )
+    return [CourseView(*row) for row in await session.execute(stmt)]
+
+
+class CourseSearch:
+    """Поиск с LRU-кэшем результатов: слова запроса -> (время, курсы)."""
+
+    def __init__(self, limit: int, max_queries: int, ttl: float) -> None:
+        self.limit = limit
+        self.max_queries = max_queries
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[tuple[str, ...], tuple[float, tuple[CourseView, ...]]] = OrderedDict()
+
+    def invalidate(self) -> None:
+        """Сбросить кэш после изменения каталога."""
+        self.version += 1
+        self._data.clear()
+
+    def _get(self, terms: tuple[str, ...]) -> tuple[CourseView, ...] | None:
+        entry = self._data.get(terms)
+        if entry is None:
+            return None
+        loaded_at, courses = entry
+        if self.ttl and time.monotonic() - loaded_at >= self.ttl:
+            del self._data[terms]
+            return None
+        self._data.move_to_end(terms)
+        return courses
+
+    def _put(self, terms: tuple[str, ...], courses: tuple[CourseView, ...]) -> None:
+        self._data[terms] = (time.monotonic(), courses)
+        self._data.move_to_end(terms)
+        while len(self._data) > self.max_queries:
+            self._data.popitem(last=False)
+
+    async def search(self, query: str) -> tuple[CourseView, ...]:
+        """Активные курсы по запросу, лучшие совпадения первыми (не больше limit)."""
+        terms = query_terms(query)
+        if not terms:
+            return ()
+        courses = self._get(terms)
+        if courses is not None:
+            self.hits += 1
+            return courses
+
+        self.misses += 1
+        version = self.version
+        find = _search_fts if engine.dialect.name == "sqlite" else _search_like
+        async with async_session() as session:
+            courses = tuple(await find(session, terms, self.limit))
+        # Если каталог изменился во время поиска — результат не кэшируем
+        if version == self.version:
+            self._put(terms, courses)
+        return courses
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+course_search = CourseSearch(
+    limit=min(config.search_results_limit, 50),
+    max_queries=config.search_cache_size,
+    ttl=config.search_cache_ttl,
+)
@@ -0,0 +1,171 @@
+"""Накопительная статистика продаж.
+
+Счётчики (stats_counters) и дневные показатели (stats_daily) обновляются
+в тех же транзакциях, что и записи пользователей, заказов и платежей
+(см. bot.services.db), поэтому экран статистики читает готовые числа, а
+не агрегирует всю историю. Фоновая сверка (stats_reconciler) периодически
+пересчитывает счётчики и последние дни по исходным таблицам и исправляет
+расхождения. Дни считаются по UTC.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import Connection, select, delete, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.functions import FunctionElement
+
+from bot.config import config
+from bot.models import (
+    engine, dialect_insert, User, Order, OrderItem, Payment, StatsCounter, StatsDaily,
+)
+from bot.services.scheduler import Periodic
+
+logger = logging.getLogger(__name__)
+
+# course_id строки с итогами дня
+TOTAL = 0
+COUNTERS = ("users", "orders", "paid_orders", "revenue")
+_DAILY_ZERO = {"orders": 0, "paid_orders": 0, "revenue": Decimal(0), "new_users": 0}
+
+
+def today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+# ─── Обновление в транзакциях записи ─────────────────────────
+
+async def _bump(
+    session: AsyncSession, counters: dict[str, int | Decimal], daily: dict[int, dict],
+) -> None:
+    """Прибавить значения к счётчикам и к показателям текущего дня."""
+    stmt = dialect_insert(StatsCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StatsCounter.name],
+        set_={"value": StatsCounter.value + stmt.excluded.value},
+    )
+    await session.execute(stmt, [{"name": k, "value": v} for k, v in counters.items()])
+
+    day = today()
+    stmt = dialect_insert(StatsDaily)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StatsDaily.day, StatsDaily.course_id],
+        set_={
+            col: getattr(StatsDaily, col) + getattr(stmt.excluded, col) for col in _DAILY_ZERO
+        },
+    )
+    await session.execute(stmt, [
+        {"day": day, "course_id": course_id, **_DAILY_ZERO, **values}
+        for course_id, values in daily.items()
+    ])
+
+
+async def user_created(session: AsyncSession) -> None:
+    await _bump(session, {"users": 1}, {TOTAL: {"new_users": 1}})
+
+
+async def order_created(session: AsyncSession, course_ids: list[int]) -> None:
+    daily = {TOTAL: {"orders": 1}}
+    daily.update({cid: {"orders": 1} for cid in course_ids})
+    await _bump(session, {"orders": 1}, daily)
+
+
+async def order_paid(
+    session: AsyncSession, amount: Decimal, items: list[tuple[int, Decimal]],
+) -> None:
+    """Оплата заказа: amount — сумма платежа, items — (id курса, цена)."""
+    daily = {TOTAL: {"paid_orders": 1, "revenue": amount}}
+    daily.update({cid: {"paid_orders": 1, "revenue": price} for cid, price in items})
+    await _bump(session, {"paid_orders": 1, "revenue": amount}, daily)
+
+
+# ─── Пересчёт по исходным таблицам ───────────────────────────
+
+def rebuild(conn: Connection, since: date | None = None) -> dict[str, tuple]:
+    """Пересчитать счётчики и дневные показатели начиная с since (все дни, если None).
+
+    Возвращает расхождения счётчиков: имя -> (было, стало).
+    """
+    actual = {
+        "users": conn.scalar(select(func.count(User.id))) or 0,
+        "orders": conn.scalar(select(func.count(Order.id))) or 0,
+        "paid_orders": conn.scalar(
+            select(func.count(Order.id)).where(Order.status == "paid")
+        ) or 0,
+        "revenue": conn.scalar(
+            select(func.sum(Payment.amount)).where(Payment.status == "succeeded")
+        ) or 0,
+    }
+    stored = dict(conn.execute(select(StatsCounter.name, StatsCounter.value)).all())
+    drift = {
+        name: (stored.get(name, 0), value) for name, value in actual.items()
+        if Decimal(str(stored.get(name, 0))) != Decimal(str(value))
+    }
+    stmt = dialect_insert(StatsCounter)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StatsCounter.name], set_={"value": stmt.excluded.value},
+        ),
+        [{"name": name, "value": value} for name, value in actual.items()],
+    )
+
+    border = datetime.combine(since, time.min) if since else None
+
+    def by_day(column, *columns, join=None, where=()):
+        """Агрегаты по дню column (и по остальным ключам из columns)."""
+        day = func.date(column)
+        stmt = select(day, *columns).where(column.is_not(None), *where)
+        if join is not None:
+            stmt = stmt.join(*join)
+        if border is not None:
+            stmt = stmt.where(column >= border)
+        keys = [c for c in columns if not isinstance(c, FunctionElement)]
+        return conn.execute(stmt.group_by(day, *keys)).all()
+
+    buckets: dict[tuple[str, int], dict] = defaultdict(lambda: dict(_DAILY_ZERO))
+    succeeded = (Payment.status == "succeeded",)
+
+    for day, n in by_day(Order.created_at, func.count(Order.id)):
+        buckets[(str(day), TOTAL)]["orders"] = n
+    for day, n in by_day(User.created_at, func.count(User.id)):
+        buckets[(str(day), TOTAL)]["new_users"] = n
+    for day, n, revenue in by_day(
+        Payment.paid_at, func.count(Payment.id), func.sum(Payment.amount), where=succeeded,
+    ):
+        buckets[(str(day), TOTAL)].update(paid_orders=n, revenue=revenue or 0)
+
+    for day, course_id, n in by_day(
+        Order.created_at, OrderItem.course_id, func.count(OrderItem.id),
+        join=(OrderItem, OrderItem.order_id == Order.id),
+    ):
+        buckets[(str(day), course_id)]["orders"] = n
+    for day, course_id, n, revenue in by_day(
+        Payment.paid_at, OrderItem.course_id, func.count(OrderItem.id), func.sum(OrderItem.price),
+        join=(OrderItem, OrderItem.order_id == Payment.order_id), where=succeeded,
+    ):
+        buckets[(str(day), course_id)].update(paid_orders=n, revenue=revenue or 0)
+
+    purge = delete(StatsDaily)
+    if since is not None:
+        purge = purge.where(StatsDaily.day >= since.isoformat())
+    conn.execute(purge)
+    if buckets:
+        conn.execute(insert(StatsDaily), [
+            {"day": day, "course_id": course_id, **values}
+            for (day, course_id), values in buckets.items()
+        ])
+    return drift
+
+
+async def reconcile() -> None:
+    """Сверить статистику с исходными таблицами за последние дни."""
+    since = datetime.now(timezone.utc).date() - timedelta(days=max(config.stats_reconcile_days, 1) - 1)
+    async with engine.begin() as conn:
+        drift = await conn.run_sync(rebuild, since)
+    if drift:
+        logger.warning("Счётчики статистики расходились с данными, исправлено: %s", drift)
+
+
+stats_reconciler = Periodic("stats", config.stats_reconcile_interval, reconcile)
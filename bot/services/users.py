@@ -0,0 +1,124 @@
+"""Кэш пользователей: telegram_id -> запись из таблицы users.
+
+Строка пользователя почти не меняется, поэтому повторные обновления от
+того же пользователя не обращаются к БД. Новый пользователь создаётся
+одним INSERT ... ON CONFLICT DO NOTHING RETURNING — без гонки между
+SELECT и INSERT при одновременных /start. Имя и username обновляются,
+только если Telegram прислал не то, что записано.
+
+В кэш запись попадает после commit транзакции, в которой её прочитали
+или создали: откат не оставит в кэше несуществующий id.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import config
+from bot.models import after_commit, dialect_insert, use_session, User
+from bot.services import stats
+
+
+@dataclass(frozen=True, slots=True)
+class UserRecord:
+    """Пользователь без привязки к сессии БД."""
+
+    id: int
+    telegram_id: int
+    full_name: str
+    username: str | None
+
+
+class UserCache:
+    """LRU-кэш пользователей по telegram_id."""
+
+    def __init__(self, max_users: int) -> None:
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.renamed = 0
+        self._data: OrderedDict[int, UserRecord] = OrderedDict()
+
+    def _get(self, telegram_id: int) -> UserRecord | None:
+        record = self._data.get(telegram_id)
+        if record is not None:
+            self._data.move_to_end(telegram_id)
+        return record
+
+    def _put(self, record: UserRecord) -> None:
+        self._data[record.telegram_id] = record
+        self._data.move_to_end(record.telegram_id)
+        while len(self._data) > self.max_users:
+            self._data.popitem(last=False)
+
+    async def _rename(
+        self, session: AsyncSession, record: UserRecord, full_name: str, username: str | None,
+    ) -> UserRecord:
+        await session.execute(
+            update(User).where(User.id == record.id).values(full_name=full_name, username=username)
+        )
+        self.renamed += 1
+        return UserRecord(record.id, record.telegram_id, full_name, username)
+
+    async def resolve(
+        self,
+        telegram_id: int,
+        full_name: str,
+        username: str | None = None,
+        session: AsyncSession | None = None,
+    ) -> UserRecord:
+        """Пользователь по telegram_id; создаётся при первом обращении.
+
+        Запросы к БД: попадание в кэш — ни одного; новый пользователь —
+        один INSERT (плюс счётчики статистики); известный, но не
+        закэшированный — INSERT без вставки и SELECT.
+        """
+        async with use_session(session) as session:
+            record = self._get(telegram_id)
+            if record is not None:
+                self.hits += 1
+                if (record.full_name, record.username) == (full_name, username):
+                    return record
+                record = await self._rename(session, record, full_name, username)
+                after_commit(session, lambda: self._put(record))
+                return record
+
+            self.misses += 1
+            stmt = (
+                dialect_insert(User)
+                .values(telegram_id=telegram_id, full_name=full_name, username=username)
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+                .returning(User.id)
+            )
+            user_id = (await session.execute(stmt)).scalar()
+            if user_id is not None:
+                self.created += 1
+                await stats.user_created(session)
+                record = UserRecord(user_id, telegram_id, full_name, username)
+            else:
+                row = (await session.execute(
+                    select(User.id, User.full_name, User.username)
+                    .where(User.telegram_id == telegram_id)
+                )).one()
+                record = UserRecord(row.id, telegram_id, row.full_name, row.username)
+                if (record.full_name, record.username) != (full_name, username):
+                    record = await self._rename(session, record, full_name, username)
+            after_commit(session, lambda: self._put(record))
+            return record
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "renamed": self.renamed,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+user_cache = UserCache(max_users=config.user_cache_size)
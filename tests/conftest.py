@@ -0,0 +1,30 @@
+"""Запуск асинхронных тестов без плагинов: каждый тест — в своём event loop."""
+
+import asyncio
+import inspect
+import shutil
+
+import pytest
+
+from tests.support import TMP_DIR, reset_state, teardown_state
+
+
+async def _run_test(coro) -> None:
+    await reset_state()
+    try:
+        await coro
+    finally:
+        await teardown_state()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(_run_test(pyfuncitem.obj(**kwargs)))
+    return True
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
@@ -0,0 +1,152 @@
+"""Окружение тестов и общие помощники.
+
+Модуль выставляет переменные окружения до первого импорта бота (config
+читается при импорте), поэтому conftest импортирует его первым. Бот
+работает на временной БД SQLite и ходит в поддельные Telegram и ЮKassa
+из bench.fakes на свободных портах.
+"""
+
+import os
+import socket
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+TELEGRAM_PORT = _free_port()
+YOOKASSA_PORT = _free_port()
+TMP_DIR = tempfile.mkdtemp(prefix="course-bot-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(TMP_DIR, 'test.db')}",
+    "BOT_TOKEN": "123456:test",
+    "TELEGRAM_API_URL": f"http://127.0.0.1:{TELEGRAM_PORT}",
+    "YOOKASSA_BACKEND": "http",
+    "YOOKASSA_API_URL": f"http://127.0.0.1:{YOOKASSA_PORT}/v3",
+    "YOOKASSA_SHOP_ID": "test",
+    "YOOKASSA_SECRET": "test",
+    "TELEGRAM_MODE": "polling",
+    "CART_BACKEND": "memory",
+    "THROTTLE_RATE": "0",
+    "RECONCILE_INTERVAL": "0",
+    "STATS_RECONCILE_INTERVAL": "0",
+    "ORDER_EXPIRE_INTERVAL": "0",
+})
+
+from sqlalchemy import delete, event, insert, select  # noqa: E402
+
+from bench.fakes import FakeTelegram, FakeYooKassa  # noqa: E402
+from bench.scenarios import _callback_update, _inline_update, _message_update  # noqa: E402
+from bot.__main__ import create_bot, create_dispatcher  # noqa: E402
+from bot.models import Base, Course, SchemaMigration, async_session, engine, init_db  # noqa: E402
+from bot.services import payment  # noqa: E402
+from bot.services.cart_store import cart_store  # noqa: E402
+from bot.services.catalog import catalog_cache  # noqa: E402
+from bot.services.entitlements import entitlement_cache  # noqa: E402
+from bot.services.search import course_search  # noqa: E402
+from bot.services.users import user_cache  # noqa: E402
+
+__all__ = [
+    "TELEGRAM_PORT", "YOOKASSA_PORT", "callback_update", "inline_update", "message_update",
+    "fake_telegram", "fake_yookassa", "seed_courses", "bot_and_dispatcher",
+    "reset_state", "teardown_state", "count_statements",
+]
+
+message_update = _message_update
+callback_update = _callback_update
+inline_update = _inline_update
+
+
+async def reset_state() -> None:
+    """Пустая БД со схемой и пустые кэши процесса перед тестом."""
+    await init_db()
+    async with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table is not SchemaMigration.__table__:
+                await conn.execute(delete(table))
+    for cache in (user_cache, entitlement_cache, course_search, cart_store):
+        cache._data.clear()
+    catalog_cache.invalidate()
+    catalog_cache._locks.clear()
+
+
+async def teardown_state() -> None:
+    """Закрыть соединения, привязанные к event loop теста."""
+    await payment.close()
+    await engine.dispose()
+
+
+@contextmanager
+def count_statements():
+    """Список SQL-запросов, выполненных внутри блока (before_cursor_execute)."""
+    statements: list[str] = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+
+async def seed_courses(count: int, price: int = 990) -> list[int]:
+    async with async_session() as session:
+        await session.execute(insert(Course.__table__), [
+            {
+                "title": f"Курс {i}",
+                "description": f"Описание курса {i}",
+                "price": price,
+                "material_url": f"https://example.com/materials/{i}",
+                "is_active": True,
+            }
+            for i in range(1, count + 1)
+        ])
+        await session.commit()
+        return list((await session.execute(select(Course.id).order_by(Course.id))).scalars())
+
+
+@asynccontextmanager
+async def fake_telegram(**kwargs):
+    telegram = FakeTelegram(**kwargs)
+    await telegram.start(TELEGRAM_PORT)
+    try:
+        yield telegram
+    finally:
+        await telegram.close()
+
+
+@asynccontextmanager
+async def fake_yookassa(**kwargs):
+    yookassa = FakeYooKassa(**kwargs)
+    await yookassa.start(YOOKASSA_PORT)
+    try:
+        yield yookassa
+    finally:
+        await yookassa.close()
+
+
+_dispatcher = None
+
+
+@asynccontextmanager
+async def bot_and_dispatcher():
+    """Бот и диспетчер как в bot.__main__; обновления — через dp.feed_raw_update.
+
+    Роутеры бота — объекты модуля и подключаются только к одному
+    диспетчеру, поэтому диспетчер создаётся один раз на процесс.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = create_dispatcher()
+    bot = create_bot()
+    try:
+        yield bot, _dispatcher
+    finally:
+        await bot.session.close()
@@ -0,0 +1,141 @@
+"""Корзина и заказ: число запросов не зависит от числа курсов, дублей заказов нет."""
+
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import select, update
+
+from bot.models import async_session, utcnow, Cart, Order
+from bot.services import db
+from bot.services.cart_store import MemoryCartStore, SQLiteCartStore, cart_store
+from bot.services.users import user_cache
+from tests.support import (
+    bot_and_dispatcher, callback_update, count_statements, fake_telegram, message_update, seed_courses,
+)
+
+CART_SIZES = (1, 5, 20)
+TAPS = 20
+
+
+def _memory(max_items: int = 50) -> MemoryCartStore:
+    return MemoryCartStore(max_carts=1000, ttl=3600, max_items=max_items)
+
+
+async def test_show_cart_query_count_is_constant():
+    course_ids = await seed_courses(max(CART_SIZES))
+    queries = {}
+    async with fake_telegram(latency=0), bot_and_dispatcher() as (bot, dp):
+        for user_id, size in enumerate(CART_SIZES, start=2001):
+            await dp.feed_raw_update(bot, message_update(user_id, "/start"))
+            await cart_store.set(user_id, course_ids[:size])
+            with count_statements() as statements:
+                await dp.feed_raw_update(bot, callback_update(user_id, "cart"))
+            queries[size] = len(statements)
+
+    assert queries[1] > 0
+    assert len(set(queries.values())) == 1, queries
+
+
+async def test_get_courses_is_one_query():
+    course_ids = await seed_courses(max(CART_SIZES))
+    for size in CART_SIZES:
+        async with async_session() as session:
+            with count_statements() as statements:
+                courses = await db.get_courses(course_ids[:size], session=session)
+        assert [c.id for c in courses] == course_ids[:size]
+        assert len(statements) == 1
+
+
+async def test_create_order_query_count_is_constant():
+    course_ids = await seed_courses(max(CART_SIZES))
+    queries = {}
+    for user_id, size in enumerate(CART_SIZES, start=3001):
+        user = await user_cache.resolve(user_id, f"User {user_id}")
+        async with async_session() as session:
+            with count_statements() as statements:
+                order = await db.create_order(user, course_ids[:size], session=session)
+            await session.commit()
+        assert len(order.items) == size
+        queries[size] = len(statements)
+
+    assert len(set(queries.values())) == 1, queries
+
+
+async def test_parallel_create_order_in_separate_sessions_makes_one_order():
+    # Checkout в разных процессах: блокировка middleware не действует,
+    # каждый вызов — в своей сессии и транзакции
+    course_ids = await seed_courses(3)
+    user = await user_cache.resolve(3101, "User 3101")
+
+    async def checkout():
+        async with async_session() as session:
+            order = await db.create_order(user, course_ids, session=session)
+            await session.commit()
+            return order.id
+
+    order_ids = await asyncio.gather(*(checkout() for _ in range(10)))
+    assert len(set(order_ids)) == 1
+    async with async_session() as session:
+        orders = (await session.execute(select(Order.id, Order.status))).all()
+    assert orders == [(order_ids[0], "pending")]
+
+
+async def test_expired_pending_order_does_not_block_new_one():
+    course_ids = await seed_courses(2)
+    user = await user_cache.resolve(3102, "User 3102")
+    first = await db.create_order(user, course_ids)
+    # Срок истёк, но фоновая задача ещё не пометила заказ expired
+    async with async_session() as session:
+        await session.execute(
+            update(Order).where(Order.id == first.id).values(expires_at=utcnow() - timedelta(seconds=1))
+        )
+        await session.commit()
+
+    second = await db.create_order(user, course_ids)
+    assert second.id != first.id
+    async with async_session() as session:
+        statuses = dict((await session.execute(select(Order.id, Order.status))).all())
+    assert statuses == {first.id: "expired", second.id: "pending"}
+
+
+async def test_concurrent_taps_in_shared_store_lose_nothing():
+    # WORKERS > 1: у каждого процесса своё хранилище, общая только таблица carts
+    workers = [SQLiteCartStore(_memory(), shared=True) for _ in range(2)]
+    user_id, courses = 3201, list(range(1, TAPS + 1))
+
+    added = await asyncio.gather(*(
+        workers[i % 2].add(user_id, course_id) for i, course_id in enumerate(courses + courses)
+    ))
+    assert added.count(True) == TAPS
+    assert sorted(await workers[0].get(user_id)) == courses
+
+    removed = await asyncio.gather(*(
+        workers[i % 2].remove(user_id, course_id) for i, course_id in enumerate(courses[::2])
+    ))
+    assert all(removed)
+    assert sorted(await workers[1].get(user_id)) == courses[1::2]
+
+    await asyncio.gather(*(workers[0].remove(user_id, course_id) for course_id in courses[1::2]))
+    assert await workers[1].get(user_id) == []
+    async with async_session() as session:
+        assert await session.scalar(select(Cart.telegram_id)) is None
+
+
+async def test_shared_store_respects_max_items():
+    store = SQLiteCartStore(_memory(max_items=3), shared=True)
+    added = await asyncio.gather(*(store.add(3202, course_id) for course_id in range(1, 11)))
+    assert added.count(True) == 3
+    assert len(await store.get(3202)) == 3
+
+
+async def test_concurrent_taps_on_cold_write_behind_cache_lose_nothing():
+    user_id, courses = 3203, list(range(1, TAPS + 1))
+    await SQLiteCartStore(_memory(), shared=True).set(user_id, courses[:1])
+
+    # Кэш пуст: каждое нажатие сначала ждёт чтения корзины из БД
+    store = SQLiteCartStore(_memory())
+    await asyncio.gather(*(store.add(user_id, course_id) for course_id in courses[1:]))
+    assert sorted(await store.get(user_id)) == courses
+
+    await store.flush()
+    assert sorted(await SQLiteCartStore(_memory(), shared=True).get(user_id)) == courses
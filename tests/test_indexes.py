@@ -0,0 +1,161 @@
+"""Горячие запросы идут по своим индексам, а не полным просмотром таблицы.
+
+Планы проверяются на синтетическом наборе с долями статусов как в рабочей
+БД (почти все заказы и платежи закрыты, очереди в основном разобраны) и
+со статистикой ANALYZE: на пустых таблицах выбор планировщика мало что
+говорит о поведении на реальном объёме.
+"""
+
+import random
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from sqlalchemy import event, insert, text
+
+from bot.models import (
+    async_session, engine, utcnow, Order, OutboxMessage, Payment, User, WebhookInbox,
+)
+from bot.services import db
+from bot.services.inbox import InboxProcessor
+from bot.services.outbox import OutboxDispatcher
+from bot.services.reconciler import payment_reconciler
+from bot.services.users import user_cache
+from tests.support import seed_courses
+
+USERS = 2_000
+ORDERS = 10_000
+INBOX = 10_000
+OUTBOX = 20_000
+BUYER = 1
+
+
+def _pick(rng: random.Random, shares: dict[str, float]) -> str:
+    return rng.choices(list(shares), weights=list(shares.values()))[0]
+
+
+@asynccontextmanager
+async def _production_volume():
+    """Синтетический набор со статистикой ANALYZE; статистика удаляется после теста."""
+    rng = random.Random(11)
+    now = utcnow()
+
+    def ago(seconds: float):
+        return now - timedelta(seconds=seconds)
+
+    users = [{"id": i, "telegram_id": 900_000 + i, "full_name": f"User {i}"} for i in range(1, USERS + 1)]
+    orders, payments = [], []
+    for i in range(1, ORDERS + 1):
+        status = _pick(rng, {"paid": 0.6, "expired": 0.3, "pending": 0.1})
+        created = ago(rng.uniform(0, 90 * 86400))
+        orders.append({
+            "id": i, "user_id": rng.randint(1, USERS), "status": status, "total_amount": 990,
+            "cart_fingerprint": f"{i:064x}", "created_at": created,
+            "expires_at": ago(rng.uniform(-3600, 3600)) if status == "pending" else created,
+        })
+        if status != "expired" or rng.random() < 0.5:
+            payment_status = {"paid": "succeeded", "pending": "pending"}.get(status, "canceled")
+            payments.append({
+                "order_id": i, "yookassa_id": f"pay-{i}", "amount": 990,
+                "status": payment_status, "created_at": created,
+            })
+    inbox = [
+        {
+            "yookassa_id": f"pay-{i}", "event": "payment.succeeded", "payload": "{}",
+            "status": (status := _pick(rng, {"done": 0.95, "failed": 0.02, "pending": 0.02, "processing": 0.01})),
+            "next_attempt_at": ago(rng.uniform(-600, 86400)),
+            "locked_until": ago(rng.uniform(-300, 300)) if status == "processing" else None,
+        }
+        for i in range(1, INBOX + 1)
+    ]
+    outbox = [
+        {
+            "chat_id": 900_000 + rng.randint(1, USERS), "text": "Сообщение",
+            "priority": rng.choice((0, 5, 10, 10)),
+            "status": (status := _pick(rng, {"sent": 0.9, "failed": 0.05, "pending": 0.04, "sending": 0.01})),
+            "next_attempt_at": ago(rng.uniform(-600, 86400)),
+            "locked_until": ago(rng.uniform(-120, 120)) if status == "sending" else None,
+        }
+        for _ in range(OUTBOX)
+    ]
+
+    async with engine.begin() as conn:
+        for model, rows in (
+            (User, users), (Order, orders), (Payment, payments),
+            (WebhookInbox, inbox), (OutboxMessage, outbox),
+        ):
+            await conn.execute(insert(model.__table__), rows)
+        await conn.exec_driver_sql("ANALYZE")
+    try:
+        yield
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM sqlite_stat1"))
+
+
+async def _plans(table: str, action) -> list[list[str]]:
+    """Планы (EXPLAIN QUERY PLAN) всех SELECT по table, выполненных action()."""
+    captured = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith("SELECT") and f"FROM {table}" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        await action()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    assert captured, f"нет запросов к {table}"
+    plans = []
+    async with engine.connect() as conn:
+        for statement, parameters in captured:
+            rows = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            plans.append([row[-1] for row in rows])
+    return plans
+
+
+def _assert_uses(plans: list[list[str]], table: str, index: str) -> None:
+    for plan in plans:
+        assert any(index in detail for detail in plan), plan
+        assert not any(detail.startswith(f"SCAN {table}") for detail in plan), plan
+
+
+async def test_pending_order_lookup_uses_cart_index():
+    course_ids = await seed_courses(3)
+    async with _production_volume():
+        user = await user_cache.resolve(900_000 + BUYER, f"User {BUYER}")
+
+        async def action():
+            async with async_session() as session:
+                await db.create_order(user, course_ids, session=session)
+
+        _assert_uses(await _plans("orders", action), "orders", "ux_orders_user_pending_cart")
+
+
+async def test_stale_payments_page_uses_status_index():
+    async def action():
+        await payment_reconciler._page(utcnow() - timedelta(minutes=10), 0)
+
+    async with _production_volume():
+        _assert_uses(await _plans("payments", action), "payments", "ix_payments_status_id")
+
+
+async def test_inbox_claim_uses_status_index():
+    processor = InboxProcessor()
+
+    async def action():
+        await processor._claim(10)
+
+    async with _production_volume():
+        _assert_uses(await _plans("webhook_inbox", action), "webhook_inbox", "ix_webhook_inbox_status_next")
+
+
+async def test_outbox_claim_uses_claim_index():
+    dispatcher = OutboxDispatcher()
+
+    async def action():
+        await dispatcher._claim(10)
+
+    async with _production_volume():
+        _assert_uses(await _plans("outbox", action), "outbox", "ix_outbox_claim")
@@ -0,0 +1,68 @@
+"""Ответ 429 останавливает все отправки outbox, а сообщения не дублируются."""
+
+import asyncio
+import time
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from bot.models import async_session, OutboxMessage
+from bot.services import outbox
+from bot.services.outbox import OutboxDispatcher
+from tests.support import bot_and_dispatcher, fake_telegram
+
+MESSAGES = 30
+RETRY_AFTER = 1
+# Запросы, отправленные до получения 429, ещё могут дойти в начале паузы
+IN_FLIGHT = 0.1
+
+
+async def test_retry_after_pauses_all_sends_without_duplicates():
+    async with async_session() as session:
+        await outbox.enqueue_many(
+            [outbox.message_row(chat_id, f"Сообщение {chat_id}") for chat_id in range(1, MESSAGES + 1)],
+            session=session,
+        )
+        await session.commit()
+
+    # Аренда чуть длиннее запаса LEASE_MARGIN: пауза 429 не даёт уже взятым
+    # сообщениям уложиться в срок, и они возвращаются в очередь до её конца
+    dispatcher = OutboxDispatcher(
+        global_rate=100, chat_rate=100, concurrency=10, poll_interval=0.05,
+        lease=outbox.LEASE_MARGIN + 0.5,
+    )
+    # Первые отправки получают 429, после первого ответа Telegram снова принимает сообщения
+    async with fake_telegram(latency=0, p429=1.0, retry_after=RETRY_AFTER) as telegram, \
+            bot_and_dispatcher() as (bot, _):
+        await dispatcher.start(bot)
+        try:
+            started = time.monotonic()
+            while not telegram.throttled and time.monotonic() - started < 10:
+                await asyncio.sleep(0.01)
+            telegram.p429 = 0.0
+            while len(telegram.sent) < MESSAGES and time.monotonic() - started < 60:
+                await asyncio.sleep(0.05)
+            # Повторная отправка, если бы она была, пришла бы следом
+            await asyncio.sleep(0.5)
+        finally:
+            await dispatcher.close()
+
+    assert telegram.throttled > 0
+    assert dispatcher.throttled == telegram.throttled
+    assert dispatcher.postponed > 0
+    chats = Counter(chat_id for _, chat_id in telegram.sent)
+    assert sorted(chats) == list(range(1, MESSAGES + 1))
+    assert set(chats.values()) == {1}
+
+    for throttled_at in telegram.throttled_at:
+        pause = (throttled_at + IN_FLIGHT, throttled_at + RETRY_AFTER)
+        assert not [sent for sent, _ in telegram.sent if pause[0] < sent < pause[1]]
+
+    async with async_session() as session:
+        statuses = dict((await session.execute(
+            select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+        )).all())
+        attempts = (await session.execute(select(func.max(OutboxMessage.attempts)))).scalar()
+    assert statuses == {"sent": MESSAGES}
+    # Ни 429, ни возврат в очередь из-за паузы не тратят попытки
+    assert attempts == 1
@@ -0,0 +1,78 @@
+"""Создание платежа: не блокирует другие обновления и не дублируется."""
+
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from bot.models import async_session, Order, Payment
+from tests.support import (
+    bot_and_dispatcher, callback_update, fake_telegram, fake_yookassa, message_update, seed_courses,
+)
+
+BUYER, BROWSER = 1001, 1002
+CHECKOUTS = 50
+
+
+async def test_catalog_is_served_while_create_payment_is_pending():
+    course_ids = await seed_courses(3)
+    async with (
+        fake_telegram(latency=0) as telegram,
+        fake_yookassa(latency=1.5) as yookassa,
+        bot_and_dispatcher() as (bot, dp),
+    ):
+        for user_id in (BUYER, BROWSER):
+            await dp.feed_raw_update(bot, message_update(user_id, "/start"))
+        await dp.feed_raw_update(bot, callback_update(BUYER, f"cart_add:{course_ids[0]}"))
+
+        checkout = asyncio.create_task(dp.feed_raw_update(bot, callback_update(BUYER, "checkout")))
+        # Ждём, пока запрос создания платежа дойдёт до ЮKassa и повиснет на задержке
+        while not yookassa.requests:
+            await asyncio.sleep(0.01)
+
+        edits = telegram.requests
+        started = time.perf_counter()
+        await dp.feed_raw_update(bot, callback_update(BROWSER, "catalog"))
+        elapsed = time.perf_counter() - started
+
+        assert not checkout.done()
+        assert yookassa.created == 0
+        assert elapsed < 0.5
+        assert telegram.requests > edits
+
+        await checkout
+        assert yookassa.created == 1
+
+    async with async_session() as session:
+        payments = (await session.execute(select(Payment.status))).scalars().all()
+    assert payments == ["pending"]
+
+
+async def test_parallel_checkouts_create_one_payment():
+    course_ids = await seed_courses(2)
+    async with (
+        fake_telegram(latency=0) as telegram,
+        fake_yookassa(latency=0.3) as yookassa,
+        bot_and_dispatcher() as (bot, dp),
+    ):
+        await dp.feed_raw_update(bot, message_update(BUYER, "/start"))
+        for course_id in course_ids:
+            await dp.feed_raw_update(bot, callback_update(BUYER, f"cart_add:{course_id}"))
+
+        throttling = dp["throttling"].stats()
+        answers = telegram.calls.get("answercallbackquery", 0)
+        await asyncio.gather(*(
+            dp.feed_raw_update(bot, callback_update(BUYER, "checkout")) for _ in range(CHECKOUTS)
+        ))
+
+        assert yookassa.created == 1
+        # Дубли не запускают обработчик, а ждут первый и получают ответ на callback
+        assert dp["throttling"].stats()["coalesced"] - throttling["coalesced"] == CHECKOUTS - 1
+        assert telegram.calls.get("answercallbackquery", 0) - answers >= CHECKOUTS - 1
+        assert telegram.calls.get("editmessagetext", 0) >= 1
+
+    async with async_session() as session:
+        orders = (await session.execute(select(Order.id))).scalars().all()
+        payments = (await session.execute(select(Payment.status))).scalars().all()
+    assert len(orders) == 1
+    assert payments == ["pending"]
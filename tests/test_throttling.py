@@ -0,0 +1,35 @@
+"""Лимит нажатий не отбрасывает inline-запросы."""
+
+from aiogram.types import Update
+
+from bot.middlewares import ThrottlingMiddleware
+from tests.support import inline_update, message_update
+
+USER_ID = 6001
+KEYSTROKES = "python для начинающих"
+
+
+async def _feed(middleware: ThrottlingMiddleware, raw: dict) -> bool:
+    update = Update.model_validate(raw)
+    user = (update.inline_query or update.message).from_user
+
+    async def handler(event, data) -> bool:
+        return True
+
+    return await middleware(handler, update, {"event_from_user": user}) is True
+
+
+async def test_inline_queries_bypass_rate_limit():
+    middleware = ThrottlingMiddleware(rate=2, burst=5)
+    # Запрос на каждое нажатие клавиши: последний, полный, тоже должен дойти
+    handled = [
+        await _feed(middleware, inline_update(USER_ID, KEYSTROKES[:i]))
+        for i in range(1, len(KEYSTROKES) + 1)
+    ]
+    assert all(handled)
+    assert middleware.stats()["rejected"] == 0
+
+    # Сообщения того же пользователя по-прежнему ограничены
+    messages = [await _feed(middleware, message_update(USER_ID, "каталог")) for _ in range(10)]
+    assert not all(messages)
+    assert middleware.stats()["rejected"] > 0
@@ -0,0 +1,92 @@
+"""Кэш пользователей: попадание не ходит в БД, новый пользователь — один INSERT."""
+
+import asyncio
+import re
+from collections import Counter
+
+from sqlalchemy import event, func, select
+
+from bot.models import async_session, engine, User
+from bot.services.users import user_cache
+from tests.support import bot_and_dispatcher, count_statements, fake_telegram, message_update
+
+TELEGRAM_ID = 5001
+STARTS = 1000
+USERS = re.compile(r"\b(INTO|FROM|UPDATE) users\b")
+
+
+def _users_statements(statements: list[str]) -> list[str]:
+    """Запросы к таблице users (без счётчиков статистики)."""
+    return [s.split(None, 1)[0].upper() for s in statements if USERS.search(s)]
+
+
+async def test_new_user_is_created_with_one_insert():
+    async with async_session() as session:
+        with count_statements() as statements:
+            record = await user_cache.resolve(TELEGRAM_ID, "New User", "new_user", session=session)
+        # В кэш запись попадает только после commit
+        assert user_cache._get(TELEGRAM_ID) is None
+        await session.commit()
+
+    assert _users_statements(statements) == ["INSERT"]
+    assert user_cache._get(TELEGRAM_ID) == record
+
+
+async def test_cached_user_does_not_touch_db():
+    record = await user_cache.resolve(TELEGRAM_ID, "Cached User")
+    async with async_session() as session:
+        with count_statements() as statements:
+            assert await user_cache.resolve(TELEGRAM_ID, "Cached User", session=session) == record
+    assert statements == []
+
+
+async def test_known_user_after_restart_is_read_back():
+    record = await user_cache.resolve(TELEGRAM_ID, "Known User")
+    user_cache._data.clear()
+    with count_statements() as statements:
+        assert await user_cache.resolve(TELEGRAM_ID, "Known User") == record
+    # INSERT ничего не вставил (конфликт по telegram_id) — читаем существующую строку
+    assert _users_statements(statements) == ["INSERT", "SELECT"]
+
+
+async def test_renamed_user_is_updated_once():
+    record = await user_cache.resolve(TELEGRAM_ID, "Old Name")
+    with count_statements() as statements:
+        renamed = await user_cache.resolve(TELEGRAM_ID, "New Name", "new_name")
+    assert _users_statements(statements) == ["UPDATE"]
+    assert (renamed.id, renamed.full_name, renamed.username) == (record.id, "New Name", "new_name")
+    assert user_cache._get(TELEGRAM_ID) == renamed
+
+
+async def test_concurrent_starts_create_each_user_once():
+    ids = set(range(10_000, 10_000 + STARTS))
+    per_user: Counter[int] = Counter()
+    # Запросы к users, которые не относятся ни к одному из пользователей
+    other: list[str] = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany) -> None:
+        if USERS.search(statement):
+            users = [p for p in parameters if p in ids]
+            per_user.update(users)
+            if not users:
+                other.append(statement)
+
+    async with fake_telegram(latency=0), bot_and_dispatcher() as (bot, dp):
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            await asyncio.gather(*(dp.feed_raw_update(bot, message_update(i, "/start")) for i in ids))
+            first = dict(per_user)
+            # Повторный /start тех же пользователей обслуживается из кэша
+            await asyncio.gather(*(dp.feed_raw_update(bot, message_update(i, "/start")) for i in ids))
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    async with async_session() as session:
+        rows, distinct = (await session.execute(
+            select(func.count(User.id), func.count(func.distinct(User.telegram_id)))
+        )).one()
+    assert rows == distinct == STARTS
+    assert set(first) == ids
+    assert max(first.values()) == 1
+    assert per_user == first
+    assert other == []
@@ -0,0 +1,94 @@
+"""Повторные доставки payment.succeeded применяются ровно один раз."""
+
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy import func, select
+
+from bot.handlers.payment import process_payment_event, setup_webhook_routes
+from bot.middlewares import db_session_middleware
+from bot.models import (
+    async_session, Order, OutboxMessage, Payment, ProcessedWebhook, UserCourse, WebhookInbox,
+)
+from bot.services import db
+from bot.services.inbox import InboxProcessor
+from bot.services.users import user_cache
+from tests.support import seed_courses
+
+DELIVERIES = 100
+YOOKASSA_ID = "pay-1"
+EVENT = "payment.succeeded"
+
+
+async def _pending_payment(courses: int = 3) -> int:
+    """Пользователь, заказ из courses курсов и pending-платёж по нему."""
+    course_ids = await seed_courses(courses)
+    user = await user_cache.resolve(4001, "Buyer")
+    async with async_session() as session:
+        order = await db.create_order(user, course_ids, session=session)
+        await db.create_payment_record(order.id, YOOKASSA_ID, order.total_amount, session=session)
+        await session.commit()
+    return order.id
+
+
+def _payload() -> dict:
+    return {"type": "notification", "event": EVENT, "object": {"id": YOOKASSA_ID, "status": "succeeded"}}
+
+
+async def _count(model, *where) -> int:
+    async with async_session() as session:
+        return await session.scalar(select(func.count()).select_from(model).where(*where))
+
+
+async def _assert_applied_once(order_id: int, courses: int) -> None:
+    assert await _count(ProcessedWebhook) == 1
+    assert await _count(Payment, Payment.status == "succeeded") == 1
+    assert await _count(Order, Order.id == order_id, Order.status == "paid") == 1
+    assert await _count(UserCourse) == courses
+    assert await _count(OutboxMessage) == 1
+
+
+async def test_concurrent_duplicate_deliveries_apply_once(monkeypatch):
+    order_id = await _pending_payment()
+    changes = []
+    confirm_payment = db.confirm_payment
+
+    async def recording_confirm(yookassa_id, session=None):
+        payment = await confirm_payment(yookassa_id, session=session)
+        if payment is not None:
+            changes.append(payment.id)
+        return payment
+
+    monkeypatch.setattr(db, "confirm_payment", recording_confirm)
+    results = await asyncio.gather(
+        *(process_payment_event(YOOKASSA_ID, EVENT, _payload()) for _ in range(DELIVERIES)),
+        return_exceptions=True,
+    )
+
+    assert [r for r in results if isinstance(r, Exception)] == []
+    assert len(changes) == 1
+    await _assert_applied_once(order_id, courses=3)
+
+
+async def test_concurrent_duplicate_webhooks_are_queued_once():
+    order_id = await _pending_payment()
+    app = web.Application(middlewares=[db_session_middleware])
+    setup_webhook_routes(app)
+
+    async with TestClient(TestServer(app)) as client:
+        responses = await asyncio.gather(
+            *(client.post("/webhook/yookassa", json=_payload()) for _ in range(DELIVERIES))
+        )
+    assert [r.status for r in responses] == [200] * DELIVERIES
+    assert await _count(WebhookInbox) == 1
+
+    processor = InboxProcessor(poll_interval=0.05)
+    await processor.start(process_payment_event)
+    try:
+        while await _count(WebhookInbox, WebhookInbox.status != "done"):
+            await asyncio.sleep(0.05)
+    finally:
+        await processor.close()
+    assert processor.processed == 1
+    await _assert_applied_once(order_id, courses=3)